@@ -11,4 +11,11 @@ from lido.find_duplicates import spot_duplicates  # noqa: F401
 from lido.get_stats import get_stats  # noqa: F401
 from lido.beacon import get_beacon  # noqa: F401
 from lido.utils.data_actuality import get_data_actuality  # noqa: F401
+from lido.key_store import KeyStore  # noqa: F401
+from lido.key_table import KeyTable  # noqa: F401
+from lido.validation_cache import ValidationCache  # noqa: F401
+from lido.progress import Cancelled, DeadlineExceeded, Progress  # noqa: F401
+from lido.registry_events import get_registry_events, apply_registry_events  # noqa: F401
 from lido.main import Lido  # noqa: F401
+from lido.async_beacon import get_async_beacon  # noqa: F401
+from lido.async_lido import AsyncLido  # noqa: F401
@@ -0,0 +1,129 @@
+import asyncio
+import datetime
+import logging
+import math
+import typing as t
+from datetime import timezone
+
+try:
+    import aiohttp
+except ImportError:  # aiohttp is optional, only async clients need it
+    aiohttp = None
+
+from requests.compat import urljoin
+
+from lido.beacon import Lighthouse, Prysm, lighthouse_balances, prysm_balances, prysm_keys
+
+
+async def get_async_beacon(
+    session: "aiohttp.ClientSession", provider: str, slots_per_epoch: int, max_concurrency: int = 10
+):
+    """Async get_beacon(), queries go through the given aiohttp session"""
+    async with session.get(urljoin(provider, Lighthouse.api_version)) as response:
+        version = await response.text()
+    if "Lighthouse" in version:
+        beacon = AsyncLighthouse(session, provider, slots_per_epoch, max_concurrency)
+        beacon.version = await beacon._get(beacon.api_version)
+        return beacon
+    async with session.get(urljoin(provider, Prysm.api_version)) as response:
+        version = await response.text()
+    if "Prysm" in version:
+        beacon = AsyncPrysm(session, provider, slots_per_epoch, max_concurrency)
+        beacon.version = await beacon._get(beacon.api_version)
+        return beacon
+    raise ValueError("Unknown beacon")
+
+
+class AsyncBeacon:
+    """Beacon node queries awaited on an aiohttp session, up to max_concurrency at a time"""
+
+    def __init__(
+        self,
+        session: "aiohttp.ClientSession",
+        url: str,
+        slots_per_epoch: int,
+        max_concurrency: int = 10,
+    ):
+        self.session = session
+        self.url = url
+        self.slots_per_epoch = slots_per_epoch
+        self.max_concurrency = max_concurrency
+        self.version = None
+        self._semaphore: t.Optional[asyncio.Semaphore] = None
+
+    async def _get(self, path: str, params: t.Optional[t.Dict] = None):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            async with self.session.get(urljoin(self.url, path), params=params) as response:
+                return await response.json(content_type=None)
+
+
+class AsyncLighthouse(AsyncBeacon):
+    api_version = Lighthouse.api_version
+    api_genesis = Lighthouse.api_genesis
+    api_beacon_head_finality_checkpoints = Lighthouse.api_beacon_head_finality_checkpoints
+    api_beacon_head_finalized = Lighthouse.api_beacon_head_finalized
+    api_beacon_head_actual = Lighthouse.api_beacon_head_actual
+    api_get_balances = Lighthouse.api_get_balances
+    api_get_slot = Lighthouse.api_get_slot
+
+    async def get_finalized_epoch(self):
+        response = await self._get(self.api_beacon_head_finality_checkpoints)
+        return int(response["data"]["finalized"]["epoch"])
+
+    async def get_genesis(self):
+        return int((await self._get(self.api_genesis))["data"]["genesis_time"])
+
+    async def get_actual_slot(self):
+        actual, finalized = await asyncio.gather(
+            self._get(self.api_beacon_head_actual), self._get(self.api_beacon_head_finalized)
+        )
+        return {
+            "actual_slot": int(actual["data"]["header"]["message"]["slot"]),
+            "finalized_slot": int(finalized["data"]["header"]["message"]["slot"]),
+        }
+
+    async def get_balances(self, slot, key_list):
+        logging.info("Fetching validators from Beacon node...")
+        response_json = await self._get(self.api_get_balances.format(slot))
+        logging.info(f"Validator balances on beacon for slot: {slot}")
+        return lighthouse_balances(response_json, ["0x" + key.hex() for key in key_list])
+
+
+class AsyncPrysm(AsyncBeacon):
+    api_version = Prysm.api_version
+    api_genesis = Prysm.api_genesis
+    api_beacon_head = Prysm.api_beacon_head
+    api_get_balances = Prysm.api_get_balances
+
+    async def get_finalized_epoch(self):
+        return int((await self._get(self.api_beacon_head))["finalizedEpoch"])
+
+    async def get_genesis(self):
+        genesis_time = (await self._get(self.api_genesis))["genesisTime"]
+        genesis_time = datetime.datetime.strptime(genesis_time, "%Y-%m-%dT%H:%M:%SZ").replace(
+            tzinfo=timezone.utc
+        )
+        return int(genesis_time.timestamp())
+
+    async def get_actual_slot(self):
+        response = await self._get(self.api_beacon_head)
+        return {
+            "actual_slot": int(response["headSlot"]),
+            "finalized_slot": int(response["finalizedSlot"]),
+        }
+
+    async def get_balances(self, slot, key_list):
+        pubkeys, key_dict = prysm_keys(key_list)
+
+        epoch = math.ceil(slot / self.slots_per_epoch)  # Round up in case of missing slots
+
+        # Prysm is queried key by key, all of them are in flight at once
+        responses = await asyncio.gather(
+            *[
+                self._get(self.api_get_balances, {"publicKeys": pk, "epoch": epoch})
+                for pk in pubkeys
+            ]
+        )
+        return prysm_balances(list(zip(pubkeys, responses)), pubkeys, key_dict)
@@ -0,0 +1,271 @@
+import typing as t
+import asyncio
+import logging
+
+from lido.constants.chains import get_chain_name
+from lido.constants.contract_addresses import get_default_lido_address, get_default_registry_address
+from lido.contracts.abi_loader import (
+    get_default_lido_abi_path,
+    get_default_operators_abi_path,
+    load_contract_abi,
+)
+from lido.get_operators_data import build_operators, get_operator_calls
+from lido.get_operators_keys import SIGNING_KEY_SIGNATURE, plan_signing_key_batches
+from lido.get_stats import get_stats_calls, unwrap_stats
+from lido.main import multicall_default_batch
+from lido.multicall import Call, decode_signing_keys, get_aggregate_template
+from lido.multicall.async_multicall import AsyncMulticall, async_aggregate, async_try_aggregate
+from lido.multicall.async_transport import AsyncRPC
+
+logger = logging.getLogger(__name__)
+
+async_default_concurrency = 10
+
+
+async def async_get_operators_data(
+    rpc: AsyncRPC,
+    chain_id: int,
+    registry_address: str,
+    registry_abi_path: str,
+    max_multicall: t.Optional[int] = None,
+    block_identifier=None,
+    require_success: bool = True,
+) -> t.List[t.Dict]:
+    """Async get_operators_data(), all batches are in flight at once"""
+
+    count = Call(None, registry_address, "getNodeOperatorsCount()(uint256)")
+    operators_n = count.decode_output(
+        await rpc.eth_call(count.target, count.data, block_identifier)
+    )
+    logger.debug(f"{operators_n=}")
+    if operators_n == 0:
+        logger.warning("no operators")
+        return []
+    assert operators_n < 1_000_000, "too big operators_n"
+
+    batch_size = max_multicall or operators_n
+    batches = [
+        range(start, min(start + batch_size, operators_n))
+        for start in range(0, operators_n, batch_size)
+    ]
+
+    calls = {}
+    for multi_call in await asyncio.gather(
+        *[
+            AsyncMulticall(
+                rpc,
+                chain_id,
+                get_operator_calls(None, registry_address, batch),
+                block_identifier,
+                require_success,
+            )()
+            for batch in batches
+        ]
+    ):
+        calls.update(multi_call)
+
+    return build_operators(calls, load_contract_abi(registry_abi_path))
+
+
+async def async_fetch_signing_keys(
+    rpc: AsyncRPC,
+    chain_id: int,
+    registry_address: str,
+    batch: t.List[t.Tuple[int, int]],
+    block_identifier=None,
+    require_success: bool = True,
+) -> t.List[t.Tuple]:
+    """Async fetch_signing_keys(), returns keys only"""
+
+    template = get_aggregate_template(registry_address, SIGNING_KEY_SIGNATURE)
+    if require_success:
+        _, outputs = await async_aggregate(rpc, chain_id, template.encode(batch), block_identifier)
+        return list(zip(*decode_signing_keys(outputs)))
+
+    block, results = await async_try_aggregate(
+        rpc, chain_id, template.encode(batch, require_success=False), block_identifier
+    )
+    keys = []
+    for pair, (success, output) in zip(batch, results):
+        if success:
+            try:
+                keys.extend(zip(*decode_signing_keys([output])))
+                continue
+            except ValueError as error:
+                logger.warning(f"malformed signing key {pair}: {error}")
+
+        try:
+            output = await rpc.eth_call(
+                template.target, template.signature.encode_data(pair), block
+            )
+            keys.extend(zip(*decode_signing_keys([memoryview(output)])))
+        except Exception as error:
+            raise ValueError(f"Unable to fetch signing key {pair} at block {block}") from error
+
+    return keys
+
+
+async def async_get_operators_keys(
+    rpc: AsyncRPC,
+    chain_id: int,
+    operators: t.List[t.Dict],
+    registry_address: str,
+    registry_abi_path: str,
+    max_multicall: int,
+    block_identifier=None,
+    require_success: bool = True,
+) -> t.List[t.Dict]:
+    """Async get_operators_keys(), all batches are in flight at once"""
+
+    function_abi = next(
+        x for x in load_contract_abi(registry_abi_path) if x["name"] == "getSigningKey"
+    )
+    signing_keys_keys = ["index"] + [x["name"] for x in function_abi["outputs"]]
+
+    batches = plan_signing_key_batches(operators, max_multicall)
+    results = await asyncio.gather(
+        *[
+            async_fetch_signing_keys(
+                rpc, chain_id, registry_address, batch, block_identifier, require_success
+            )
+            for batch in batches
+        ]
+    )
+
+    keys = [[None] * op["totalSigningKeys"] for op in operators]
+    for batch, items in zip(batches, results):
+        for (op_i, i), item in zip(batch, items):
+            keys[op_i][i] = dict(zip(signing_keys_keys, [i] + list(item)))
+
+    for op_i, op_keys in enumerate(keys):
+        operators[op_i]["keys"] = op_keys
+
+    return operators
+
+
+async def async_get_stats(
+    rpc: AsyncRPC,
+    chain_id: int,
+    contract_address: str,
+    contract_abi_path: str,
+    funcs_to_fetch: t.List[str],
+    block_identifier=None,
+    require_success: bool = True,
+) -> t.Dict:
+    """Async get_stats()"""
+
+    calls = get_stats_calls(
+        None, contract_address, load_contract_abi(contract_abi_path), funcs_to_fetch
+    )
+    calls, block = await asyncio.gather(
+        AsyncMulticall(rpc, chain_id, calls, block_identifier, require_success)(),
+        rpc.get_block(block_identifier or "latest"),
+    )
+
+    return {
+        "last_block": block["number"],
+        "last_blocktime": block["timestamp"],
+        **unwrap_stats(calls),
+    }
+
+
+class AsyncLido:
+    """
+    Lido client for asyncio applications, with the same results as Lido.
+    Every RPC request goes through one AsyncRPC, which bounds how many are in flight.
+    """
+
+    def __init__(
+        self,
+        rpc: AsyncRPC,
+        chain_id: int,
+        lido_address: t.Optional[str] = None,
+        registry_address: t.Optional[str] = None,
+        lido_abi_path: t.Optional[str] = None,
+        registry_abi_path: t.Optional[str] = None,
+        max_multicall: t.Optional[int] = None,
+        block_identifier=None,
+        require_success: bool = True,
+    ) -> None:
+        self.rpc = rpc
+        self.chain_id = chain_id
+        self.chain_name = get_chain_name(self.chain_id)
+        self.registry_address = registry_address or get_default_registry_address(self.chain_name)
+        self.registry_abi_path = registry_abi_path or get_default_operators_abi_path(
+            self.chain_name
+        )
+        self.lido_address = lido_address or get_default_lido_address(self.chain_id)
+        self.lido_abi_path = lido_abi_path or get_default_lido_abi_path(self.chain_name)
+        self.max_multicall = max_multicall or multicall_default_batch
+        self.block_identifier = block_identifier
+        self.require_success = require_success
+
+    @classmethod
+    async def connect(
+        cls, endpoint_uri: str, max_concurrency: int = async_default_concurrency, **kwargs
+    ) -> "AsyncLido":
+        """Create a client of a JSON-RPC endpoint, keyword arguments are the same as of Lido"""
+        rpc = AsyncRPC(endpoint_uri, max_concurrency)
+        return cls(rpc, await rpc.chain_id(), **kwargs)
+
+    async def close(self) -> None:
+        await self.rpc.close()
+
+    async def __aenter__(self) -> "AsyncLido":
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        await self.close()
+
+    async def pin_block(self, block_identifier="latest") -> int:
+        """Pin all following reads to one block, returns the pinned block number"""
+        self.block_identifier = (await self.rpc.get_block(block_identifier))["number"]
+        return self.block_identifier
+
+    def unpin_block(self) -> None:
+        self.block_identifier = None
+
+    async def get_operators_data(self):
+        return await async_get_operators_data(
+            self.rpc,
+            self.chain_id,
+            self.registry_address,
+            self.registry_abi_path,
+            self.max_multicall,
+            self.block_identifier,
+            self.require_success,
+        )
+
+    async def get_operators_keys(self, operators_data):
+        return await async_get_operators_keys(
+            self.rpc,
+            self.chain_id,
+            operators_data,
+            self.registry_address,
+            self.registry_abi_path,
+            self.max_multicall,
+            self.block_identifier,
+            self.require_success,
+        )
+
+    async def get_stats(self, funcs_to_fetch=None):
+        if funcs_to_fetch is None:
+            funcs_to_fetch = [
+                "isStopped",
+                "getTotalPooledEther",
+                "getWithdrawalCredentials",
+                "getFee",
+                "getFeeDistribution",
+                "getBeaconStat",
+                "getBufferedEther",
+            ]
+
+        return await async_get_stats(
+            self.rpc,
+            self.chain_id,
+            self.lido_address,
+            self.lido_abi_path,
+            funcs_to_fetch,
+            self.block_identifier,
+            self.require_success,
+        )
@@ -29,6 +29,80 @@ def get_beacon(provider, slots_per_epoch):
     raise ValueError("Unknown beacon")
 
 
+def lighthouse_balances(response_json, pubkeys):
+    """Total balance, number of validators and active balance of pubkeys in wei"""
+    balance_list = []
+    found_on_beacon_pubkeys = []
+    active_validators_balance = 0
+    for validator in response_json["data"]:
+        pubkey = validator["validator"]["pubkey"]
+        # Log all validators along with balance
+        if pubkey in pubkeys:
+            validator_balance = int(validator["balance"])
+
+            if validator["status"] == "active":
+                active_validators_balance += validator_balance
+
+            balance_list.append(validator_balance)
+            found_on_beacon_pubkeys.append(validator["validator"]["pubkey"])
+            logging.info(f"Pubkey: {pubkey[:12]} Balance: {validator_balance} Gwei")
+        elif validator["status"] == "UNKNOWN":
+            logging.warning(f"Pubkey {pubkey[:12]} status UNKNOWN")
+    balance = sum(balance_list)
+
+    # Convert Gwei to wei
+    balance *= 10 ** 9
+    active_validators_balance *= 10 ** 9
+
+    validators = len(found_on_beacon_pubkeys)
+    return balance, validators, active_validators_balance
+
+
+def prysm_keys(key_list):
+    """Base64 pubkeys Prysm is queried with and their short hex forms for logging"""
+    pubkeys = []
+    key_dict = {}
+    for key in key_list:
+        base64_key = base64.b64encode(key).decode()
+        hex_key = "0x" + binascii.hexlify(key).decode()
+        key_dict[base64_key] = hex_key[:12]
+        pubkeys.append(base64_key)
+    return pubkeys, key_dict
+
+
+def prysm_balances(responses, pubkeys, key_dict):
+    """Total balance, number of validators and active balance in wei
+    of (pubkey, response) pairs of Prysm balance queries"""
+    found_on_beacon_pubkeys = []
+    balance_list = []
+    active_validators_balance = 0
+
+    for pk, response_json in responses:
+        if "error" in response_json:
+            logging.error(f"Pubkey {key_dict[pk]} return error")
+            continue
+        validator = response_json["balances"][0]
+
+        if validator["publicKey"] in pubkeys:
+            found_on_beacon_pubkeys.append(validator["publicKey"])
+            balance = int(validator["balance"])
+            if validator["status"] == "ACTIVE":
+                active_validators_balance += balance
+
+            balance_list.append(balance)
+            logging.info(f"Pubkey: {key_dict[pk]} Balance: {balance} Gwei")
+        elif validator["status"] == "UNKNOWN":
+            logging.warning(f"Pubkey {key_dict[pk]} status UNKNOWN")
+
+    balances = sum(balance_list)
+    # Convert Gwei to wei
+    balances *= 10 ** 9
+    active_validators_balance *= 10 ** 9
+    total_validators_on_beacon = len(found_on_beacon_pubkeys)
+
+    return balances, total_validators_on_beacon, active_validators_balance
+
+
 class Lighthouse:
     api_version = "eth/v1/node/version"
     api_genesis = "eth/v1/beacon/genesis"
@@ -69,36 +143,10 @@ class Lighthouse:
         return pubkeys
 
     def get_balances(self, slot, key_list):
-        pubkeys = self._convert_key_list_to_str_arr(key_list)
-
         logging.info("Fetching validators from Beacon node...")
         response_json = requests.get(urljoin(self.url, self.api_get_balances.format(slot))).json()
-        balance_list = []
-        found_on_beacon_pubkeys = []
         logging.info(f"Validator balances on beacon for slot: {slot}")
-        active_validators_balance = 0
-        for validator in response_json["data"]:
-            pubkey = validator["validator"]["pubkey"]
-            # Log all validators along with balance
-            if pubkey in pubkeys:
-                validator_balance = int(validator["balance"])
-
-                if validator["status"] == "active":
-                    active_validators_balance += validator_balance
-
-                balance_list.append(validator_balance)
-                found_on_beacon_pubkeys.append(validator["validator"]["pubkey"])
-                logging.info(f"Pubkey: {pubkey[:12]} Balance: {validator_balance} Gwei")
-            elif validator["status"] == "UNKNOWN":
-                logging.warning(f"Pubkey {pubkey[:12]} status UNKNOWN")
-        balance = sum(balance_list)
-
-        # Convert Gwei to wei
-        balance *= 10 ** 9
-        active_validators_balance *= 10 ** 9
-
-        validators = len(found_on_beacon_pubkeys)
-        return balance, validators, active_validators_balance
+        return lighthouse_balances(response_json, self._convert_key_list_to_str_arr(key_list))
 
 
 class Prysm:
@@ -134,45 +182,14 @@ class Prysm:
         return actual_slots
 
     def get_balances(self, slot, key_list):
-        params = {}
-        pubkeys = []
-        found_on_beacon_pubkeys = []
-        balance_list = []
-        key_dict = {}
-        for key in key_list:
-            base64_key = base64.b64encode(key).decode()
-            hex_key = "0x" + binascii.hexlify(key).decode()
-            key_dict[base64_key] = hex_key[:12]
-            pubkeys.append(base64_key)
+        pubkeys, key_dict = prysm_keys(key_list)
 
         epoch = math.ceil(slot / self.slots_per_epoch)  # Round up in case of missing slots
 
-        active_validators_balance = 0
-
+        responses = []
         for pk in pubkeys:
-            params["publicKeys"] = pk
-            params["epoch"] = epoch
+            params = {"publicKeys": pk, "epoch": epoch}
             response = requests.get(urljoin(self.url, self.api_get_balances), params=params)
-            if "error" in response.json():
-                logging.error(f"Pubkey {key_dict[pk]} return error")
-                continue
-            validator = response.json()["balances"][0]
-
-            if validator["publicKey"] in pubkeys:
-                found_on_beacon_pubkeys.append(validator["publicKey"])
-                balance = int(validator["balance"])
-                if validator["status"] == "ACTIVE":
-                    active_validators_balance += balance
-
-                balance_list.append(balance)
-                logging.info(f"Pubkey: {key_dict[pk]} Balance: {balance} Gwei")
-            elif validator["status"] == "UNKNOWN":
-                logging.warning(f"Pubkey {key_dict[pk]} status UNKNOWN")
-
-        balances = sum(balance_list)
-        # Convert Gwei to wei
-        balances *= 10 ** 9
-        active_validators_balance *= 10 ** 9
-        total_validators_on_beacon = len(found_on_beacon_pubkeys)
-
-        return balances, total_validators_on_beacon, active_validators_balance
+            responses.append((pk, response.json()))
+
+        return prysm_balances(responses, pubkeys, key_dict)
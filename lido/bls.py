@@ -0,0 +1,245 @@
+import abc
+import typing as t
+import secrets
+
+from py_ecc.bls import G2ProofOfPossession as bls
+from py_ecc.bls.g2_primitives import pubkey_to_G1, signature_to_G2, subgroup_check
+from py_ecc.bls.hash_to_curve import hash_to_G2
+from py_ecc.fields import optimized_bls12_381_FQ12 as FQ12
+from py_ecc.optimized_bls12_381 import G1, Z2, add, final_exponentiate, multiply, neg, pairing
+
+# Native BLS bindings are optional, py_ecc is used without them
+try:
+    import blst
+except ImportError:
+    blst = None
+try:
+    import milagro_bls_binding as milagro
+except ImportError:
+    milagro = None
+
+# Bits of the random scalars, a batch with an invalid signature passes with 2^-64 probability
+SCALAR_BITS = 64
+
+
+def _prepare_keys(pubkey: bytes, signature: bytes):
+    """
+    Curve points of a pubkey and a signature after the checks bls.Verify does,
+    None when they fail any of them
+    """
+    if not (bls._is_valid_pubkey(pubkey) and bls._is_valid_signature(signature)):
+        return None
+    try:
+        if not bls.KeyValidate(pubkey):
+            return None
+        signature_point = signature_to_G2(signature)
+        if not subgroup_check(signature_point):
+            return None
+        return pubkey_to_G1(pubkey), signature_point
+    except Exception:
+        return None
+
+
+def _prepare(pubkey: bytes, message: bytes, signature: bytes):
+    """Curve points of a (pubkey, message, signature) item, None when it can't be valid"""
+    points = _prepare_keys(pubkey, signature)
+    if points is None or not bls._is_valid_message(message):
+        return None
+    pubkey_point, signature_point = points
+    return pubkey_point, hash_to_G2(message, bls.DST, bls.xmd_hash_function), signature_point
+
+
+def _check(points) -> bool:
+    """
+    Check e(sum(r_i * sig_i), G1) == prod(e(H(m_i), r_i * pk_i)) for random r_i,
+    with one Miller loop per item and a single final exponentiation.
+    One item is checked with r = 1, which is exactly the bls.Verify equation.
+    """
+    signatures = Z2
+    product = FQ12.one()
+    for pubkey, message_point, signature in points:
+        r = (secrets.randbits(SCALAR_BITS) | 1) if len(points) > 1 else 1
+        signatures = add(signatures, multiply(signature, r))
+        product *= pairing(message_point, neg(multiply(pubkey, r)), final_exponentiate=False)
+    product *= pairing(signatures, G1, final_exponentiate=False)
+    return final_exponentiate(product) == FQ12.one()
+
+
+def _bisect(points, known_invalid: bool = False) -> t.List[bool]:
+    # All valid signatures always pass, so a failed batch has an invalid one for sure
+    if not known_invalid and _check(points):
+        return [True] * len(points)
+    if len(points) == 1:
+        return [False]
+
+    middle = len(points) // 2
+    left = _bisect(points[:middle])
+    # When the left half is fine, the invalid signatures are all in the right one
+    right = _bisect(points[middle:], known_invalid=all(left))
+    return left + right
+
+
+def batch_verify(items: t.Sequence[t.Tuple[bytes, bytes, bytes]]) -> t.List[bool]:
+    """
+    bls.Verify results of (pubkey, message, signature) items, verified together.
+
+    Valid items are checked with one multi-pairing of random linear combination,
+    a failed batch is split in halves until the invalid items are found.
+    """
+    results = [False] * len(items)
+    prepared = [(i, _prepare(*item)) for i, item in enumerate(items)]
+    prepared = [(i, points) for i, points in prepared if points is not None]
+    if not prepared:
+        return results
+
+    for (i, _), valid in zip(prepared, _bisect([points for _, points in prepared])):
+        results[i] = valid
+    return results
+
+
+def find_valid_message(pubkey: bytes, messages: t.Iterable[bytes], signature: bytes) -> int:
+    """
+    Index of the first message the signature is valid for with bls.Verify, -1 if none.
+    Points are decoded and checked and the signature side of the pairing is computed once,
+    every message costs only its hash and the pubkey side.
+    """
+    points = _prepare_keys(pubkey, signature)
+    if points is None:
+        return -1
+    pubkey_point, signature_point = points
+    signature_side = pairing(signature_point, G1, final_exponentiate=False)
+    negated_pubkey = neg(pubkey_point)
+
+    for i, message in enumerate(messages):
+        if not bls._is_valid_message(message):
+            continue
+        message_point = hash_to_G2(message, bls.DST, bls.xmd_hash_function)
+        pubkey_side = pairing(message_point, negated_pubkey, final_exponentiate=False)
+        if final_exponentiate(signature_side * pubkey_side) == FQ12.one():
+            return i
+    return -1
+
+
+class BLSBackend(abc.ABC):
+    """BLS signature verification of the proof of possession scheme deposits use"""
+
+    name = ""
+
+    @staticmethod
+    def is_available() -> bool:
+        return True
+
+    @abc.abstractmethod
+    def verify(self, pubkey: bytes, message: bytes, signature: bytes) -> bool:
+        """Whether the signature of message is valid for pubkey"""
+
+    def batch_verify(self, items: t.Sequence[t.Tuple[bytes, bytes, bytes]]) -> t.List[bool]:
+        """verify results of (pubkey, message, signature) items"""
+        return [self.verify(*item) for item in items]
+
+    def find_valid_message(
+        self, pubkey: bytes, messages: t.Iterable[bytes], signature: bytes
+    ) -> int:
+        """Index of the first message the signature is valid for, -1 if none"""
+        return next((i for i, x in enumerate(messages) if self.verify(pubkey, x, signature)), -1)
+
+    def __repr__(self):
+        return f"{type(self).__name__}()"
+
+
+class PyEccBackend(BLSBackend):
+    """Pure Python py_ecc, always available, with random linear combination batches"""
+
+    name = "py_ecc"
+
+    def verify(self, pubkey: bytes, message: bytes, signature: bytes) -> bool:
+        return bls.Verify(pubkey, message, signature) is True
+
+    def batch_verify(self, items: t.Sequence[t.Tuple[bytes, bytes, bytes]]) -> t.List[bool]:
+        return batch_verify(items)
+
+    def find_valid_message(
+        self, pubkey: bytes, messages: t.Iterable[bytes], signature: bytes
+    ) -> int:
+        return find_valid_message(pubkey, messages, signature)
+
+
+class MilagroBackend(BLSBackend):
+    """milagro_bls_binding, Rust bindings with the same API as py_ecc"""
+
+    name = "milagro"
+
+    @staticmethod
+    def is_available() -> bool:
+        return milagro is not None
+
+    def verify(self, pubkey: bytes, message: bytes, signature: bytes) -> bool:
+        try:
+            return milagro.Verify(pubkey, message, signature) is True
+        except Exception:
+            return False
+
+
+class BlstBackend(BLSBackend):
+    """supranational blst Python bindings"""
+
+    name = "blst"
+
+    @staticmethod
+    def is_available() -> bool:
+        return blst is not None
+
+    @staticmethod
+    def _points(pubkey: bytes, signature: bytes):
+        if len(pubkey) != 48 or len(signature) != 96:
+            return None
+        try:
+            pubkey_point = blst.P1_Affine(pubkey)
+            signature_point = blst.P2_Affine(signature)
+        except Exception:
+            # Not a valid point encoding
+            return None
+        # KeyValidate and the signature subgroup check bls.Verify does
+        if pubkey_point.is_inf() or not pubkey_point.in_group() or not signature_point.in_group():
+            return None
+        return pubkey_point, signature_point
+
+    def verify(self, pubkey: bytes, message: bytes, signature: bytes) -> bool:
+        return self.find_valid_message(pubkey, [message], signature) == 0
+
+    def find_valid_message(
+        self, pubkey: bytes, messages: t.Iterable[bytes], signature: bytes
+    ) -> int:
+        # Points are decoded and checked once for all messages
+        points = self._points(pubkey, signature)
+        if points is None:
+            return -1
+        pubkey_point, signature_point = points
+        for i, message in enumerate(messages):
+            error = signature_point.core_verify(pubkey_point, True, message, bls.DST)
+            if error == blst.BLST_SUCCESS:
+                return i
+        return -1
+
+
+# Backends by name, the first available one is used by default
+BLS_BACKENDS: t.Dict[str, t.Type[BLSBackend]] = {
+    BlstBackend.name: BlstBackend,
+    MilagroBackend.name: MilagroBackend,
+    PyEccBackend.name: PyEccBackend,
+}
+
+
+def get_available_bls_backends() -> t.List[str]:
+    return [name for name, backend in BLS_BACKENDS.items() if backend.is_available()]
+
+
+def get_bls_backend(name: t.Optional[str] = None) -> BLSBackend:
+    """BLS backend by name, the fastest installed one when no name is given"""
+    if name is None:
+        name = get_available_bls_backends()[0]
+    if name not in BLS_BACKENDS:
+        raise ValueError(f"Unknown BLS backend {name}, choose from {list(BLS_BACKENDS)}")
+    if not BLS_BACKENDS[name].is_available():
+        raise ValueError(f"BLS backend {name} isn't installed")
+    return BLS_BACKENDS[name]()
@@ -1,3 +1,6 @@
+from hashlib import sha256
+import typing as t
+
 from ssz import ByteVector, Serializable, uint64, bytes4, bytes32, bytes48, bytes96
 from lido.eth2deposit.utils.constants import (
     DOMAIN_DEPOSIT,
@@ -83,3 +86,46 @@ class DepositData(Serializable):
         ("amount", uint64),
         ("signature", bytes96),
     ]
+
+
+# Fast DepositMessage signing roots
+#
+# DepositMessage has a fixed layout, so its hash tree root is a fixed set of sha256 calls:
+# root = H(H(H(pubkey[:32] + pubkey[32:] + 16 zero bytes) + withdrawal_credentials)
+#          + H(amount as 32 bytes + ZERO_BYTES32))
+# The amount subtree is the same for every key and can be computed once.
+
+
+def compute_deposit_amount_root(amount: int) -> bytes:
+    """
+    Root of the amount half of the DepositMessage tree
+    """
+    return sha256(amount.to_bytes(8, "little") + bytes(24) + ZERO_BYTES32).digest()
+
+
+def compute_deposit_signing_root(
+    pubkey: bytes,
+    withdrawal_credentials: bytes,
+    amount: int,
+    domain: bytes,
+    amount_root: t.Optional[bytes] = None,
+) -> bytes:
+    """
+    compute_signing_root of a DepositMessage with hashlib, without SSZ objects.
+    amount_root is compute_deposit_amount_root(amount) if it's precomputed.
+    """
+    if len(pubkey) != 48:
+        raise ValueError(f"Pubkey should be in 48 bytes. Got {len(pubkey)}.")
+    if len(withdrawal_credentials) != 32:
+        raise ValueError(
+            f"Withdrawal credentials should be in 32 bytes. Got {len(withdrawal_credentials)}."
+        )
+    if len(domain) != 32:
+        raise ValueError(f"Domain should be in 32 bytes. Got {len(domain)}.")
+
+    pubkey_root = sha256(bytes(pubkey) + bytes(16)).digest()
+    object_root = sha256(
+        sha256(pubkey_root + withdrawal_credentials).digest()
+        + (amount_root or compute_deposit_amount_root(amount))
+    ).digest()
+    return sha256(object_root + domain).digest()
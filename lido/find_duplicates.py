@@ -1,4 +1,7 @@
 import typing as t
+from collections import Counter
+
+from lido.key_table import KeyTable
 
 
 def spot_duplicates(
@@ -20,10 +23,25 @@ def spot_duplicates(
     return duplicates_found
 
 
-def find_duplicates(operators: t.List[t.Dict]) -> t.List[t.Dict]:
+def find_table_duplicates(table: KeyTable) -> KeyTable:
+    """Set duplicate flags of all keys of a table, a key is a duplicate if its pubkey is
+    there more than once. KeyTable.to_operators adds "duplicates" of every key from them."""
+
+    counts = Counter(table.pubkey(row) for row in range(len(table)))
+    for row in range(len(table)):
+        table.duplicate[row] = int(counts[table.pubkey(row)] > 1)
+    return table
+
+
+def find_duplicates(
+    operators: t.Union[t.List[t.Dict], KeyTable],
+) -> t.Union[t.List[t.Dict], KeyTable]:
     """Loop through all keys and
     add information about duplicates to "duplicate" and "duplicates" fields of every key"""
 
+    if isinstance(operators, KeyTable):
+        return find_table_duplicates(operators)
+
     for op_i, op in enumerate(operators):
         for key_i, key in enumerate(op["keys"]):
             operators[op_i]["keys"][key_i]["duplicates"] = []
@@ -1,19 +1,58 @@
 import typing as t
 import logging
 
-from lido.multicall import Call, Multicall
+from lido.multicall import Call, Multicall, dispatch
 from lido.contracts.w3_contracts import get_contract
 
 logger = logging.getLogger(__name__)
 
+OPERATOR_SIGNATURE = (
+    "getNodeOperator(uint256,bool)(bool,string,address,uint64,uint64,uint64,uint64)"
+)
+
+
+def get_operator_calls(w3, registry_address: str, ids: t.Iterable[int]) -> t.List[Call]:
+    """getNodeOperator() calls of operators ids, results are keyed by id"""
+    return [Call(w3, registry_address, [OPERATOR_SIGNATURE, i, True], [[i, None]]) for i in ids]
+
+
+def build_operators(calls: t.Dict[int, t.Tuple], registry_abi: t.List[t.Dict]) -> t.List[t.Dict]:
+    """Operator dicts of getNodeOperator() results named after the ABI outputs
+
+    A result is None when its call has failed even on its own without require_success,
+    an operator can't be left out, so it's an error.
+    """
+
+    failed = [op_id for op_id, item in calls.items() if item is None]
+    if failed:
+        raise ValueError(f"Unable to fetch node operators {failed}")
+
+    # Adding id as first data of operator
+    calls_with_ids = [[op_id] + list(item) for op_id, item in calls.items()]
+
+    # Getting function data from contract ABI
+    function_abi = next(x for x in registry_abi if x["name"] == "getNodeOperator")
+
+    # Adding "id" and the rest of output name keys
+    op_keys = ["id"] + [x["name"] for x in function_abi["outputs"]]
+    return [dict(zip(op_keys, op)) for op in calls_with_ids]
+
 
 def get_operators_data(
     w3,
     registry_address: str,
     registry_abi_path: str,
+    max_multicall: t.Optional[int] = None,
+    max_workers: int = 1,
+    block_identifier=None,
+    require_success: bool = True,
 ) -> t.List[t.Dict]:
     """Fetch information for each node operator
 
+    Operators are fetched in multicall batches of max_multicall (all at once by default),
+    keeping up to max_workers batches in flight.
+    All reads are done at block_identifier, the latest block by default.
+
     Example output:
     [{
         'id': 0,
@@ -27,44 +66,30 @@ def get_operators_data(
     }...]
     """
 
-    operators_n = Call(w3, registry_address, "getNodeOperatorsCount()(uint256)")()
+    operators_n = Call(
+        w3, registry_address, "getNodeOperatorsCount()(uint256)", block_identifier=block_identifier
+    )()
     logger.debug(f"{operators_n=}")
     if operators_n == 0:
         logger.warning(f"no operators")  # fixme assert if not test env
         return []
     assert operators_n < 1_000_000, "too big operators_n"
 
-    calls = Multicall(
-        w3,
-        [
-            Call(
-                w3,
-                registry_address,
-                [
-                    "getNodeOperator(uint256,bool)(bool,string,address,uint64,uint64,uint64,uint64)",
-                    i,
-                    True,
-                ],
-                [[i, None]],
-            )
-            for i in range(operators_n)
-        ],
-    )()
+    def fetch_operators(batch):
+        return Multicall(
+            w3, get_operator_calls(w3, registry_address, batch), block_identifier, require_success
+        )()
 
-    calls_list = list(calls.values())
+    batch_size = max_multicall or operators_n
+    batches = [
+        range(start, min(start + batch_size, operators_n))
+        for start in range(0, operators_n, batch_size)
+    ]
 
-    # Adding index as first data of operator
-    calls_with_indeces = [[i] + list(item) for i, item in enumerate(calls_list)]
+    calls = {}
+    for multi_call in dispatch(fetch_operators, batches, max_workers):
+        calls.update(multi_call)
 
-    # Getting function data from contract ABI
-    function_abi = next(
-        x
-        for x in get_contract(w3, address=registry_address, path=registry_abi_path).abi
-        if x["name"] == "getNodeOperator"
+    return build_operators(
+        calls, get_contract(w3, address=registry_address, path=registry_abi_path).abi
     )
-
-    # Adding "id" and the rest of output name keys
-    op_keys = ["id"] + [x["name"] for x in function_abi["outputs"]]
-    operators = [dict(zip(op_keys, op)) for op in calls_with_indeces]
-
-    return operators
@@ -1,11 +1,119 @@
 import typing as t
 import logging
 
-from lido.multicall import Call, Multicall
+from lido.multicall import (
+    AdaptiveBatcher,
+    aggregate,
+    decode_signing_keys,
+    dispatch,
+    get_aggregate_template,
+    try_aggregate,
+)
+from lido.multicall.call import eth_call
 from lido.contracts.w3_contracts import get_contract
+from lido.key_store import KeyStore
+from lido.key_table import KeyTable
+from lido.progress import FETCH_KEYS, StageProgress
+from lido.registry_events import apply_registry_events, get_registry_events
 
 logger = logging.getLogger(__name__)
 
+SIGNING_KEY_SIGNATURE = "getSigningKey(uint256,uint256)(bytes,bytes,bool)"
+
+
+def plan_signing_keys(
+    operators: t.List[t.Dict], starts: t.Optional[t.Sequence[int]] = None
+) -> t.List[t.Tuple[int, int]]:
+    """List (operator_id, index) pairs of signing keys in the registry,
+    from starts[operator_id] index of every operator if given"""
+
+    return [
+        (op_i, i)
+        for op_i, op in enumerate(operators)
+        for i in range(starts[op_i] if starts else 0, op["totalSigningKeys"])
+    ]
+
+
+def plan_signing_key_batches(
+    operators: t.List[t.Dict], max_multicall: int, starts: t.Optional[t.Sequence[int]] = None
+) -> t.List[t.List[t.Tuple[int, int]]]:
+    """Split (operator_id, index) pairs of the whole registry into full multicall batches
+
+    Batches are filled up to max_multicall regardless of which operator a key belongs to,
+    so only the very last batch can be partly filled.
+    """
+
+    pairs = plan_signing_keys(operators, starts)
+    return [pairs[start : start + max_multicall] for start in range(0, len(pairs), max_multicall)]
+
+
+def plan_key_store_sync(
+    operators: t.List[t.Dict], stored: t.Dict[int, t.Dict], events_applied: bool = False
+) -> t.List[int]:
+    """First index to fetch for every operator, keys before it are taken from the store
+
+    Keys are append-only, except unused keys which can be removed with the last key moved
+    to the freed index. A removal followed by an addition keeps the key count, so unused
+    keys are always fetched again, from the first unused key of the checkpoint.
+    When registry events since the checkpoints are applied to the store, they have every
+    such change, then only keys added or moved by events, which have no signature, are fetched.
+    """
+
+    starts = []
+    for op_i, op in enumerate(operators):
+        checkpoint = stored.get(op_i)
+        if checkpoint is None:
+            starts.append(0)
+            continue
+
+        start = checkpoint["totalSigningKeys"] if events_applied else checkpoint["usedSigningKeys"]
+        # Keys known from events only have no signatures yet
+        start = next((i for i, key in enumerate(checkpoint["keys"]) if key[1] is None), start)
+        starts.append(min(start, op["totalSigningKeys"]))
+
+    return starts
+
+
+def fetch_signing_keys(
+    w3,
+    registry_address: str,
+    batch: t.List[t.Tuple[int, int]],
+    block_identifier=None,
+    require_success: bool = True,
+) -> t.Tuple[int, t.List[t.Tuple]]:
+    """Fetch one batch of signing keys with a single multicall, returns block and keys
+
+    Without require_success, keys failing inside the multicall are retried one by one
+    at the same block, keeping the rest of the batch.
+    """
+
+    logger.debug(f"{len(batch)=}")
+    # getSigningKey calldata has a fixed layout, the whole batch is patched into a template
+    template = get_aggregate_template(registry_address, SIGNING_KEY_SIGNATURE)
+    if require_success:
+        block, outputs = aggregate(w3, template.encode(batch), block_identifier)
+        return block, list(zip(*decode_signing_keys(outputs)))
+
+    block, results = try_aggregate(
+        w3, template.encode(batch, require_success=False), block_identifier
+    )
+    keys = []
+    for pair, (success, output) in zip(batch, results):
+        if success:
+            try:
+                keys.extend(zip(*decode_signing_keys([output])))
+                continue
+            except ValueError as error:
+                logger.warning(f"malformed signing key {pair}: {error}")
+
+        try:
+            output = eth_call(w3, template.target, template.signature.encode_data(pair), block)
+            keys.extend(zip(*decode_signing_keys([memoryview(output)])))
+        except Exception as error:
+            raise ValueError(f"Unable to fetch signing key {pair} at block {block}") from error
+
+    return block, keys
+
 
 def get_operators_keys(
     w3,
@@ -13,9 +121,32 @@ def get_operators_keys(
     registry_address: str,
     registry_abi_path: str,
     max_multicall: int,
-) -> t.List[t.Dict]:
+    max_workers: int = 1,
+    batcher: t.Optional[AdaptiveBatcher] = None,
+    key_store: t.Optional[KeyStore] = None,
+    sync_events: bool = False,
+    block_identifier=None,
+    require_success: bool = True,
+    key_table: bool = False,
+    on_keys: t.Optional[t.Callable[[t.List[t.Dict]], None]] = None,
+    progress: t.Optional[StageProgress] = None,
+) -> t.Union[t.List[t.Dict], KeyTable]:
     """Get and add signing keys to node operators
 
+    Up to max_workers multicall batches are kept in flight at the same time.
+    With a batcher, batch sizes are adapted to the node instead of the fixed max_multicall.
+    With a key store, only keys which could have changed since the last sync are fetched.
+    With sync_events as well, registry key events since the last sync are applied to the stored
+    keys first, so only signatures of added keys are fetched. Keys are fetched at the block
+    events are synced up to then.
+    All reads are done at block_identifier, the latest block by default.
+    Without require_success, a failing key is retried on its own instead of failing its batch.
+    With key_table, keys are returned as a KeyTable instead of being added to operators.
+    Without it, on_keys is called with key dicts as soon as they are there: stored ones first,
+    then every fetched batch, possibly from several threads. The same dicts end up in operators.
+    Keys fetched and batches in flight are reported to progress, which can also stop fetching
+    by raising Cancelled between batches.
+
     Example output:
     [{
         'id': 0,
@@ -35,51 +166,98 @@ def get_operators_keys(
     }, ...]
     """
 
-    for op_i, op in enumerate(operators):
-        total_keys = op["totalSigningKeys"]
-
-        keys = []
-
-        calls_list = []
-        for i in range(total_keys):
-            call = Call(
-                w3,
-                registry_address,
-                [
-                    "getSigningKey(uint256,uint256)(bytes,bytes,bool)",
-                    op_i,
-                    i,
-                ],
-                [[i, None]],
-            )
-            calls_list.append(call)
-            if len(calls_list) >= max_multicall:
-                logger.debug(f"{len(calls_list)=}")
-                multi_call = Multicall(w3, calls_list)()
-                calls_list = []
-                keys.extend(multi_call.values())
-
-        if calls_list:
-            logger.debug(f"{len(calls_list)=}")
-            multi_call = Multicall(w3, calls_list)()
-            keys.extend(multi_call.values())
-
-        function_abi = next(
-            x
-            for x in get_contract(w3, address=registry_address, path=registry_abi_path).abi
-            if x["name"] == "getSigningKey"
+    progress = progress or StageProgress(FETCH_KEYS)
+    progress.start(sum(op["totalSigningKeys"] for op in operators))
+
+    function_abi = next(
+        x
+        for x in get_contract(w3, address=registry_address, path=registry_abi_path).abi
+        if x["name"] == "getSigningKey"
+    )
+    signing_keys_keys = ["index"] + [x["name"] for x in function_abi["outputs"]]
+
+    stored = key_store.load(registry_address) if key_store is not None else {}
+
+    synced_block = None
+    if key_store is not None and sync_events:
+        # Keys are fetched at the block events are synced up to, so the next sync
+        # applies exactly the events after what has been fetched
+        synced_block = (
+            block_identifier
+            if isinstance(block_identifier, int)
+            else w3.eth.getBlock(block_identifier or "latest")["number"]
         )
-        signing_keys_keys = ["index"] + [x["name"] for x in function_abi["outputs"]]
-        signing_keys_list = [
-            dict(
-                zip(
-                    signing_keys_keys,
-                    [i] + list(item),
-                )
+        block_identifier = synced_block
+
+    checkpoints = [x["block"] for x in stored.values()]
+    events_applied = bool(sync_events and checkpoints and None not in checkpoints)
+    if events_applied:
+        events = get_registry_events(
+            w3, registry_address, registry_abi_path, min(checkpoints) + 1, synced_block
+        )
+        logger.debug(f"{len(events)=}")
+        apply_registry_events(stored, events)
+
+    starts = plan_key_store_sync(operators, stored, events_applied)
+
+    if key_table and on_keys is not None:
+        raise ValueError("on_keys can't be used with key_table")
+
+    # Stored keys are done already
+    progress.add(sum(starts))
+
+    # Results are scattered back by (operator_id, index), so batches may span operators
+    if key_table:
+        table = KeyTable([op["totalSigningKeys"] for op in operators])
+        put_key = table.set_key
+    else:
+        keys = [[None] * op["totalSigningKeys"] for op in operators]
+
+        def put_key(op_i, i, *item):
+            keys[op_i][i] = dict(zip(signing_keys_keys, [i, *item]))
+
+    for op_i, op in enumerate(operators):
+        for i in range(starts[op_i]):
+            pubkey, signature, used = stored[op_i]["keys"][i]
+            if "usedSigningKeys" in op:
+                used = i < op["usedSigningKeys"]
+            put_key(op_i, i, pubkey, signature, used)
+        if on_keys is not None and starts[op_i]:
+            on_keys(keys[op_i][: starts[op_i]])
+
+    blocks = []
+
+    def fetch(batch):
+        with progress.batch(len(batch)):
+            block, items = fetch_signing_keys(
+                w3, registry_address, batch, block_identifier, require_success
             )
-            for i, item in enumerate(keys)
-        ]
+        blocks.append(block)
+        for (op_i, i), item in zip(batch, items):
+            put_key(op_i, i, *item)
+        if on_keys is not None:
+            on_keys([keys[op_i][i] for op_i, i in batch])
+        return items
+
+    if batcher is not None:
+        batcher.run(fetch, plan_signing_keys(operators, starts), max_workers)
+    else:
+        dispatch(fetch, plan_signing_key_batches(operators, max_multicall, starts), max_workers)
+
+    if key_table:
+        # The key store reads keys of the table through views, without keeping dicts around
+        operators_keys = [{"keys": table.operator_keys(op_i)} for op_i in range(len(operators))]
+    else:
+        for op_i, op_keys in enumerate(keys):
+            operators[op_i]["keys"] = op_keys
+        operators_keys = operators
+
+    if key_store is not None:
+        # Batches read at different latest blocks have everything up to the earliest one only
+        if synced_block is None and blocks:
+            synced_block = min(blocks)
+        key_store.save(registry_address, operators_keys, starts, synced_block)
 
-        operators[op_i]["keys"] = signing_keys_list
+    progress.finish()
 
-    return operators
+    return table if key_table else operators
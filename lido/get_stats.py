@@ -5,19 +5,14 @@ from lido.contracts.w3_contracts import get_contract
 from lido.utils.data_actuality import get_data_actuality
 
 
-def get_stats(
-    w3,
-    contract_address: str,
-    contract_abi_path: str,
-    funcs_to_fetch: t.List[str],
-) -> t.Dict:
-    """Fetch various constants from Lido for analytics and statistics"""
+def get_stats_calls(
+    w3, contract_address: str, contract_abi: t.List[t.Dict], funcs_to_fetch: t.List[str]
+) -> t.List[Call]:
+    """Calls of the contract functions to fetch, results are keyed by function name"""
 
     # Getting function data from contract ABI
     funcs_from_contract = [
-        x
-        for x in get_contract(w3, address=contract_address, path=contract_abi_path).abi
-        if x["type"] == "function" and x["name"] in funcs_to_fetch
+        x for x in contract_abi if x["type"] == "function" and x["name"] in funcs_to_fetch
     ]
 
     # Adding "multicall_outputs" with prepared input data for multicall
@@ -27,27 +22,48 @@ def get_stats(
             x.append(output["type"])
         funcs_from_contract[func_i]["multicall_outputs"] = ",".join(x)
 
-    calls = Multicall(
-        w3,
-        [
-            Call(
-                w3,
-                contract_address,
-                [
-                    "%s()(%s)" % (item["name"], item["multicall_outputs"]),
-                ],
-                [[item["name"], None]],
-            )
-            for item in funcs_from_contract
-        ],
-    )()
+    return [
+        Call(
+            w3,
+            contract_address,
+            [
+                "%s()(%s)" % (item["name"], item["multicall_outputs"]),
+            ],
+            [[item["name"], None]],
+        )
+        for item in funcs_from_contract
+    ]
+
 
-    # Return values instead of single-element tuples
+def unwrap_stats(calls: t.Dict) -> t.Dict:
+    """Return values instead of single-element tuples"""
     for call in calls:
         item = calls[call]
         if type(item) == tuple and len(item) == 1:
             calls[call] = item[0]
+    return calls
+
+
+def get_stats(
+    w3,
+    contract_address: str,
+    contract_abi_path: str,
+    funcs_to_fetch: t.List[str],
+    block_identifier=None,
+    require_success: bool = True,
+) -> t.Dict:
+    """Fetch various constants from Lido for analytics and statistics
+    at block_identifier, the latest block by default.
+    Without require_success, values of calls failing even on their own are None."""
+
+    contract_abi = get_contract(w3, address=contract_address, path=contract_abi_path).abi
+    calls = Multicall(
+        w3,
+        get_stats_calls(w3, contract_address, contract_abi, funcs_to_fetch),
+        block_identifier,
+        require_success,
+    )()
 
-    actuality_data = get_data_actuality(w3)
+    actuality_data = get_data_actuality(w3, block_identifier or "latest")
 
-    return {**actuality_data, **calls}
+    return {**actuality_data, **unwrap_stats(calls)}
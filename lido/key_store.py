@@ -0,0 +1,126 @@
+import typing as t
+import sqlite3
+import threading
+
+
+class KeyStore:
+    """
+    Local SQLite store of signing keys keyed by (registry_address, operator_id, index).
+    Every operator has a checkpoint with its key counts and the block it was synced at,
+    so the next sync only fetches what could have changed since.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS keys (
+                    registry_address TEXT NOT NULL,
+                    operator_id INTEGER NOT NULL,
+                    idx INTEGER NOT NULL,
+                    pubkey BLOB NOT NULL,
+                    signature BLOB NOT NULL,
+                    used INTEGER NOT NULL,
+                    PRIMARY KEY (registry_address, operator_id, idx)
+                )
+                """
+            )
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS checkpoints (
+                    registry_address TEXT NOT NULL,
+                    operator_id INTEGER NOT NULL,
+                    total_keys INTEGER NOT NULL,
+                    used_keys INTEGER NOT NULL,
+                    block INTEGER,
+                    PRIMARY KEY (registry_address, operator_id)
+                )
+                """
+            )
+
+    def load(self, registry_address: str) -> t.Dict[int, t.Dict]:
+        """
+        Load stored operators of a registry, example output:
+        {0: {'totalSigningKeys': 2, 'usedSigningKeys': 1, 'block': 12588300,
+             'keys': [(b'pubkey', b'signature', True), (b'pubkey', b'signature', False)]}}
+        """
+        registry_address = registry_address.lower()
+        with self._lock:
+            checkpoints = self._connection.execute(
+                "SELECT operator_id, total_keys, used_keys, block FROM checkpoints "
+                "WHERE registry_address = ?",
+                (registry_address,),
+            ).fetchall()
+            rows = self._connection.execute(
+                "SELECT operator_id, pubkey, signature, used FROM keys "
+                "WHERE registry_address = ? ORDER BY operator_id, idx",
+                (registry_address,),
+            ).fetchall()
+
+        operators = {
+            operator_id: {
+                "totalSigningKeys": total,
+                "usedSigningKeys": used,
+                "block": block,
+                "keys": [],
+            }
+            for operator_id, total, used, block in checkpoints
+        }
+        for operator_id, pubkey, signature, used in rows:
+            if operator_id in operators:
+                operators[operator_id]["keys"].append((bytes(pubkey), bytes(signature), bool(used)))
+
+        return operators
+
+    def save(
+        self,
+        registry_address: str,
+        operators: t.List[t.Dict],
+        starts: t.Sequence[int],
+        block: t.Optional[int],
+    ) -> None:
+        """
+        Store keys of operators starting from starts[operator_id] index
+        and move checkpoints of all of them to block.
+        """
+        registry_address = registry_address.lower()
+        with self._lock, self._connection:
+            for op_i, op in enumerate(operators):
+                keys = op["keys"]
+                self._connection.execute(
+                    "DELETE FROM keys WHERE registry_address = ? AND operator_id = ? AND idx >= ?",
+                    (registry_address, op_i, len(keys)),
+                )
+                self._connection.executemany(
+                    "INSERT OR REPLACE INTO keys VALUES (?, ?, ?, ?, ?, ?)",
+                    (
+                        (
+                            registry_address,
+                            op_i,
+                            key["index"],
+                            bytes(key["key"]),
+                            bytes(key["depositSignature"]),
+                            int(key["used"]),
+                        )
+                        for key in keys[starts[op_i] :]
+                    ),
+                )
+                # Used keys always come first, so the first unused key index is their count
+                used_keys = next((i for i, key in enumerate(keys) if not key["used"]), len(keys))
+                self._connection.execute(
+                    "UPDATE keys SET used = idx < ? "
+                    "WHERE registry_address = ? AND operator_id = ? AND idx < ?",
+                    (used_keys, registry_address, op_i, starts[op_i]),
+                )
+                # Without a new block, e.g. nothing was fetched, the previous one stays
+                self._connection.execute(
+                    "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, COALESCE(?, "
+                    "(SELECT block FROM checkpoints WHERE registry_address = ? AND operator_id = ?)))",
+                    (registry_address, op_i, len(keys), used_keys, block, registry_address, op_i),
+                )
+
+    def close(self) -> None:
+        self._connection.close()
@@ -0,0 +1,181 @@
+import typing as t
+import array
+from collections.abc import Sequence
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional, columns are stdlib arrays without it
+    np = None
+
+PUBKEY_LENGTH = 48
+SIGNATURE_LENGTH = 96
+
+# Flags are stored as int8: -1 when unknown, 0 for False, 1 for True
+UNKNOWN = -1
+
+
+def to_flag(value: t.Optional[bool]) -> int:
+    return UNKNOWN if value is None else int(value)
+
+
+def from_flag(flag: int) -> t.Optional[bool]:
+    # NumPy columns compare to numpy.bool_, keys get plain bools anyway
+    return None if flag == UNKNOWN else bool(flag == 1)
+
+
+def _column(typecode: str, size: int, fill: int = 0):
+    if np is not None:
+        return np.full(size, fill, dtype={"I": np.uint32, "b": np.int8}[typecode])
+    return array.array(typecode, [fill]) * size
+
+
+def _to_bytes(value: t.Union[str, bytes], length: int) -> bytes:
+    value = bytes.fromhex(value) if type(value) is str else bytes(value)
+    if len(value) != length:
+        raise ValueError(f"Expected {length} bytes, got {len(value)}")
+    return value
+
+
+class KeyTable:
+    """
+    Signing keys of the registry in columns instead of a dict per key.
+
+    Pubkeys and signatures are contiguous 48 and 96 byte buffers, operator ids and indexes
+    are uint32 columns, used, valid and duplicate are int8 flag columns (NumPy arrays when
+    NumPy is installed). Keys of an operator take consecutive rows, operator by operator,
+    so the row of a key is known from sizes, the key count of every operator.
+    """
+
+    def __init__(self, sizes: t.Sequence[int]):
+        self.sizes = list(sizes)
+        self.offsets = [0] * len(self.sizes)
+        for op_i in range(1, len(self.sizes)):
+            self.offsets[op_i] = self.offsets[op_i - 1] + self.sizes[op_i - 1]
+        size = sum(self.sizes)
+
+        self.pubkeys = bytearray(size * PUBKEY_LENGTH)
+        self.signatures = bytearray(size * SIGNATURE_LENGTH)
+        self.operator_ids = _column("I", size)
+        self.indexes = _column("I", size)
+        self.used = _column("b", size, UNKNOWN)
+        self.valid = _column("b", size, UNKNOWN)
+        self.duplicate = _column("b", size, UNKNOWN)
+
+        for op_i, op_size in enumerate(self.sizes):
+            for i in range(op_size):
+                self.operator_ids[self.offsets[op_i] + i] = op_i
+                self.indexes[self.offsets[op_i] + i] = i
+
+    @classmethod
+    def from_operators(cls, operators: t.List[t.Dict]) -> "KeyTable":
+        """Table of keys of operators, with validation and duplicate flags they have"""
+        table = cls([len(op["keys"]) for op in operators])
+        for op_i, op in enumerate(operators):
+            for i, key in enumerate(op["keys"]):
+                row = table.set_key(op_i, i, key["key"], key["depositSignature"], key.get("used"))
+                table.valid[row] = to_flag(key.get("valid_signature"))
+                table.duplicate[row] = to_flag(key.get("duplicate"))
+        return table
+
+    def __len__(self) -> int:
+        return len(self.operator_ids)
+
+    @property
+    def nbytes(self) -> int:
+        """Memory taken by the columns"""
+        columns = [self.operator_ids, self.indexes, self.used, self.valid, self.duplicate]
+        return len(self.pubkeys) + len(self.signatures) + sum(len(x) * x.itemsize for x in columns)
+
+    def row(self, operator_id: int, index: int) -> int:
+        return self.offsets[operator_id] + index
+
+    def operator_rows(self, operator_id: int) -> range:
+        return range(self.offsets[operator_id], self.offsets[operator_id] + self.sizes[operator_id])
+
+    def set_key(
+        self,
+        operator_id: int,
+        index: int,
+        pubkey: t.Union[str, bytes],
+        signature: t.Union[str, bytes],
+        used: t.Optional[bool],
+    ) -> int:
+        row = self.row(operator_id, index)
+        self.pubkeys[row * PUBKEY_LENGTH : (row + 1) * PUBKEY_LENGTH] = _to_bytes(
+            pubkey, PUBKEY_LENGTH
+        )
+        self.signatures[row * SIGNATURE_LENGTH : (row + 1) * SIGNATURE_LENGTH] = _to_bytes(
+            signature, SIGNATURE_LENGTH
+        )
+        self.used[row] = to_flag(used)
+        return row
+
+    def pubkey(self, row: int) -> bytes:
+        return bytes(self.pubkeys[row * PUBKEY_LENGTH : (row + 1) * PUBKEY_LENGTH])
+
+    def signature(self, row: int) -> bytes:
+        return bytes(self.signatures[row * SIGNATURE_LENGTH : (row + 1) * SIGNATURE_LENGTH])
+
+    def key(self, row: int) -> t.Dict:
+        """Key of a row as a dict, the way operators data has it"""
+        key = {
+            "index": int(self.indexes[row]),
+            "key": self.pubkey(row),
+            "depositSignature": self.signature(row),
+            "used": from_flag(self.used[row]),
+        }
+        if self.valid[row] != UNKNOWN:
+            key["valid_signature"] = from_flag(self.valid[row])
+        if self.duplicate[row] != UNKNOWN:
+            key["duplicate"] = from_flag(self.duplicate[row])
+        return key
+
+    def operator_keys(self, operator_id: int) -> "KeyTableView":
+        return KeyTableView(self, self.operator_rows(operator_id))
+
+    def to_operators(self, operators: t.List[t.Dict]) -> t.List[t.Dict]:
+        """
+        Add keys of the table to operators as dicts, the way get_operators_keys does,
+        with "duplicates" of every key if duplicates have been searched for.
+        Modifies the input!
+        """
+
+        # Rows of every pubkey which is there more than once
+        duplicated: t.Dict[bytes, t.List[int]] = {}
+        for row in range(len(self)):
+            if self.duplicate[row] == 1:
+                duplicated.setdefault(self.pubkey(row), []).append(row)
+
+        for op_i, op in enumerate(operators):
+            op["keys"] = list(self.operator_keys(op_i))
+            for row, key in zip(self.operator_rows(op_i), op["keys"]):
+                if self.duplicate[row] == UNKNOWN:
+                    continue
+                key["duplicates"] = [
+                    dict(
+                        op_id=operators[self.operator_ids[other]]["id"],
+                        op_name=operators[self.operator_ids[other]]["name"],
+                        index=int(self.indexes[other]),
+                        approved=bool(operators[self.operator_ids[other]]["stakingLimit"]),
+                        used=from_flag(self.used[other]),
+                    )
+                    for other in duplicated.get(key["key"], [])
+                    if other != row
+                ]
+        return operators
+
+
+class KeyTableView(Sequence):
+    """Read-only sequence of key dicts of table rows, made on access"""
+
+    def __init__(self, table: KeyTable, rows: range):
+        self.table = table
+        self.rows = rows
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self.table.key(row) for row in self.rows[i]]
+        return self.table.key(self.rows[i])
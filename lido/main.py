@@ -1,20 +1,29 @@
 from lido.get_stats import get_stats
 from lido.find_duplicates import find_duplicates, spot_duplicates
 from lido.validate_keys import (
+    validate_key_stream,
     validate_key_list_multi,
     validate_keys_mono,
     validate_keys_multi,
     validate_key,
 )
 from lido.get_operators_keys import get_operators_keys
+from lido.pipeline import run_pipeline
+from lido.progress import FETCH_KEYS, VALIDATE_KEYS, Progress, StageProgress
+import threading
 import typing as t
 from lido.contracts.abi_loader import get_default_lido_abi_path, get_default_operators_abi_path
 from lido import get_operators_data
 from lido.constants.chains import get_chain_name
 from lido.constants.contract_addresses import get_default_lido_address, get_default_registry_address
 from lido.contracts.w3_contracts import get_contract
+from lido.key_store import KeyStore
+from lido.validation_cache import ValidationCache
+from lido.multicall.adaptive import AdaptiveBatcher, get_endpoint
+from lido.multicall.cache import RPCCache, set_rpc_cache
 
 multicall_default_batch = 300
+multicall_default_concurrency = 1
 
 
 class Lido:
@@ -26,6 +35,20 @@ class Lido:
         lido_abi_path: t.Optional[str] = None,
         registry_abi_path: t.Optional[str] = None,
         max_multicall: t.Optional[int] = None,
+        max_concurrent_multicalls: t.Optional[int] = None,
+        adaptive_multicall: bool = False,
+        key_store_path: t.Optional[str] = None,
+        sync_events: bool = False,
+        block_identifier=None,
+        require_success: bool = True,
+        rpc_cache: t.Optional[RPCCache] = None,
+        validation_cache_path: t.Optional[str] = None,
+        validation_batch_size: t.Optional[int] = None,
+        validation_chunk_size: t.Optional[int] = None,
+        validation_shared_memory: bool = True,
+        bls_backend: t.Optional[str] = None,
+        on_progress: t.Optional[t.Callable[[Progress], None]] = None,
+        stage_deadlines: t.Optional[t.Dict[str, float]] = None,
     ) -> None:
         self.w3 = w3
         self.chain_id = w3.eth.chainId
@@ -46,32 +69,152 @@ class Lido:
         self.lido_address = lido_address or get_default_lido_address(self.chain_id)
         self.lido_abi_path = lido_abi_path or get_default_lido_abi_path(self.chain_name)
         self.max_multicall = max_multicall or multicall_default_batch
+        self.max_concurrent_multicalls = max_concurrent_multicalls or multicall_default_concurrency
+
+        # Adaptive batcher starts from max_multicall and tunes it to the node on the go
+        self.multicall_batcher = (
+            AdaptiveBatcher(get_endpoint(w3), initial_size=self.max_multicall)
+            if adaptive_multicall
+            else None
+        )
+
+        # Keys synced before are loaded from the store instead of the node
+        self.key_store = KeyStore(key_store_path) if key_store_path else None
+        # Catch the key store up with registry events, keys are fetched for gaps only
+        self.sync_events = sync_events
+
+        # Block every read is done at, the latest block when not pinned
+        self.block_identifier = block_identifier
+
+        # Without require_success multicalls go through Multicall2 tryBlockAndAggregate,
+        # so a failing call is retried on its own instead of failing its whole batch
+        self.require_success = require_success
+
+        # Every eth_call made with w3 is served from the cache when it can be
+        self.rpc_cache = rpc_cache
+        if rpc_cache is not None:
+            set_rpc_cache(w3, rpc_cache)
+
+        # Signature verifications done on previous runs are taken from the cache
+        self.validation_cache = (
+            ValidationCache(validation_cache_path) if validation_cache_path else None
+        )
+
+        # Keys are verified in batches of this size by batch verification, one by one when None
+        self.validation_batch_size = validation_batch_size
+        # Keys sent to a validation worker at once, sized to the amount of keys when None
+        self.validation_chunk_size = validation_chunk_size
+        # Validation workers read keys from a shared memory file instead of pickled chunks
+        self.validation_shared_memory = validation_shared_memory
+        # "blst", "milagro" or "py_ecc", the fastest installed one when None
+        self.bls_backend = bls_backend
+
+        # Called with Progress of fetching and validating keys about every second
+        self.on_progress = on_progress
+        # Seconds every stage may take by its name, "fetch_keys" or "validate_keys"
+        self.stage_deadlines = stage_deadlines or {}
+        # Set by cancel(), running stages stop at their next batch
+        self.cancelled = threading.Event()
+
+    def cancel(self) -> None:
+        """
+        Stop fetching and validating keys, from any thread. Running stages raise Cancelled
+        at their next batch, following ones right away until cancelled is cleared.
+        """
+        self.cancelled.set()
+
+    def get_stage_progress(self, stage: str) -> StageProgress:
+        return StageProgress(
+            stage, self.on_progress, self.stage_deadlines.get(stage), self.cancelled
+        )
+
+    def pin_block(self, block_identifier="latest") -> int:
+        """
+        Pin all following reads to one block, so operators, keys, validation and stats
+        are a consistent snapshot. Returns the pinned block number.
+        """
+        self.block_identifier = self.w3.eth.getBlock(block_identifier)["number"]
+        return self.block_identifier
+
+    def unpin_block(self) -> None:
+        """Go back to reading the latest block"""
+        self.block_identifier = None
 
     def get_operators_data(self):
-        return get_operators_data(self.w3, self.registry_address, self.registry_abi_path)
+        return get_operators_data(
+            self.w3,
+            self.registry_address,
+            self.registry_abi_path,
+            self.max_multicall,
+            self.max_concurrent_multicalls,
+            self.block_identifier,
+            self.require_success,
+        )
 
-    def get_operators_keys(self, operators_data):
+    def get_operators_keys(self, operators_data, key_table=False, on_keys=None):
         return get_operators_keys(
             self.w3,
             operators_data,
             self.registry_address,
             self.registry_abi_path,
             self.max_multicall,
+            self.max_concurrent_multicalls,
+            self.multicall_batcher,
+            self.key_store,
+            self.sync_events,
+            self.block_identifier,
+            self.require_success,
+            key_table,
+            on_keys,
+            self.get_stage_progress(FETCH_KEYS),
         )
 
     def validate_keys_multi(self, operators_with_keys, strict=False):
         return validate_keys_multi(
-            self.w3, operators_with_keys, self.lido_address, self.lido_abi_path, strict
+            self.w3,
+            operators_with_keys,
+            self.lido_address,
+            self.lido_abi_path,
+            strict,
+            self.block_identifier,
+            self.validation_cache,
+            self.validation_batch_size,
+            self.validation_chunk_size,
+            None,
+            self.validation_shared_memory,
+            self.bls_backend,
+            self.get_stage_progress(VALIDATE_KEYS),
         )
 
     def validate_keys_mono(self, operators_with_keys, strict=False):
         return validate_keys_mono(
-            self.w3, operators_with_keys, self.lido_address, self.lido_abi_path, strict
+            self.w3,
+            operators_with_keys,
+            self.lido_address,
+            self.lido_abi_path,
+            strict,
+            self.block_identifier,
+            self.validation_cache,
+            self.validation_batch_size,
+            self.bls_backend,
+            self.get_stage_progress(VALIDATE_KEYS),
         )
 
     def validate_key_list_multi(self, operators_with_keys, strict=False):
         return validate_key_list_multi(
-            self.w3, operators_with_keys, self.lido_address, self.lido_abi_path, strict
+            self.w3,
+            operators_with_keys,
+            self.lido_address,
+            self.lido_abi_path,
+            strict,
+            self.block_identifier,
+            self.validation_cache,
+            self.validation_batch_size,
+            self.validation_chunk_size,
+            None,
+            self.validation_shared_memory,
+            self.bls_backend,
+            self.get_stage_progress(VALIDATE_KEYS),
         )
 
     @staticmethod
@@ -83,7 +226,7 @@ class Lido:
         return spot_duplicates(operators, key, original_op)
 
     @staticmethod
-    def validate_key(chain_id, key, withdrawal_credentials):
+    def validate_key(chain_id, key, withdrawal_credentials, bls_backend=None):
         """
         WARNING:
         This is a lower-level validation function without checks for correct
@@ -93,15 +236,48 @@ class Lido:
         validate_key_list_multi instead.
         """
         return validate_key(
-            {"chain_id": chain_id, "key": key, "withdrawal_credentials": withdrawal_credentials}
+            {
+                "chain_id": chain_id,
+                "key": key,
+                "live_withdrawal_credentials": withdrawal_credentials,
+                "possible_withdrawal_credentials": [withdrawal_credentials],
+                "strict": True,
+                "bls_backend": bls_backend,
+            }
         )
 
-    def fetch_and_validate(self):
+    def fetch_and_validate(self, pipelined=False):
+        """
+        Fetch operators with keys, validate keys and find duplicates.
+        When pipelined, batches of keys are validated as soon as they are fetched,
+        so fetching and validation run at the same time.
+        """
         operators_data = self.get_operators_data()
 
-        data_with_keys = self.get_operators_keys(operators_data)
+        if pipelined:
+            data_validated_keys, _ = run_pipeline(
+                lambda put: self.get_operators_keys(operators_data, on_keys=put),
+                lambda keys: validate_key_stream(
+                    self.w3,
+                    keys,
+                    sum(op["totalSigningKeys"] for op in operators_data),
+                    self.lido_address,
+                    self.lido_abi_path,
+                    False,
+                    self.block_identifier,
+                    self.validation_cache,
+                    self.validation_batch_size,
+                    self.validation_chunk_size,
+                    None,
+                    self.validation_shared_memory,
+                    self.bls_backend,
+                    self.get_stage_progress(VALIDATE_KEYS),
+                ),
+            )
+        else:
+            data_with_keys = self.get_operators_keys(operators_data)
 
-        data_validated_keys = self.validate_keys_multi(data_with_keys)
+            data_validated_keys = self.validate_keys_multi(data_with_keys)
 
         data_found_duplicates = self.find_duplicates(data_validated_keys)
 
@@ -125,6 +301,8 @@ class Lido:
             contract_address=self.lido_address,
             contract_abi_path=self.lido_abi_path,
             funcs_to_fetch=funcs_to_fetch,
+            block_identifier=self.block_identifier,
+            require_success=self.require_success,
         )
 
     def lido_self_check(self):
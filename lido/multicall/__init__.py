@@ -1,5 +1,18 @@
 __version__ = "0.1.1"
 
-from lido.multicall.signature import Signature  # noqa: F401
+from lido.multicall.signature import Signature, get_signature  # noqa: F401
+from lido.multicall.cache import RPCCache, get_rpc_cache, set_rpc_cache  # noqa: F401
 from lido.multicall.call import Call  # noqa: F401
-from lido.multicall.multicall import Multicall  # noqa: F401
+from lido.multicall.decoder import decode_aggregate, decode_signing_keys  # noqa: F401
+from lido.multicall.decoder import decode_aggregate_calldata, decode_try_aggregate  # noqa: F401
+from lido.multicall.encoder import AggregateTemplate, encode_aggregate  # noqa: F401
+from lido.multicall.encoder import get_aggregate_template  # noqa: F401
+from lido.multicall.transport import BatchTransport, get_batch_transport  # noqa: F401
+from lido.multicall.multicall import Multicall, aggregate, batch_aggregate  # noqa: F401
+from lido.multicall.multicall import try_aggregate  # noqa: F401
+from lido.multicall.dispatcher import dispatch  # noqa: F401
+from lido.multicall.adaptive import AdaptiveBatcher  # noqa: F401
+from lido.multicall.pool import RPCPool  # noqa: F401
+from lido.multicall.async_transport import AsyncRPC  # noqa: F401
+from lido.multicall.async_multicall import AsyncMulticall, async_aggregate  # noqa: F401
+from lido.multicall.async_multicall import async_try_aggregate  # noqa: F401
@@ -0,0 +1,124 @@
+import typing as t
+import logging
+import threading
+
+import requests
+
+from lido.multicall.dispatcher import dispatch
+
+logger = logging.getLogger(__name__)
+
+# Parts of error messages nodes return when a batch is too heavy for them.
+# Only gas and size messages, anything broader matches unrelated errors, e.g. block numbers
+BATCH_SIZE_ERRORS = (
+    "out of gas",
+    "gas required exceeds",
+    "exceeds block gas limit",
+    "execution timeout",
+    "response size",
+    "request entity too large",
+    "response too large",
+    "request too large",
+)
+
+# HTTP status of a request body too large for the provider
+PAYLOAD_TOO_LARGE = 413
+
+
+def is_batch_size_error(error: Exception) -> bool:
+    """Check if a failed multicall is worth retrying with a smaller batch"""
+    if isinstance(error, (requests.exceptions.Timeout, TimeoutError)):
+        return True
+    if isinstance(error, requests.exceptions.HTTPError):
+        return getattr(error.response, "status_code", None) == PAYLOAD_TOO_LARGE
+    message = str(error).lower()
+    return any(part in message for part in BATCH_SIZE_ERRORS)
+
+
+def get_endpoint(w3) -> str:
+    """Readable identity of a web3 provider to remember batch sizes for"""
+    provider = getattr(w3, "provider", None)
+    return getattr(provider, "endpoint_uri", None) or repr(provider)
+
+
+class AdaptiveBatcher:
+    """
+    Splits items into multicall batches of a size adapted to the endpoint.
+    A batch failing because of gas, payload size or timeout is bisected and retried,
+    the batch size grows after successful rounds.
+    The best size is remembered per endpoint for every batcher in the process.
+    """
+
+    best_sizes: t.Dict[str, int] = {}
+
+    def __init__(
+        self,
+        endpoint: str,
+        initial_size: int = 300,
+        min_size: int = 1,
+        max_size: int = 5_000,
+        growth: float = 1.5,
+    ):
+        self.endpoint = endpoint
+        self.min_size = min_size
+        self.max_size = max_size
+        self.growth = growth
+        self.size = self.best_sizes.get(endpoint, initial_size)
+        # Smallest batch size that has failed, we never grow up to it again
+        self.ceiling: t.Optional[int] = None
+        self._lock = threading.Lock()
+
+    def run(
+        self, func: t.Callable[[t.List], t.List], items: t.Sequence, max_workers: int = 1
+    ) -> t.List:
+        """Run func on batches of items, returning a flat list of results in items order"""
+        results = []
+        start = 0
+        while start < len(items):
+            # One round is as many batches as can be in flight at the same time
+            batches = []
+            for _ in range(max(max_workers, 1)):
+                if start >= len(items):
+                    break
+                batches.append(items[start : start + self.size])
+                start += len(batches[-1])
+
+            split = False
+            for batch_results, batch_split in dispatch(
+                lambda batch: self._execute(func, batch), batches, max_workers
+            ):
+                results.extend(batch_results)
+                split = split or batch_split
+
+            if not split:
+                self._grow()
+            self.best_sizes[self.endpoint] = self.size
+
+        return results
+
+    def _execute(self, func: t.Callable[[t.List], t.List], batch: t.List) -> t.Tuple[t.List, bool]:
+        try:
+            return func(batch), False
+        except Exception as error:
+            if len(batch) <= self.min_size or not is_batch_size_error(error):
+                raise
+
+            half = len(batch) // 2
+            logger.warning(f"multicall batch of {len(batch)} failed ({error}), retrying by {half}")
+            self._shrink(len(batch), half)
+
+            left, _ = self._execute(func, batch[:half])
+            right, _ = self._execute(func, batch[half:])
+            return left + right, True
+
+    def _shrink(self, failed_size: int, size: int) -> None:
+        with self._lock:
+            self.ceiling = min(self.ceiling or failed_size, failed_size)
+            self.size = max(min(self.size, size), self.min_size)
+
+    def _grow(self) -> None:
+        with self._lock:
+            size = max(int(self.size * self.growth), self.size + 1)
+            if self.ceiling is not None:
+                size = min(size, self.ceiling - 1)
+            self.size = max(min(size, self.max_size), self.min_size)
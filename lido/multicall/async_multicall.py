@@ -0,0 +1,118 @@
+import typing as t
+import logging
+from typing import List
+
+from lido.multicall.async_transport import AsyncRPC
+from lido.multicall.call import Call, get_checksum_address
+from lido.multicall.constants import MULTICALL_ADDRESSES, MULTICALL2_ADDRESSES
+from lido.multicall.decoder import decode_aggregate, decode_aggregate_calldata, decode_try_aggregate
+from lido.multicall.encoder import encode_aggregate
+from lido.multicall.transport import is_gas_cap_error
+
+logger = logging.getLogger(__name__)
+
+
+async def async_batch_aggregate(
+    rpc: AsyncRPC, calldata: bytes, block_identifier=None
+) -> t.Tuple[int, t.List[t.Tuple[bool, memoryview]]]:
+    """Async batch_aggregate(): the calls of prepared calldata as one JSON-RPC batch"""
+    block, results = await rpc.call_many(decode_aggregate_calldata(calldata), block_identifier)
+    return block, [(success, memoryview(output)) for success, output in results]
+
+
+async def async_aggregate(
+    rpc: AsyncRPC, chain_id: int, calldata: bytes, block_identifier=None
+) -> t.Tuple[int, t.List[memoryview]]:
+    """Async aggregate(), with the same JSON-RPC batch fallback"""
+    address = MULTICALL_ADDRESSES.get(chain_id)
+    if address is not None:
+        try:
+            address = get_checksum_address(address)
+            return decode_aggregate(await rpc.eth_call(address, calldata, block_identifier))
+        except Exception as error:
+            if not is_gas_cap_error(error):
+                raise
+            logger.warning(f"multicall hit the gas cap ({error}), sending plain calls in a batch")
+
+    block, results = await async_batch_aggregate(rpc, calldata, block_identifier)
+    if not all(success for success, _ in results):
+        raise ValueError(f"Multicall aggregate failed at block {block}")
+    return block, [output for _, output in results]
+
+
+async def async_try_aggregate(
+    rpc: AsyncRPC, chain_id: int, calldata: bytes, block_identifier=None
+) -> t.Tuple[int, t.List[t.Tuple[bool, memoryview]]]:
+    """Async try_aggregate(), with the same JSON-RPC batch fallback"""
+    address = MULTICALL2_ADDRESSES.get(chain_id)
+    if address is not None:
+        try:
+            address = get_checksum_address(address)
+            return decode_try_aggregate(await rpc.eth_call(address, calldata, block_identifier))
+        except Exception as error:
+            if not is_gas_cap_error(error):
+                raise
+            logger.warning(f"multicall hit the gas cap ({error}), sending plain calls in a batch")
+
+    return await async_batch_aggregate(rpc, calldata, block_identifier)
+
+
+class AsyncMulticall:
+    """Multicall awaited on an AsyncRPC, with the same results"""
+
+    def __init__(
+        self,
+        rpc: AsyncRPC,
+        chain_id: int,
+        calls: List[Call],
+        block_identifier=None,
+        require_success=True,
+    ):
+        self.rpc = rpc
+        self.chain_id = chain_id
+        self.calls = calls
+        self.block_identifier = block_identifier
+        self.require_success = require_success
+        self.block: t.Optional[int] = None
+        self.success: t.List[bool] = []
+
+    async def __call__(self):
+        calls = [(call.target, call.data) for call in self.calls]
+        if self.require_success:
+            self.block, outputs = await async_aggregate(
+                self.rpc, self.chain_id, encode_aggregate(calls), self.block_identifier
+            )
+            self.success = [True] * len(outputs)
+            result = {}
+            for call, output in zip(self.calls, outputs):
+                result.update(call.decode_output(output))
+            return result
+
+        self.block, results = await async_try_aggregate(
+            self.rpc,
+            self.chain_id,
+            encode_aggregate(calls, require_success=False),
+            self.block_identifier,
+        )
+        self.success = []
+        result = {}
+        for call, (success, output) in zip(self.calls, results):
+            decoded = await self._decode_or_retry(call, output if success else None)
+            self.success.append(decoded is not None)
+            if decoded is None:
+                decoded = {name: None for name, _ in call.returns or []}
+            result.update(decoded)
+        return result
+
+    async def _decode_or_retry(self, call: Call, output: t.Optional[memoryview]):
+        if output is not None:
+            try:
+                return call.decode_output(output)
+            except Exception as error:
+                logger.warning(f"malformed output of {call.function}: {error}")
+
+        try:
+            return call.decode_output(await self.rpc.eth_call(call.target, call.data, self.block))
+        except Exception as error:
+            logger.warning(f"{call.function} {call.args} failed on its own: {error}")
+            return None
@@ -0,0 +1,124 @@
+import typing as t
+import asyncio
+import logging
+
+try:
+    import aiohttp
+except ImportError:  # aiohttp is optional, only async clients need it
+    aiohttp = None
+
+from lido.multicall.transport import block_param, order_batch_responses
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncRPC:
+    """
+    Minimal asyncio JSON-RPC client over a keep-alive aiohttp session.
+    At most max_concurrency requests are in flight at the same time.
+    """
+
+    def __init__(
+        self,
+        endpoint_uri: str,
+        max_concurrency: int = 10,
+        session: t.Optional["aiohttp.ClientSession"] = None,
+        request_kwargs: t.Optional[t.Dict] = None,
+    ):
+        self.endpoint_uri = endpoint_uri
+        self.max_concurrency = max_concurrency
+        self.request_kwargs = request_kwargs or {}
+        self._session = session
+        self._own_session = session is None
+        # Created on first use, so it belongs to the running event loop
+        self._semaphore: t.Optional[asyncio.Semaphore] = None
+
+    @property
+    def session(self) -> "aiohttp.ClientSession":
+        if self._session is None:
+            if aiohttp is None:
+                raise ImportError("AsyncRPC needs aiohttp to create its session")
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency)
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    async def close(self) -> None:
+        if self._own_session and self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _post(self, payload):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            async with self.session.post(
+                self.endpoint_uri, json=payload, **self.request_kwargs
+            ) as response:
+                response.raise_for_status()
+                return await response.json()
+
+    async def request(self, method: str, params: t.List):
+        """Send one request, JSON-RPC errors are raised as ValueError the way web3 does"""
+        response = await self._post({"jsonrpc": "2.0", "id": 0, "method": method, "params": params})
+        if "error" in response:
+            raise ValueError(response["error"])
+        return response["result"]
+
+    async def batch(self, batch: t.List[t.Tuple[str, t.List]]) -> t.List[t.Dict]:
+        """Send (method, params) requests in one batch, responses are in requests order"""
+        responses = await self._post(
+            [
+                {"jsonrpc": "2.0", "id": i, "method": method, "params": params}
+                for i, (method, params) in enumerate(batch)
+            ]
+        )
+        return order_batch_responses(responses, len(batch))
+
+    async def chain_id(self) -> int:
+        return int(await self.request("eth_chainId", []), 16)
+
+    async def get_block(self, block_identifier="latest") -> t.Dict:
+        """Block number and timestamp of a block number, hash or tag"""
+        param = block_param(block_identifier)
+        if param.startswith("0x") and len(param) == 66:
+            block = await self.request("eth_getBlockByHash", [param, False])
+        else:
+            block = await self.request("eth_getBlockByNumber", [param, False])
+        if block is None:
+            raise ValueError(f"Block {param} not found")
+        return {"number": int(block["number"], 16), "timestamp": int(block["timestamp"], 16)}
+
+    async def eth_call(self, to: str, data: bytes, block_identifier=None) -> bytes:
+        result = await self.request(
+            "eth_call",
+            [{"to": to, "data": "0x" + bytes(data).hex()}, block_param(block_identifier)],
+        )
+        return bytes.fromhex(result[2:])
+
+    async def call_many(
+        self, calls: t.Sequence[t.Tuple[str, bytes]], block_identifier=None
+    ) -> t.Tuple[int, t.List[t.Tuple[bool, bytes]]]:
+        """
+        eth_call every (target, calldata) pair in one batch, returns block and (success, output)
+        for every call. The block is resolved first, so all calls read the same one.
+        """
+        block = (
+            block_identifier
+            if isinstance(block_identifier, int)
+            else (await self.get_block(block_identifier))["number"]
+        )
+        responses = await self.batch(
+            [
+                ("eth_call", [{"to": target, "data": "0x" + bytes(data).hex()}, hex(block)])
+                for target, data in calls
+            ]
+        )
+
+        results = []
+        for (target, _), response in zip(calls, responses):
+            if "error" in response:
+                logger.debug(f"eth_call to {target} failed: {response['error']}")
+                results.append((False, b""))
+            else:
+                results.append((True, bytes.fromhex(response["result"][2:])))
+        return block, results
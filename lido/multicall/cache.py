@@ -0,0 +1,174 @@
+import typing as t
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Blocks this deep are final for sure when the node doesn't know the finalized tag
+FINALITY_DEPTH = 64
+
+
+def _is_block_hash(block_identifier) -> bool:
+    if isinstance(block_identifier, bytes):
+        return len(block_identifier) == 32
+    return isinstance(block_identifier, str) and len(block_identifier) == 66
+
+
+class RPCCache:
+    """
+    Cache of eth_call results keyed by the digest of (chain_id, block, to, calldata).
+    A bounded LRU in memory, backed by an optional SQLite file for results that can't change:
+    reads at a finalized block number or a block hash never expire,
+    reads at the latest block or other tags expire after latest_ttl seconds.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 10_000,
+        path: t.Optional[str] = None,
+        latest_ttl: float = 12.0,
+        clock: t.Callable[[], float] = time.monotonic,
+    ):
+        self.max_size = max_size
+        self.latest_ttl = latest_ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        # digest -> (output, expiry time or None)
+        self._memory: "OrderedDict[bytes, t.Tuple[bytes, t.Optional[float]]]" = OrderedDict()
+        # chain_id -> (finalized block, expiry time)
+        self._finalized: t.Dict[int, t.Tuple[int, float]] = {}
+        self._lock = threading.Lock()
+
+        self.connection = None
+        if path is not None:
+            self.connection = sqlite3.connect(path, check_same_thread=False)
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS calls (digest BLOB PRIMARY KEY, output BLOB NOT NULL)"
+            )
+            self.connection.commit()
+
+    @staticmethod
+    def digest(chain_id: int, block_identifier, to: str, data: bytes) -> bytes:
+        if isinstance(block_identifier, bytes):
+            block_identifier = "0x" + block_identifier.hex()
+        key = hashlib.sha256(f"{chain_id}:{block_identifier}:{to.lower()}:".encode())
+        key.update(data)
+        return key.digest()
+
+    @property
+    def stats(self) -> t.Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "disk_hits": self.disk_hits,
+            "size": len(self._memory),
+        }
+
+    def get(self, digest: bytes) -> t.Optional[bytes]:
+        with self._lock:
+            entry = self._memory.get(digest)
+            if entry is not None:
+                output, expires = entry
+                if expires is None or expires > self.clock():
+                    self._memory.move_to_end(digest)
+                    self.hits += 1
+                    return output
+                del self._memory[digest]
+
+            if self.connection is not None:
+                row = self.connection.execute(
+                    "SELECT output FROM calls WHERE digest = ?", (digest,)
+                ).fetchone()
+                if row is not None:
+                    self._remember(digest, row[0], None)
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return row[0]
+
+            self.misses += 1
+            return None
+
+    def put(self, digest: bytes, output: bytes, final: bool) -> None:
+        """Store an output, results at final blocks are kept for good, others for latest_ttl"""
+        output = bytes(output)
+        with self._lock:
+            self._remember(digest, output, None if final else self.clock() + self.latest_ttl)
+            if final and self.connection is not None:
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO calls (digest, output) VALUES (?, ?)", (digest, output)
+                )
+                self.connection.commit()
+
+    def _remember(self, digest: bytes, output: bytes, expires: t.Optional[float]) -> None:
+        self._memory[digest] = (output, expires)
+        self._memory.move_to_end(digest)
+        while len(self._memory) > self.max_size:
+            self._memory.popitem(last=False)
+
+    def is_final(self, w3, chain_id: int, block_identifier) -> bool:
+        """Check if results at the block can't change anymore"""
+        if _is_block_hash(block_identifier):
+            return True
+        if not isinstance(block_identifier, int):
+            return False
+
+        with self._lock:
+            finalized, expires = self._finalized.get(chain_id, (None, 0))
+        if finalized is None or block_identifier > finalized and expires <= self.clock():
+            finalized = self._get_finalized_block(w3)
+            with self._lock:
+                self._finalized[chain_id] = (finalized, self.clock() + self.latest_ttl)
+        return block_identifier <= finalized
+
+    @staticmethod
+    def _get_finalized_block(w3) -> int:
+        try:
+            return w3.eth.getBlock("finalized")["number"]
+        except Exception:
+            # Nodes before the merge don't know the tag
+            return w3.eth.getBlock("latest")["number"] - FINALITY_DEPTH
+
+    def call(self, w3, chain_id: int, to: str, data: bytes, block_identifier=None) -> bytes:
+        """eth_call through the cache"""
+        digest = self.digest(chain_id, block_identifier or "latest", to, data)
+        output = self.get(digest)
+        if output is not None:
+            return output
+
+        output = w3.eth.call({"to": to, "data": data}, block_identifier)
+        self.put(digest, output, self.is_final(w3, chain_id, block_identifier))
+        return output
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            self._finalized.clear()
+
+    def close(self) -> None:
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+# Caches of web3 instances with the chain id they're for
+RPC_CACHES: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+
+def set_rpc_cache(w3, cache: t.Optional[RPCCache]) -> None:
+    """Cache every eth_call of the library made with w3, None turns caching off"""
+    if cache is None:
+        RPC_CACHES.pop(w3, None)
+    else:
+        RPC_CACHES[w3] = (cache, w3.eth.chainId)
+
+
+def get_rpc_cache(w3) -> t.Optional[RPCCache]:
+    entry = RPC_CACHES.get(w3)
+    return entry[0] if entry is not None else None
@@ -1,18 +1,40 @@
+from functools import lru_cache
+
 from eth_utils import to_checksum_address
-from lido.multicall import Signature
+from lido.multicall.cache import RPC_CACHES
+from lido.multicall.signature import get_signature
+
+
+@lru_cache(maxsize=None)
+def get_checksum_address(address: str) -> str:
+    """Process-wide registry of checksummed addresses"""
+    return to_checksum_address(address)
+
+
+def eth_call(w3, to: str, data: bytes, block_identifier=None) -> bytes:
+    """Every read of the library goes through here, at the latest block by default"""
+    cached = RPC_CACHES.get(w3)
+    if cached is not None:
+        cache, chain_id = cached
+        return cache.call(w3, chain_id, to, data, block_identifier)
+    return w3.eth.call({"to": to, "data": data}, block_identifier)
 
 
 class Call:
-    def __init__(self, w3, target, function, returns=None):
-        self.target = to_checksum_address(target)
+    # Tens of thousands of calls are created for a full key sync, keep them light
+    __slots__ = ("target", "function", "args", "w3", "signature", "returns", "block_identifier")
+
+    def __init__(self, w3, target, function, returns=None, block_identifier=None):
+        self.target = get_checksum_address(target)
         if isinstance(function, list):
             self.function, *self.args = function
         else:
             self.function = function
             self.args = None
         self.w3 = w3
-        self.signature = Signature(self.function)
+        self.signature = get_signature(self.function)
         self.returns = returns
+        self.block_identifier = block_identifier
 
     @property
     def data(self):
@@ -32,5 +54,5 @@ class Call:
     def __call__(self, args=None):
         args = args or self.args
         calldata = self.signature.encode_data(args)
-        output = self.w3.eth.call({"to": self.target, "data": calldata})
+        output = eth_call(self.w3, self.target, calldata, self.block_identifier)
         return self.decode_output(output)
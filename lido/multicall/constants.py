@@ -18,3 +18,17 @@ MULTICALL_ADDRESSES = {
     Network.xDai: "0xb5b692a88BDFc81ca69dcB1d924f59f0413A602a",
     Network.Ropsten: "0x53c43764255c17bd724f74c4ef150724ac50a3ed",
 }
+
+# Multicall2 adds tryAggregate/tryBlockAndAggregate returning a success flag for every call
+MULTICALL2_ADDRESSES = {
+    Network.Mainnet: "0x5BA1e12693Dc8F9c48aAD8770482f4739bEeD696",
+    Network.Kovan: "0x5BA1e12693Dc8F9c48aAD8770482f4739bEeD696",
+    Network.Rinkeby: "0x5BA1e12693Dc8F9c48aAD8770482f4739bEeD696",
+    Network.Görli: "0x5BA1e12693Dc8F9c48aAD8770482f4739bEeD696",
+    Network.Ropsten: "0x5BA1e12693Dc8F9c48aAD8770482f4739bEeD696",
+}
+
+AGGREGATE_SIGNATURE = "aggregate((address,bytes)[])(uint256,bytes[])"
+TRY_AGGREGATE_SIGNATURE = (
+    "tryBlockAndAggregate(bool,(address,bytes)[])(uint256,bytes32,(bool,bytes)[])"
+)
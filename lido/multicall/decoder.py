@@ -0,0 +1,98 @@
+import typing as t
+
+from lido.multicall.constants import AGGREGATE_SIGNATURE
+from lido.multicall.signature import get_signature
+
+WORD = 32
+
+
+def _read_word(buffer: memoryview, position: int) -> int:
+    if position + WORD > len(buffer):
+        raise ValueError(f"Malformed ABI data: word at {position} is out of {len(buffer)} bytes")
+    return int.from_bytes(buffer[position : position + WORD], "big")
+
+
+def _read_bytes(buffer: memoryview, position: int) -> memoryview:
+    length = _read_word(buffer, position)
+    if position + WORD + length > len(buffer):
+        raise ValueError(f"Malformed ABI data: {length} bytes at {position} are out of buffer")
+    return buffer[position + WORD : position + WORD + length]
+
+
+def decode_aggregate(output: bytes) -> t.Tuple[int, t.List[memoryview]]:
+    """
+    Decode (uint256,bytes[]) returned by aggregate() by walking offsets.
+    Outputs are memoryview slices of the returned buffer, nothing is copied.
+    """
+    buffer = memoryview(output)
+    block = _read_word(buffer, 0)
+    array = _read_word(buffer, WORD)
+    count = _read_word(buffer, array)
+    # Item offsets are relative to the end of the array length word
+    heads = array + WORD
+    return block, [
+        _read_bytes(buffer, heads + _read_word(buffer, heads + i * WORD)) for i in range(count)
+    ]
+
+
+def decode_try_aggregate(output: bytes) -> t.Tuple[int, t.List[t.Tuple[bool, memoryview]]]:
+    """
+    Decode (uint256,bytes32,(bool,bytes)[]) returned by tryBlockAndAggregate() the same way,
+    every output comes with its success flag
+    """
+    buffer = memoryview(output)
+    block = _read_word(buffer, 0)
+    array = _read_word(buffer, 2 * WORD)
+    count = _read_word(buffer, array)
+    heads = array + WORD
+
+    results = []
+    for i in range(count):
+        element = heads + _read_word(buffer, heads + i * WORD)
+        success = _read_word(buffer, element)
+        if success > 1:
+            raise ValueError(f"Malformed ABI data: {success} is not a bool")
+        data = element + _read_word(buffer, element + WORD)
+        results.append((success == 1, _read_bytes(buffer, data)))
+    return block, results
+
+
+def decode_aggregate_calldata(calldata: bytes) -> t.List[t.Tuple[str, memoryview]]:
+    """
+    Decode (target, calldata) pairs back from aggregate() or tryBlockAndAggregate() calldata,
+    so a prepared batch can be sent as plain calls instead
+    """
+    # The calls array is the only argument of aggregate() and the second one of the other
+    buffer = memoryview(calldata)[4:]
+    aggregate = bytes(calldata[:4]) == get_signature(AGGREGATE_SIGNATURE).fourbyte
+    array = _read_word(buffer, 0 if aggregate else WORD)
+    count = _read_word(buffer, array)
+    heads = array + WORD
+
+    calls = []
+    for i in range(count):
+        element = heads + _read_word(buffer, heads + i * WORD)
+        target = bytes(buffer[element + 12 : element + WORD])
+        data = element + _read_word(buffer, element + WORD)
+        calls.append(("0x" + target.hex(), _read_bytes(buffer, data)))
+    return calls
+
+
+def decode_signing_keys(
+    outputs: t.Sequence[memoryview],
+) -> t.Tuple[t.List[bytes], t.List[bytes], t.List[bool]]:
+    """
+    Decode getSigningKey() (bytes,bytes,bool) outputs into pubkey, signature and used columns.
+    Same results as the generic decoder, without building a tuple per key.
+    """
+    pubkeys = []
+    signatures = []
+    used = []
+    for output in outputs:
+        pubkeys.append(bytes(_read_bytes(output, _read_word(output, 0))))
+        signatures.append(bytes(_read_bytes(output, _read_word(output, WORD))))
+        flag = _read_word(output, 2 * WORD)
+        if flag > 1:
+            raise ValueError(f"Malformed ABI data: {flag} is not a bool")
+        used.append(flag == 1)
+    return pubkeys, signatures, used
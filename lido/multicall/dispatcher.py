@@ -0,0 +1,24 @@
+import typing as t
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+
+
+def dispatch(
+    func: t.Callable[[t.Any], t.Any], batches: t.Sequence[t.Any], max_workers: int = 1
+) -> t.List[t.Any]:
+    """
+    Run func on every batch keeping up to max_workers batches in flight.
+    Results are returned in the order of batches, no matter which batch finished first.
+    The first failing batch is raised, batches which haven't started by then are dropped.
+    """
+    if max_workers <= 1 or len(batches) <= 1:
+        return [func(batch) for batch in batches]
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(batches))) as executor:
+        futures = [executor.submit(func, batch) for batch in batches]
+        done, pending = wait(futures, return_when=FIRST_EXCEPTION)
+        failed = next((x for x in futures if x in done and x.exception() is not None), None)
+        if failed is not None:
+            for future in pending:
+                future.cancel()
+            raise failed.exception()
+        return [future.result() for future in futures]
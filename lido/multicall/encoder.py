@@ -0,0 +1,136 @@
+import re
+import typing as t
+from functools import lru_cache
+
+from lido.multicall.call import get_checksum_address
+from lido.multicall.constants import AGGREGATE_SIGNATURE, TRY_AGGREGATE_SIGNATURE
+from lido.multicall.signature import get_signature
+
+WORD = 32
+
+# Inputs we know how to patch into a template: one big-endian word each
+INTEGER_TYPE = re.compile(r"^(u?)int(\d*)$")
+
+
+def _word(value: int) -> bytes:
+    return value.to_bytes(WORD, "big")
+
+
+def _padded(length: int) -> int:
+    return (length + WORD - 1) // WORD * WORD
+
+
+def _address_word(address: str) -> bytes:
+    return bytes(12) + bytes.fromhex(get_checksum_address(address)[2:])
+
+
+def _head(require_success: bool) -> bytes:
+    """
+    Selector and arguments before the calls array: aggregate(calls) reverting on any failed call
+    or tryBlockAndAggregate(false, calls) returning a success flag for every call
+    """
+    if require_success:
+        return get_signature(AGGREGATE_SIGNATURE).fourbyte + _word(WORD)
+    return get_signature(TRY_AGGREGATE_SIGNATURE).fourbyte + _word(0) + _word(2 * WORD)
+
+
+def encode_aggregate(calls: t.Sequence[t.Tuple[str, bytes]], require_success: bool = True) -> bytes:
+    """
+    Encode aggregate((address,bytes)[]) calldata for (target, calldata) pairs
+    into one preallocated buffer, without going through the generic ABI encoder.
+    Without require_success it's tryBlockAndAggregate(bool,(address,bytes)[]) of Multicall2.
+    """
+    head = _head(require_success)
+    sizes = [3 * WORD + _padded(len(data)) for _, data in calls]
+
+    buffer = bytearray(len(head) + WORD + len(calls) * WORD + sum(sizes))
+    buffer[0 : len(head)] = head
+    buffer[len(head) : len(head) + WORD] = _word(len(calls))
+
+    # Element offsets are relative to the end of the array length word
+    heads = len(head) + WORD
+    offset = len(calls) * WORD
+    for i, ((target, data), size) in enumerate(zip(calls, sizes)):
+        buffer[heads + i * WORD : heads + (i + 1) * WORD] = _word(offset)
+        element = heads + offset
+        buffer[element : element + WORD] = _address_word(target)
+        buffer[element + WORD : element + 2 * WORD] = _word(2 * WORD)
+        buffer[element + 2 * WORD : element + 3 * WORD] = _word(len(data))
+        buffer[element + 3 * WORD : element + 3 * WORD + len(data)] = data
+        offset += size
+
+    return bytes(buffer)
+
+
+class AggregateTemplate:
+    """
+    Bulk encoder of aggregate() calldata for many calls of one function on one target.
+    Works for functions with integer and bool inputs only: every call has the same
+    fixed-size layout, so the whole payload is a prebuilt element repeated
+    with the arguments patched in.
+    """
+
+    def __init__(self, target: str, signature: str):
+        self.target = get_checksum_address(target)
+        self.signature = get_signature(signature)
+        self.input_bits = []
+        for input_type in filter(None, self.signature.input_types[1:-1].split(",")):
+            if input_type == "bool":
+                self.input_bits.append((False, 1))
+                continue
+            match = INTEGER_TYPE.match(input_type)
+            if not match:
+                raise ValueError(f"{input_type} input can't be encoded with a template")
+            self.input_bits.append((match.group(1) == "", int(match.group(2) or 256)))
+
+        calldata = self.signature.fourbyte + bytes(WORD * len(self.input_bits))
+        self.element = (
+            _address_word(target)
+            + _word(2 * WORD)
+            + _word(len(calldata))
+            + calldata.ljust(_padded(len(calldata)), b"\0")
+        )
+        self.arguments_offset = 3 * WORD + len(self.signature.fourbyte)
+
+    def _encode_argument(self, value: int, signed: bool, bits: int) -> bytes:
+        value = int(value)
+        if signed:
+            if not -(2 ** (bits - 1)) <= value < 2 ** (bits - 1):
+                raise ValueError(f"{value} doesn't fit into int{bits}")
+            return value.to_bytes(WORD, "big", signed=True)
+        if not 0 <= value < 2 ** bits:
+            raise ValueError(f"{value} doesn't fit into uint{bits}")
+        return _word(value)
+
+    def encode(self, args_list: t.Sequence[t.Sequence[int]], require_success: bool = True) -> bytes:
+        """
+        Encode aggregate() calldata calling the function once for every args in args_list,
+        tryBlockAndAggregate() one without require_success
+        """
+        head = _head(require_success)
+        count = len(args_list)
+        size = len(self.element)
+        heads = len(head) + WORD
+        elements = heads + count * WORD
+
+        buffer = bytearray(elements + count * size)
+        buffer[0 : len(head)] = head
+        buffer[len(head) : heads] = _word(count)
+        buffer[heads:elements] = b"".join(_word(count * WORD + i * size) for i in range(count))
+        buffer[elements:] = self.element * count
+
+        for i, args in enumerate(args_list):
+            if len(args) != len(self.input_bits):
+                raise ValueError(f"{self.signature.function} expects {len(self.input_bits)} args")
+            position = elements + i * size + self.arguments_offset
+            for value, (signed, bits) in zip(args, self.input_bits):
+                buffer[position : position + WORD] = self._encode_argument(value, signed, bits)
+                position += WORD
+
+        return bytes(buffer)
+
+
+@lru_cache(maxsize=None)
+def get_aggregate_template(target: str, signature: str) -> AggregateTemplate:
+    """Process-wide registry of aggregate templates"""
+    return AggregateTemplate(target, signature)
@@ -1,23 +1,125 @@
+import typing as t
+import logging
 from typing import List
 
 from lido.multicall import Call
-from lido.multicall.constants import MULTICALL_ADDRESSES
+from lido.multicall.call import eth_call, get_checksum_address
+from lido.multicall.constants import MULTICALL_ADDRESSES, MULTICALL2_ADDRESSES
+from lido.multicall.decoder import decode_aggregate, decode_aggregate_calldata, decode_try_aggregate
+from lido.multicall.encoder import encode_aggregate
+from lido.multicall.transport import get_batch_transport, is_gas_cap_error
+
+logger = logging.getLogger(__name__)
+
+
+def batch_aggregate(
+    w3, calldata: bytes, block_identifier=None
+) -> t.Tuple[int, t.List[t.Tuple[bool, memoryview]]]:
+    """
+    Send the calls of prepared aggregate() or tryBlockAndAggregate() calldata as one
+    JSON-RPC batch of plain eth_calls, returns block and (success, output) for every call
+    """
+    transport = get_batch_transport(w3)
+    if transport is None:
+        raise ValueError(f"No multicall contract for chain {w3.eth.chainId} and no HTTP endpoint")
+    block, results = transport.call(decode_aggregate_calldata(calldata), block_identifier)
+    return block, [(success, memoryview(output)) for success, output in results]
+
+
+def _can_batch(w3, error: Exception) -> bool:
+    if not is_gas_cap_error(error) or get_batch_transport(w3) is None:
+        return False
+    logger.warning(f"multicall hit the gas cap ({error}), sending plain calls in a batch")
+    return True
+
+
+def aggregate(w3, calldata: bytes, block_identifier=None) -> t.Tuple[int, t.List[memoryview]]:
+    """
+    Send prepared aggregate() calldata to the multicall contract, returns block and outputs.
+    Calls go in a JSON-RPC batch instead when the chain has no multicall contract
+    or the multicall hits the node gas cap.
+    """
+    address = MULTICALL_ADDRESSES.get(w3.eth.chainId)
+    if address is not None:
+        try:
+            address = get_checksum_address(address)
+            return decode_aggregate(eth_call(w3, address, calldata, block_identifier))
+        except Exception as error:
+            if not _can_batch(w3, error):
+                raise
+
+    block, results = batch_aggregate(w3, calldata, block_identifier)
+    if not all(success for success, _ in results):
+        raise ValueError(f"Multicall aggregate failed at block {block}")
+    return block, [output for _, output in results]
+
+
+def try_aggregate(
+    w3, calldata: bytes, block_identifier=None
+) -> t.Tuple[int, t.List[t.Tuple[bool, memoryview]]]:
+    """
+    Send prepared tryBlockAndAggregate() calldata to the Multicall2 contract,
+    returns block and (success, output) for every call.
+    Calls go in a JSON-RPC batch instead the same way as for aggregate().
+    """
+    address = MULTICALL2_ADDRESSES.get(w3.eth.chainId)
+    if address is not None:
+        try:
+            address = get_checksum_address(address)
+            return decode_try_aggregate(eth_call(w3, address, calldata, block_identifier))
+        except Exception as error:
+            if not _can_batch(w3, error):
+                raise
+
+    return batch_aggregate(w3, calldata, block_identifier)
 
 
 class Multicall:
-    def __init__(self, w3, calls: List[Call]):
+    def __init__(self, w3, calls: List[Call], block_identifier=None, require_success=True):
         self.w3 = w3
         self.calls = calls
+        self.block_identifier = block_identifier
+        # Without require_success a reverting or malformed call doesn't fail the whole batch,
+        # it's retried on its own and gets None results if it fails again
+        self.require_success = require_success
+        # Block the results are from, known after the call
+        self.block: t.Optional[int] = None
+        # Success flag of every call, known after the call
+        self.success: t.List[bool] = []
 
     def __call__(self):
-        aggregate = Call(
-            self.w3,
-            MULTICALL_ADDRESSES[self.w3.eth.chainId],
-            "aggregate((address,bytes)[])(uint256,bytes[])",
+        calls = [(call.target, call.data) for call in self.calls]
+        if self.require_success:
+            self.block, outputs = aggregate(self.w3, encode_aggregate(calls), self.block_identifier)
+            self.success = [True] * len(outputs)
+            result = {}
+            for call, output in zip(self.calls, outputs):
+                result.update(call.decode_output(output))
+            return result
+
+        self.block, results = try_aggregate(
+            self.w3, encode_aggregate(calls, require_success=False), self.block_identifier
         )
-        args = [[[call.target, call.data] for call in self.calls]]
-        block, outputs = aggregate(args)
+        self.success = []
         result = {}
-        for call, output in zip(self.calls, outputs):
-            result.update(call.decode_output(output))
+        for call, (success, output) in zip(self.calls, results):
+            decoded = self._decode_or_retry(call, output if success else None)
+            self.success.append(decoded is not None)
+            if decoded is None:
+                decoded = {name: None for name, _ in call.returns or []}
+            result.update(decoded)
         return result
+
+    def _decode_or_retry(self, call: Call, output: t.Optional[memoryview]):
+        if output is not None:
+            try:
+                return call.decode_output(output)
+            except Exception as error:
+                logger.warning(f"malformed output of {call.function}: {error}")
+
+        # The retry reads the same block as the batch did
+        try:
+            return call.decode_output(eth_call(self.w3, call.target, call.data, self.block))
+        except Exception as error:
+            logger.warning(f"{call.function} {call.args} failed on its own: {error}")
+            return None
@@ -0,0 +1,240 @@
+import typing as t
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+# Errors meaning the endpoint itself is in trouble, not the call
+ENDPOINT_ERRORS = (requests.exceptions.RequestException, ConnectionError, TimeoutError, OSError)
+
+
+class Endpoint:
+    """
+    One web3 instance of a pool with its health and load.
+    rate_limit is in requests per second, with bursts of up to one second of requests.
+    """
+
+    def __init__(self, w3, rate_limit: t.Optional[float] = None, clock=time.monotonic):
+        self.w3 = w3
+        self.rate_limit = rate_limit
+        self.clock = clock
+        self.latencies: t.Deque[float] = deque(maxlen=100)
+        self.in_flight = 0
+        self.requests = 0
+        self.failures = 0
+        self.ejected_until = 0.0
+        self._tokens = rate_limit or 0.0
+        self._updated = clock()
+
+    def __repr__(self):
+        provider = getattr(self.w3, "provider", None)
+        return f"Endpoint({getattr(provider, 'endpoint_uri', None) or provider!r})"
+
+    @property
+    def latency(self) -> float:
+        return sum(self.latencies) / len(self.latencies) if self.latencies else 0.0
+
+    def is_healthy(self, now: float) -> bool:
+        return self.ejected_until <= now
+
+    def token_wait(self, now: float) -> float:
+        """Seconds until the endpoint can take a request, 0 when it can right now"""
+        if self.rate_limit is None:
+            return 0.0
+        self._tokens = min(self.rate_limit, self._tokens + (now - self._updated) * self.rate_limit)
+        self._updated = now
+        return 0.0 if self._tokens >= 1 else (1 - self._tokens) / self.rate_limit
+
+    def take_token(self) -> None:
+        if self.rate_limit is not None:
+            self._tokens -= 1
+
+
+class _PoolEth:
+    """eth module of a pool: calls are scheduled, everything else goes to a healthy endpoint"""
+
+    def __init__(self, pool: "RPCPool"):
+        self._pool = pool
+
+    def call(self, transaction, block_identifier=None):
+        return self._pool.call(transaction, block_identifier)
+
+    def __getattr__(self, name):
+        return getattr(self._pool.primary.eth, name)
+
+
+class RPCPool:
+    """
+    Several web3 instances of the same chain used at once, in place of a single one.
+
+    Every eth_call goes to the least loaded healthy endpoint which is under its rate limit.
+    A call taking longer than hedge_percentile of recent latencies is sent to another endpoint
+    as well, the first result wins. Endpoints failing max_failures times in a row are ejected
+    for eject_seconds, their calls fail over to other endpoints.
+    Everything besides eth_call is done by the first healthy endpoint.
+
+    The pool runs calls in its own threads, callers own it and close it when they're done,
+    or use it as a context manager.
+    """
+
+    def __init__(
+        self,
+        endpoints: t.Sequence,
+        rate_limits: t.Optional[t.Sequence[t.Optional[float]]] = None,
+        hedge_percentile: t.Optional[float] = 95,
+        hedge_min_samples: int = 20,
+        max_failures: int = 3,
+        eject_seconds: float = 30.0,
+        max_workers: t.Optional[int] = None,
+        clock=time.monotonic,
+        sleep=time.sleep,
+    ):
+        if not endpoints:
+            raise ValueError("RPC pool needs at least one endpoint")
+        chain_ids = {w3.eth.chainId for w3 in endpoints}
+        if len(chain_ids) > 1:
+            raise ValueError(f"RPC pool endpoints are on different chains: {chain_ids}")
+        rate_limits = rate_limits or [None] * len(endpoints)
+        self.endpoints = [
+            Endpoint(w3, rate_limit, clock) for w3, rate_limit in zip(endpoints, rate_limits)
+        ]
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.max_failures = max_failures
+        self.eject_seconds = eject_seconds
+        self.clock = clock
+        self.sleep = sleep
+        self.hedged = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or 4 * len(self.endpoints))
+        self.eth = _PoolEth(self)
+
+    def __enter__(self) -> "RPCPool":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._executor.shutdown()
+
+    def __getattr__(self, name):
+        # provider, middleware_onion and the rest of web3 come from a healthy endpoint
+        if name.startswith("_") or name == "endpoints":
+            raise AttributeError(name)
+        return getattr(self.primary, name)
+
+    @property
+    def primary(self):
+        now = self.clock()
+        healthy = [x for x in self.endpoints if x.is_healthy(now)]
+        return (healthy or self.endpoints)[0].w3
+
+    def hedge_delay(self) -> t.Optional[float]:
+        """Latency percentile after which a call is hedged, None until enough calls are made"""
+        if self.hedge_percentile is None or len(self.endpoints) < 2:
+            return None
+        with self._lock:
+            latencies = sorted(x for endpoint in self.endpoints for x in endpoint.latencies)
+        if len(latencies) < self.hedge_min_samples:
+            return None
+        return latencies[min(int(len(latencies) * self.hedge_percentile / 100), len(latencies) - 1)]
+
+    def _acquire(self, exclude: t.Collection[Endpoint], block: bool = True):
+        """Pick an endpoint for a call and take its rate limit token"""
+        while True:
+            with self._lock:
+                now = self.clock()
+                candidates = [x for x in self.endpoints if x not in exclude]
+                if not candidates:
+                    return None
+                # Ejected endpoints are used only when nothing else is left
+                healthy = [x for x in candidates if x.is_healthy(now)] or sorted(
+                    candidates, key=lambda x: x.ejected_until
+                )[:1]
+                waits = {x: x.token_wait(now) for x in healthy}
+                ready = [x for x in healthy if waits[x] == 0]
+                if ready:
+                    endpoint = min(
+                        ready, key=lambda x: (x.in_flight, x.latency, self.endpoints.index(x))
+                    )
+                    endpoint.take_token()
+                    endpoint.in_flight += 1
+                    return endpoint
+                if not block:
+                    return None
+                delay = min(waits.values())
+            self.sleep(delay)
+
+    def _request(self, endpoint: Endpoint, transaction, block_identifier):
+        started = self.clock()
+        try:
+            output = endpoint.w3.eth.call(transaction, block_identifier)
+        except ENDPOINT_ERRORS:
+            with self._lock:
+                endpoint.in_flight -= 1
+                endpoint.failures += 1
+                if endpoint.failures >= self.max_failures:
+                    endpoint.ejected_until = self.clock() + self.eject_seconds
+                    logger.warning(f"{endpoint} failed {endpoint.failures} times, ejected")
+            raise
+        except Exception:
+            # The node has answered, the call itself failed
+            with self._lock:
+                endpoint.in_flight -= 1
+                endpoint.failures = 0
+            raise
+
+        with self._lock:
+            endpoint.in_flight -= 1
+            endpoint.requests += 1
+            endpoint.failures = 0
+            endpoint.latencies.append(self.clock() - started)
+        return output
+
+    def _submit(self, futures: t.Dict, endpoint: Endpoint, transaction, block_identifier):
+        future = self._executor.submit(self._request, endpoint, transaction, block_identifier)
+        futures[future] = endpoint
+
+    def call(self, transaction, block_identifier=None):
+        """eth_call on the pool, with hedging and failover"""
+        tried = [self._acquire(())]
+        futures: t.Dict = {}
+        self._submit(futures, tried[0], transaction, block_identifier)
+        delay = self.hedge_delay()
+        error = None
+
+        while futures:
+            done, _ = wait(futures, timeout=delay, return_when=FIRST_COMPLETED)
+            if not done:
+                # Slower than usual, race the call on another endpoint
+                delay = None
+                endpoint = self._acquire(tried, block=False)
+                if endpoint is not None:
+                    logger.debug(f"hedging a call to {tried[0]} with {endpoint}")
+                    self.hedged += 1
+                    tried.append(endpoint)
+                    self._submit(futures, endpoint, transaction, block_identifier)
+                continue
+
+            for future in done:
+                endpoint = futures.pop(future)
+                try:
+                    return future.result()
+                except ENDPOINT_ERRORS as e:
+                    logger.warning(f"{endpoint} failed: {e}")
+                    error = e
+
+            if not futures:
+                # Fail over to an endpoint the call hasn't been sent to yet
+                endpoint = self._acquire(tried)
+                if endpoint is not None:
+                    tried.append(endpoint)
+                    self._submit(futures, endpoint, transaction, block_identifier)
+
+        raise error
@@ -1,4 +1,7 @@
-from eth_abi import encode_single, decode_single
+from functools import lru_cache
+
+from eth_abi.decoding import ContextFramesBytesIO
+from eth_abi.registry import registry
 from eth_utils import function_signature_to_4byte_selector
 
 
@@ -31,9 +34,23 @@ class Signature:
         self.output_types = self.parts[2]
         self.function = "".join(self.parts[:2])
         self.fourbyte = function_signature_to_4byte_selector(self.function)
+        # Same coders encode_single/decode_single look up on every call
+        self.encoder = registry.get_encoder(self.input_types)
+        self.decoder = registry.get_decoder(self.output_types)
 
     def encode_data(self, args=None):
-        return self.fourbyte + encode_single(self.input_types, args) if args else self.fourbyte
+        return self.fourbyte + self.encoder(args) if args else self.fourbyte
 
     def decode_data(self, output):
-        return decode_single(self.output_types, output)
+        if not isinstance(output, (bytes, bytearray, memoryview)):
+            raise TypeError(f"The `data` value must be of bytes type.  Got {type(output)}")
+        return self.decoder(ContextFramesBytesIO(output))
+
+
+@lru_cache(maxsize=None)
+def get_signature(signature: str) -> Signature:
+    """
+    Process-wide registry of signatures, so parsing, selector hashing
+    and coder lookups are done once per signature string
+    """
+    return Signature(signature)
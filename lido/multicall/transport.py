@@ -0,0 +1,146 @@
+import typing as t
+import logging
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Parts of error messages nodes return when an eth_call runs into the node gas cap
+GAS_CAP_ERRORS = (
+    "out of gas",
+    "gas required exceeds",
+    "exceeds block gas limit",
+    "gas cap",
+    "gas limit",
+)
+
+
+def is_gas_cap_error(error: Exception) -> bool:
+    """Check if a failed multicall is worth splitting into plain eth_calls"""
+    message = str(error).lower()
+    return any(part in message for part in GAS_CAP_ERRORS)
+
+
+def order_batch_responses(responses, count: int) -> t.List[t.Dict]:
+    """
+    Responses of a JSON-RPC batch of count requests with ids 0..count-1, in requests order.
+    Nodes may answer in any order, a dropped or unmatched response is an error.
+    """
+    if not isinstance(responses, list):
+        # Nodes answer a rejected batch with a single error
+        raise ValueError(f"JSON-RPC batch failed: {responses.get('error', responses)}")
+
+    by_id = {response.get("id"): response for response in responses if isinstance(response, dict)}
+    missing = [i for i in range(count) if i not in by_id]
+    if len(responses) != count or missing:
+        raise ValueError(
+            f"JSON-RPC batch of {count} requests got {len(responses)} responses, "
+            f"missing ids {missing}"
+        )
+    return [by_id[i] for i in range(count)]
+
+
+def block_param(block_identifier) -> str:
+    """JSON-RPC block parameter of a web3 block identifier, the latest block by default"""
+    if isinstance(block_identifier, int):
+        return hex(block_identifier)
+    if isinstance(block_identifier, bytes):
+        return "0x" + block_identifier.hex()
+    return block_identifier or "latest"
+
+
+class BatchTransport:
+    """
+    Sends many plain eth_call requests as one JSON-RPC batch over a keep-alive session.
+    Needs no multicall contract and every call gets the node gas cap for itself.
+    """
+
+    def __init__(
+        self,
+        endpoint_uri: str,
+        request_kwargs: t.Optional[t.Dict] = None,
+        session: t.Optional[requests.Session] = None,
+        pool_size: int = 10,
+    ):
+        self.endpoint_uri = endpoint_uri
+        self.request_kwargs = request_kwargs or {}
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+        self.session = session
+
+    def request(self, batch: t.List[t.Tuple[str, t.List]]) -> t.List[t.Dict]:
+        """Send (method, params) requests in one batch, responses are in requests order"""
+        payload = [
+            {"jsonrpc": "2.0", "id": i, "method": method, "params": params}
+            for i, (method, params) in enumerate(batch)
+        ]
+        response = self.session.post(self.endpoint_uri, json=payload, **self.request_kwargs)
+        response.raise_for_status()
+        return order_batch_responses(response.json(), len(batch))
+
+    def get_block_number(self, block_identifier=None) -> int:
+        param = block_param(block_identifier)
+        if param.startswith("0x") and len(param) == 66:
+            method = "eth_getBlockByHash"
+        else:
+            method = "eth_getBlockByNumber"
+        response = self.request([(method, [param, False])])[0]
+        if response.get("error") or not response.get("result"):
+            raise ValueError(f"Unable to get block {param}: {response.get('error')}")
+        return int(response["result"]["number"], 16)
+
+    def call(
+        self, calls: t.Sequence[t.Tuple[str, bytes]], block_identifier=None
+    ) -> t.Tuple[int, t.List[t.Tuple[bool, bytes]]]:
+        """
+        eth_call every (target, calldata) pair in one batch, returns block and (success, output)
+        for every call. The block is resolved first, so all calls read the same one.
+        """
+        block = (
+            block_identifier
+            if isinstance(block_identifier, int)
+            else self.get_block_number(block_identifier)
+        )
+        responses = self.request(
+            [
+                ("eth_call", [{"to": target, "data": "0x" + bytes(data).hex()}, hex(block)])
+                for target, data in calls
+            ]
+        )
+
+        results = []
+        for (target, _), response in zip(calls, responses):
+            if "error" in response:
+                logger.debug(f"eth_call to {target} failed: {response['error']}")
+                results.append((False, b""))
+            else:
+                results.append((True, bytes.fromhex(response["result"][2:])))
+        return block, results
+
+
+# Transports are shared by endpoint, so are their connection pools
+BATCH_TRANSPORTS: t.Dict[str, BatchTransport] = {}
+_transports_lock = threading.Lock()
+
+
+def get_batch_transport(w3) -> t.Optional[BatchTransport]:
+    """JSON-RPC batch transport of the web3 provider endpoint, None for non-HTTP providers"""
+    provider = getattr(w3, "provider", None)
+    endpoint_uri = getattr(provider, "endpoint_uri", None)
+    if not endpoint_uri or not str(endpoint_uri).startswith("http"):
+        return None
+
+    with _transports_lock:
+        if endpoint_uri not in BATCH_TRANSPORTS:
+            request_kwargs = (
+                dict(provider.get_request_kwargs())
+                if hasattr(provider, "get_request_kwargs")
+                else {}
+            )
+            BATCH_TRANSPORTS[endpoint_uri] = BatchTransport(endpoint_uri, request_kwargs)
+        return BATCH_TRANSPORTS[endpoint_uri]
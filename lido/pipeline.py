@@ -0,0 +1,79 @@
+import typing as t
+import queue
+import threading
+
+# Batches waiting between the two stages when the consumer is behind
+DEFAULT_MAX_BATCHES = 16
+
+
+class PipelineCancelled(Exception):
+    """Raised in the producer when the consumer has failed"""
+
+
+def run_pipeline(
+    produce: t.Callable[[t.Callable[[t.List], None]], t.Any],
+    consume: t.Callable[[t.Iterator], t.Any],
+    max_batches: int = DEFAULT_MAX_BATCHES,
+) -> t.Tuple[t.Any, t.Any]:
+    """
+    Run produce(put) in a thread while consume(items) runs in this one,
+    returns what both of them return.
+
+    produce hands batches of items to put as soon as they are ready, consume gets the items
+    one by one. At most max_batches batches wait in between, so a slow consumer slows
+    the producer down instead of piling items up. The producer starts when the consumer
+    asks for its first item, so the consumer can start its own processes before that.
+    An error of either side is raised here, the other side is stopped.
+    """
+    batches: queue.Queue = queue.Queue(maxsize=max_batches)
+    cancelled = threading.Event()
+    produced: t.Dict[str, t.Any] = {}
+    done = object()
+
+    def put(batch: t.List) -> None:
+        while True:
+            if cancelled.is_set():
+                raise PipelineCancelled()
+            try:
+                batches.put(batch, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def run_producer() -> None:
+        try:
+            produced["result"] = produce(put)
+        except BaseException as error:
+            produced["error"] = error
+        finally:
+            # The consumer may be gone already, then nobody waits for this
+            while not cancelled.is_set():
+                try:
+                    batches.put(done, timeout=0.1)
+                    break
+                except queue.Full:
+                    pass
+
+    producer = threading.Thread(target=run_producer, name="pipeline-producer", daemon=True)
+
+    def items() -> t.Iterator:
+        producer.start()
+        while True:
+            batch = batches.get()
+            if batch is done:
+                break
+            yield from batch
+        if "error" in produced:
+            raise produced["error"]
+
+    try:
+        consumed = consume(items())
+    finally:
+        # Stops the producer if the consumer has failed or hasn't taken everything
+        cancelled.set()
+        if producer.ident is not None:
+            producer.join()
+
+    if "error" in produced and not isinstance(produced["error"], PipelineCancelled):
+        raise produced["error"]
+    return produced.get("result"), consumed
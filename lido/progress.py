@@ -0,0 +1,122 @@
+import typing as t
+import threading
+import time
+
+# Stages reporting progress, deadlines are given by these names
+FETCH_KEYS = "fetch_keys"
+VALIDATE_KEYS = "validate_keys"
+
+
+class Cancelled(Exception):
+    """Raised in a stage when the run has been cancelled"""
+
+
+class DeadlineExceeded(Cancelled):
+    """Raised in a stage which has run longer than its deadline"""
+
+
+class Progress(t.NamedTuple):
+    stage: str
+    # Keys done and all keys of the stage, total is None when it's not known
+    done: int
+    total: t.Optional[int]
+    # Batches of keys being fetched or validated at the moment
+    in_flight: int
+    # Seconds since the stage started, keys per second and seconds left
+    elapsed: float
+    rate: float
+    eta: t.Optional[float]
+
+
+class StageProgress:
+    """
+    Progress of a long-running stage, keys fetched or validated and batches in flight.
+
+    callback gets a Progress at most every interval seconds and once the stage is finished,
+    possibly from several threads. check() raises Cancelled once cancel is set and
+    DeadlineExceeded once the stage has run for more than deadline seconds, it's called
+    for every batch, so a stage stops at its next batch.
+    """
+
+    def __init__(
+        self,
+        stage: str,
+        callback: t.Optional[t.Callable[[Progress], None]] = None,
+        deadline: t.Optional[float] = None,
+        cancel: t.Optional[threading.Event] = None,
+        interval: float = 1.0,
+    ):
+        self.stage = stage
+        self.callback = callback
+        self.deadline = deadline
+        self.cancel = cancel
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.start()
+
+    def start(self, total: t.Optional[int] = None) -> None:
+        """Start the stage over, deadline is counted from here"""
+        self.total = total
+        self.done = 0
+        self.in_flight = 0
+        self.started = self.reported = time.monotonic()
+        self.check()
+
+    def check(self) -> None:
+        if self.cancel is not None and self.cancel.is_set():
+            raise Cancelled(f"{self.stage} has been cancelled")
+        if self.deadline is not None and time.monotonic() - self.started > self.deadline:
+            raise DeadlineExceeded(f"{self.stage} has run longer than {self.deadline}s")
+
+    def progress(self) -> Progress:
+        elapsed = time.monotonic() - self.started
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        eta = None
+        if self.total is not None and rate > 0:
+            eta = max(0, self.total - self.done) / rate
+        return Progress(self.stage, self.done, self.total, self.in_flight, elapsed, rate, eta)
+
+    def _update(self, done: int = 0, in_flight: int = 0) -> None:
+        with self.lock:
+            self.done += done
+            self.in_flight += in_flight
+            now = time.monotonic()
+            if self.callback is None or now - self.reported < self.interval:
+                return
+            self.reported = now
+            progress = self.progress()
+        self.callback(progress)
+
+    def add(self, count: int) -> None:
+        """count keys are done without a batch, e.g. they were stored or cached"""
+        self._update(done=count)
+
+    def submitted(self) -> None:
+        self.check()
+        self._update(in_flight=1)
+
+    def completed(self, count: int) -> None:
+        """A batch of count keys is done, 0 when it has failed"""
+        self._update(done=count, in_flight=-1)
+
+    def batch(self, count: int) -> "_Batch":
+        """Batch of count keys, as a context manager"""
+        return _Batch(self, count)
+
+    def finish(self) -> None:
+        if self.callback is not None:
+            with self.lock:
+                progress = self.progress()
+            self.callback(progress)
+
+
+class _Batch:
+    def __init__(self, progress: StageProgress, count: int):
+        self.progress = progress
+        self.count = count
+
+    def __enter__(self) -> None:
+        self.progress.submitted()
+
+    def __exit__(self, error_type, *args) -> None:
+        self.progress.completed(0 if error_type else self.count)
@@ -0,0 +1,125 @@
+import typing as t
+import logging
+
+from eth_abi.decoding import ContextFramesBytesIO
+from eth_abi.registry import registry
+from eth_utils import event_abi_to_log_topic
+
+from lido.contracts.abi_loader import load_contract_abi
+from lido.multicall.call import get_checksum_address
+
+logger = logging.getLogger(__name__)
+
+# Only key events change what is stored, operators themselves are read with getNodeOperator
+REGISTRY_EVENTS = ["SigningKeyAdded", "SigningKeyRemoved"]
+
+
+def _to_bytes(value) -> bytes:
+    return bytes.fromhex(value[2:]) if isinstance(value, str) else bytes(value)
+
+
+def _decode(types: t.List[str], data: bytes) -> t.Tuple:
+    return registry.get_decoder("(" + ",".join(types) + ")")(ContextFramesBytesIO(data))
+
+
+def get_registry_event_abis(registry_abi_path: str) -> t.Dict[bytes, t.Dict]:
+    """Registry events we sync from, by their log topic"""
+    return {
+        event_abi_to_log_topic(x): x
+        for x in load_contract_abi(registry_abi_path)
+        if x["type"] == "event" and x["name"] in REGISTRY_EVENTS
+    }
+
+
+def decode_registry_log(event_abis: t.Dict[bytes, t.Dict], log: t.Dict) -> t.Dict:
+    """
+    Example output:
+    {'event': 'SigningKeyAdded', 'blockNumber': 12588300, 'logIndex': 3,
+     'args': {'operatorId': 0, 'pubkey': b'...'}}
+    """
+    topics = [_to_bytes(x) for x in log["topics"]]
+    event_abi = event_abis[topics[0]]
+    indexed = [x for x in event_abi["inputs"] if x["indexed"]]
+    not_indexed = [x for x in event_abi["inputs"] if not x["indexed"]]
+
+    args = {}
+    for input_abi, topic in zip(indexed, topics[1:]):
+        args[input_abi["name"]] = _decode([input_abi["type"]], topic)[0]
+    values = _decode([x["type"] for x in not_indexed], _to_bytes(log["data"]))
+    for input_abi, value in zip(not_indexed, values):
+        args[input_abi["name"]] = value
+
+    return {
+        "event": event_abi["name"],
+        "blockNumber": log["blockNumber"],
+        "logIndex": log["logIndex"],
+        "args": args,
+    }
+
+
+def get_registry_events(
+    w3,
+    registry_address: str,
+    registry_abi_path: str,
+    from_block: int,
+    to_block: int,
+    max_blocks_range: int = 10_000,
+) -> t.List[t.Dict]:
+    """Fetch and decode registry events in block ranges of max_blocks_range, oldest first"""
+
+    event_abis = get_registry_event_abis(registry_abi_path)
+    events = []
+    for start in range(from_block, to_block + 1, max_blocks_range):
+        end = min(start + max_blocks_range - 1, to_block)
+        logs = w3.eth.getLogs(
+            {
+                "address": get_checksum_address(registry_address),
+                "fromBlock": start,
+                "toBlock": end,
+                "topics": [list(event_abis)],
+            }
+        )
+        logger.debug(f"{start=} {end=} {len(logs)=}")
+        events.extend(decode_registry_log(event_abis, log) for log in logs)
+
+    return sorted(events, key=lambda x: (x["blockNumber"], x["logIndex"]))
+
+
+def apply_registry_events(
+    model: t.Dict[int, t.Dict], events: t.List[t.Dict]
+) -> t.Dict[int, t.Dict]:
+    """
+    Apply registry events to a {operator_id: operator} model as loaded from KeyStore.
+    Keys are (pubkey, signature, used) tuples. Events only carry pubkeys, so added
+    and moved keys get None instead of a signature and have to be fetched from the registry.
+    Modifies the input!
+    """
+
+    for event in events:
+        name = event["event"]
+        args = event["args"]
+
+        operator = model.get(args["operatorId"])
+        # Operators not in the model are fetched in full,
+        # ones synced after this block already have the change
+        if operator is None or (operator["block"] or -1) >= event["blockNumber"]:
+            continue
+        keys = operator["keys"]
+
+        if name == "SigningKeyAdded":
+            keys.append((args["pubkey"], None, False))
+        elif name == "SigningKeyRemoved":
+            # The registry moves the last key into the place of the removed one
+            index = next(
+                (i for i in range(len(keys) - 1, -1, -1) if keys[i][0] == args["pubkey"]), None
+            )
+            if index is None:
+                logger.warning(f"removed key of operator {args['operatorId']} isn't in the model")
+                continue
+            # Moved key is refetched, so the store rewrites everything from its new index
+            keys[index] = (keys[-1][0], None, False)
+            keys.pop()
+
+        operator["totalSigningKeys"] = len(keys)
+
+    return model
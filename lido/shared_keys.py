@@ -0,0 +1,89 @@
+import typing as t
+import mmap
+import os
+import tempfile
+import uuid
+
+from lido.key_table import PUBKEY_LENGTH, SIGNATURE_LENGTH
+
+# Used flags of keys, MALFORMED keys can't be valid and aren't given to workers
+USED_FLAGS = {False: 0, True: 1, None: 2}
+MALFORMED = 3
+
+
+class SharedKeys:
+    """
+    Keys to validate in a memory-mapped file shared with worker processes.
+    Columns of pubkeys, signatures, used flags and matches lie one after another,
+    so workers read keys and write withdrawal credentials matches by row, nothing is pickled.
+    The file is put to /dev/shm when there is one, so it's in memory.
+    """
+
+    row_size = PUBKEY_LENGTH + SIGNATURE_LENGTH + 2
+
+    def __init__(self, size: int, path: t.Optional[str] = None):
+        self.size = size
+        self.owner = path is None
+        if path is None:
+            shm = "/dev/shm"
+            # Workers tell files apart by path, so it's never reused even after unlinking
+            fd, path = tempfile.mkstemp(
+                prefix=f"lido-keys-{uuid.uuid4().hex}-", dir=shm if os.path.isdir(shm) else None
+            )
+            os.ftruncate(fd, max(1, size * self.row_size))
+        else:
+            fd = os.open(path, os.O_RDWR)
+        self.path = path
+        try:
+            self.buffer = mmap.mmap(fd, max(1, size * self.row_size))
+        finally:
+            os.close(fd)
+
+    @property
+    def _signatures_offset(self) -> int:
+        return self.size * PUBKEY_LENGTH
+
+    @property
+    def _used_offset(self) -> int:
+        return self.size * (PUBKEY_LENGTH + SIGNATURE_LENGTH)
+
+    @property
+    def _matches_offset(self) -> int:
+        return self._used_offset + self.size
+
+    def set_item(self, row: int, item: t.Tuple[bytes, bytes, t.Optional[bool]]) -> None:
+        pubkey, signature, used = item
+        if len(pubkey) != PUBKEY_LENGTH or len(signature) != SIGNATURE_LENGTH:
+            self.buffer[self._used_offset + row] = MALFORMED
+            self.set_match(row, -1)
+            return
+
+        offset = row * PUBKEY_LENGTH
+        self.buffer[offset : offset + PUBKEY_LENGTH] = pubkey
+        offset = self._signatures_offset + row * SIGNATURE_LENGTH
+        self.buffer[offset : offset + SIGNATURE_LENGTH] = signature
+        self.buffer[self._used_offset + row] = USED_FLAGS[used]
+
+    def item(self, row: int) -> t.Optional[t.Tuple[bytes, bytes, t.Optional[bool]]]:
+        """(pubkey, signature, used) of a row, None for a malformed key"""
+        used = self.buffer[self._used_offset + row]
+        if used == MALFORMED:
+            return None
+        offset = self._signatures_offset + row * SIGNATURE_LENGTH
+        return (
+            self.buffer[row * PUBKEY_LENGTH : (row + 1) * PUBKEY_LENGTH],
+            self.buffer[offset : offset + SIGNATURE_LENGTH],
+            None if used == USED_FLAGS[None] else used == USED_FLAGS[True],
+        )
+
+    def set_match(self, row: int, match: int) -> None:
+        # Index of the match plus one, 0 for none
+        self.buffer[self._matches_offset + row] = match + 1
+
+    def match(self, row: int) -> int:
+        return self.buffer[self._matches_offset + row] - 1
+
+    def close(self) -> None:
+        self.buffer.close()
+        if self.owner:
+            os.unlink(self.path)
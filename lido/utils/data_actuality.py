@@ -1,8 +1,9 @@
 import typing as t
 
 
-def get_data_actuality(w3) -> t.Dict:
+def get_data_actuality(w3, block_identifier="latest") -> t.Dict:
+    block = w3.eth.getBlock(block_identifier)
     return {
-        "last_block": w3.eth.getBlock("latest")["number"],
-        "last_blocktime": w3.eth.getBlock("latest")["timestamp"],
+        "last_block": block["number"],
+        "last_blocktime": block["timestamp"],
     }
@@ -1,17 +1,25 @@
 import typing as t
 
-from py_ecc.bls import G2ProofOfPossession as bls
 from lido.eth2deposit.utils.ssz import (
-    DepositMessage,
+    compute_deposit_amount_root,
     compute_deposit_domain,
-    compute_signing_root,
+    compute_deposit_signing_root,
 )
 from lido.eth2deposit.settings import get_chain_setting
 from lido.constants.chains import get_chain_name, get_eth2_chain_name
 from lido.constants.withdrawal_credentials import get_withdrawal_credentials
 from lido.contracts.w3_contracts import get_contract
+from lido.validation_cache import ValidationCache
+from lido.key_table import PUBKEY_LENGTH, UNKNOWN, KeyTable, from_flag
+from lido.progress import VALIDATE_KEYS, StageProgress
+from lido.shared_keys import SharedKeys
+from lido.bls import get_bls_backend
 
-import concurrent
+import concurrent.futures
+import itertools
+import os
+from collections import deque
+from functools import partial
 
 
 def gen_possible_withdrawal_credentials(live_withdrawal_credentials, chain_id):
@@ -20,181 +28,689 @@ def gen_possible_withdrawal_credentials(live_withdrawal_credentials, chain_id):
     )
 
 
-def validate_key(data: t.Dict) -> t.Optional[bool]:
-    """Run signature validation on a key"""
+# Minimum staking requirement of 32 ETH per validator
+REQUIRED_DEPOSIT_ETH = 32
+ETH2GWEI = 10 ** 9
+DEPOSIT_AMOUNT = REQUIRED_DEPOSIT_ETH * ETH2GWEI
 
-    key = data["key"]
-    chain_id = data["chain_id"]
-    live_withdrawal_credentials = data["live_withdrawal_credentials"]
-    possible_withdrawal_credentials = data["possible_withdrawal_credentials"]
-    strict = data["strict"]
 
-    # Is this key already validated?
-    if "valid_signature" in key.keys():
-        return None
+def get_fork_version(chain_id: int) -> bytes:
+    return get_chain_setting(get_eth2_chain_name(chain_id)).GENESIS_FORK_VERSION
 
+
+def get_key_bytes(key: t.Dict) -> t.Tuple[bytes, bytes]:
+    """Pubkey and deposit signature of a key, which can be hex strings or bytes"""
     pubkey = bytes.fromhex(key["key"]) if type(key["key"]) is str else key["key"]
     signature = (
         bytes.fromhex(key["depositSignature"])
         if type(key["depositSignature"]) is str
         else key["depositSignature"]
     )
+    return pubkey, signature
+
+
+class ValidationContext:
+    """
+    Everything validation of a key needs besides the key itself.
+    It's built once and handed to every worker process once by the pool initializer,
+    so only (pubkey, signature, used) of keys is sent to workers.
+    """
 
-    fork_version = get_chain_setting(get_eth2_chain_name(chain_id)).GENESIS_FORK_VERSION
-    domain = compute_deposit_domain(fork_version=fork_version)
-
-    # Minimum staking requirement of 32 ETH per validator
-    REQUIRED_DEPOSIT_ETH = 32
-    ETH2GWEI = 10 ** 9
-    amount = REQUIRED_DEPOSIT_ETH * ETH2GWEI
-
-    # If strict, not using any previous withdrawal credentials
-    # Checking only actual live withdrawal credentials for unused keys
-    if strict or ("used" in key and key["used"] is False):
-        deposit_message = DepositMessage(
-            pubkey=pubkey,
-            withdrawal_credentials=live_withdrawal_credentials,
-            amount=amount,
+    def __init__(
+        self,
+        chain_id: int,
+        live_withdrawal_credentials: bytes,
+        possible_withdrawal_credentials: t.List[bytes],
+        strict: bool,
+        amount: int = DEPOSIT_AMOUNT,
+        bls_backend: t.Optional[str] = None,
+    ):
+        self.chain_id = chain_id
+        self.live_withdrawal_credentials = live_withdrawal_credentials
+        self.possible_withdrawal_credentials = possible_withdrawal_credentials
+        self.strict = strict
+        self.amount = amount
+        self.fork_version = get_fork_version(chain_id)
+        self.domain = compute_deposit_domain(fork_version=self.fork_version)
+        # Same for every key, so it's hashed once
+        self.amount_root = compute_deposit_amount_root(amount)
+        self.bls = get_bls_backend(bls_backend)
+
+    def candidates(self, used: t.Optional[bool]) -> t.List[bytes]:
+        """Withdrawal credentials a key signature can be valid for"""
+
+        # If strict, not using any previous withdrawal credentials
+        # Checking only actual live withdrawal credentials for unused keys
+        if self.strict or used is False:
+            return [self.live_withdrawal_credentials]
+
+        # If a key has been used already or in loose mode, checking both new and any olds withdrawal creds
+        return self.possible_withdrawal_credentials
+
+    def signing_root(self, pubkey: bytes, withdrawal_credentials: bytes) -> bytes:
+        return compute_deposit_signing_root(
+            pubkey, withdrawal_credentials, self.amount, self.domain, self.amount_root
         )
 
-        signing_root = compute_signing_root(deposit_message, domain)
+    def find_withdrawal_credentials(self, item: t.Tuple[bytes, bytes, t.Optional[bool]]) -> int:
+        """
+        Index of the first candidate withdrawal credentials the signature
+        of a (pubkey, signature, used) key is valid for, -1 if none
+        """
+        pubkey, signature, used = item
+        # A malformed pubkey has no signing root, verification would reject it anyway
+        if len(pubkey) != PUBKEY_LENGTH:
+            return -1
+
+        # Early exit when any key succeeds validation, roots of later candidates aren't needed
+        signing_roots = (self.signing_root(pubkey, wc) for wc in self.candidates(used))
+        return self.bls.find_valid_message(pubkey, signing_roots, signature)
+
+    def find_withdrawal_credentials_batch(
+        self, items: t.Sequence[t.Tuple[bytes, bytes, t.Optional[bool]]]
+    ) -> t.List[int]:
+        """
+        find_withdrawal_credentials of many keys with batch verification.
+        Keys are verified against their first candidate together, the ones failing it
+        against their next candidate and so on, so matches are the same.
+        """
+        matches = [-1] * len(items)
+        candidates = [self.candidates(used) for _, _, used in items]
+        remaining = [i for i, (pubkey, _, _) in enumerate(items) if len(pubkey) == PUBKEY_LENGTH]
+
+        position = 0
+        while remaining:
+            remaining = [i for i in remaining if position < len(candidates[i])]
+            batch = []
+            for i in remaining:
+                pubkey, signature, _ = items[i]
+                batch.append(
+                    (pubkey, self.signing_root(pubkey, candidates[i][position]), signature)
+                )
+            results = self.bls.batch_verify(batch)
+            for i, valid in zip(remaining, results):
+                if valid:
+                    matches[i] = position
+            remaining = [i for i, valid in zip(remaining, results) if not valid]
+            position += 1
+
+        return matches
 
-        return bls.Verify(pubkey, signing_root, signature)
 
-    # If a key has been used already or in loose mode, checking both new and any olds withdrawal creds
-    for wc in possible_withdrawal_credentials:
-        deposit_message = DepositMessage(
-            pubkey=pubkey,
-            withdrawal_credentials=wc,
-            amount=amount,
-        )
+def validate_key(data: t.Dict) -> t.Optional[bool]:
+    """Run signature validation on a key"""
 
-        signing_root = compute_signing_root(deposit_message, domain)
+    key = data["key"]
 
-        verified = bls.Verify(pubkey, signing_root, signature)
+    # Is this key already validated?
+    if "valid_signature" in key.keys():
+        return None
 
-        # Early exit when any key succeeds validation
-        if verified is True:
-            return True
+    context = ValidationContext(
+        data["chain_id"],
+        data["live_withdrawal_credentials"],
+        data["possible_withdrawal_credentials"],
+        data["strict"],
+        bls_backend=data.get("bls_backend"),
+    )
 
     # Exit with False if none of the withdrawal creds combination were valid
-    return False
+    return context.find_withdrawal_credentials((*get_key_bytes(key), key.get("used"))) != -1
 
 
-def validate_keys_mono(
-    w3, operators: t.List[t.Dict], lido_address: str, lido_abi_path: str, strict: bool
-) -> t.List[t.Dict]:
+# Keys sent to a worker process at once when the chunk size isn't set
+MAX_CHUNK_SIZE = 64
+# Chunks per worker process the keys are split into at least, so the work is spread evenly
+CHUNKS_PER_WORKER = 4
+
+Item = t.Tuple[bytes, bytes, t.Optional[bool]]
+
+
+def _chunks(items: t.Iterable, size: int) -> t.Iterator[t.List]:
+    iterator = iter(items)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _match_keys(
+    context: ValidationContext, items: t.List[Item], batch_size: t.Optional[int]
+) -> t.List[int]:
+    """Withdrawal credentials matches of keys, batch verified in batch_size parts if it's set"""
+    if not batch_size:
+        return [context.find_withdrawal_credentials(item) for item in items]
+    return [
+        match
+        for batch in _chunks(items, batch_size)
+        for match in context.find_withdrawal_credentials_batch(batch)
+    ]
+
+
+# Context of the worker process, set once by the pool initializer
+_worker_context: t.Optional[ValidationContext] = None
+
+
+def _init_worker(context: ValidationContext) -> None:
+    global _worker_context
+    _worker_context = context
+
+
+def _validate_chunk(items: t.List[Item], batch_size: t.Optional[int]) -> bytes:
+    # One byte per key instead of a pickled list: index of the match plus one, 0 for none
+    return bytes(match + 1 for match in _match_keys(_worker_context, items, batch_size))
+
+
+# Shared keys the worker process has opened, only the ones of the latest map are kept
+_worker_keys: t.Dict[str, SharedKeys] = {}
+
+
+def _validate_shared_rows(
+    path: str, size: int, start: int, stop: int, batch_size: t.Optional[int]
+) -> None:
+    """Validate rows of shared keys, matches are written back to them"""
+    keys = _worker_keys.get(path)
+    if keys is None:
+        for previous in _worker_keys.values():
+            previous.close()
+        _worker_keys.clear()
+        keys = _worker_keys[path] = SharedKeys(size, path)
+
+    rows = [row for row in range(start, stop) if keys.item(row) is not None]
+    matches = _match_keys(_worker_context, [keys.item(row) for row in rows], batch_size)
+    for row, match in zip(rows, matches):
+        keys.set_match(row, match)
+
+
+class ValidationScheduler:
     """
-    This is an additional, single-process key validation function.
-    Modifies the input! Adds "valid_signature" field to every key item.
+    Process pool validating keys of all operators in chunks.
+    Every worker gets the context once, then only chunks of (pubkey, signature, used) keys.
+    At most max_in_flight chunks are submitted at once, so keys are read from the input
+    only as fast as workers validate them.
+    With shared_memory, keys are written to SharedKeys instead, workers get row ranges
+    of them and write matches back in place.
+    Validated keys and chunks in flight are reported to progress, it's checked for
+    cancellation before every chunk is submitted.
+    """
+
+    def __init__(
+        self,
+        context: ValidationContext,
+        chunk_size: t.Optional[int] = None,
+        max_in_flight: t.Optional[int] = None,
+        max_workers: t.Optional[int] = None,
+        batch_size: t.Optional[int] = None,
+        shared_memory: bool = True,
+        progress: t.Optional[StageProgress] = None,
+    ):
+        self.context = context
+        self.chunk_size = chunk_size
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_in_flight = max_in_flight or 2 * self.max_workers
+        self.batch_size = batch_size
+        self.shared_memory = shared_memory
+        self.progress = progress or StageProgress(VALIDATE_KEYS)
+        self.executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=self.max_workers, initializer=_init_worker, initargs=(context,)
+        )
+        # Chunks submitted and not done yet, queued ones are cancelled on close
+        self.pending: t.Set[concurrent.futures.Future] = set()
+
+    def __enter__(self) -> "ValidationScheduler":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def start(self) -> None:
+        """
+        Start all worker processes now instead of on the first chunks.
+        Since Python 3.9 the pool starts a worker per task submitted while none is idle,
+        so max_workers no-op tasks are submitted at once and waited for.
+        """
+        tasks = [self.executor.submit(int) for _ in range(self.max_workers)]
+        for task in tasks:
+            task.result()
+
+    def close(self) -> None:
+        # Chunks left are only there when validation has failed or has been cancelled.
+        # Same as shutdown(cancel_futures=True), which needs Python 3.9
+        while self.pending:
+            try:
+                self.pending.pop().cancel()
+            except KeyError:
+                break
+        self.executor.shutdown()
+
+    def _submit(self, fn, *args) -> concurrent.futures.Future:
+        future = self.executor.submit(fn, *args)
+        self.pending.add(future)
+        future.add_done_callback(self.pending.discard)
+        return future
+
+    def get_chunk_size(self, count: t.Optional[int]) -> int:
+        if self.chunk_size:
+            return self.chunk_size
+        if count is None:
+            return MAX_CHUNK_SIZE
+        return max(1, min(MAX_CHUNK_SIZE, -(-count // (self.max_workers * CHUNKS_PER_WORKER))))
+
+    def map(self, items: t.Iterable[Item], count: t.Optional[int] = None) -> t.Iterator[int]:
+        """
+        Withdrawal credentials matches of keys in their order, count is a hint for chunking.
+        With shared memory it has to be at least the number of keys.
+        """
+        if self.shared_memory:
+            yield from self._map_shared(items, count)
+            return
+
+        in_flight: t.Deque[concurrent.futures.Future] = deque()
+
+        def done():
+            matches = in_flight.popleft().result()
+            self.progress.completed(len(matches))
+            return (match - 1 for match in matches)
+
+        for chunk in _chunks(items, self.get_chunk_size(count)):
+            if len(in_flight) >= self.max_in_flight:
+                yield from done()
+            self.progress.submitted()
+            in_flight.append(self._submit(_validate_chunk, chunk, self.batch_size))
+
+        while in_flight:
+            yield from done()
+
+    def _map_shared(self, items: t.Iterable[Item], count: t.Optional[int]) -> t.Iterator[int]:
+        if count is None:
+            items = list(items)
+            count = len(items)
+        chunk_size = self.get_chunk_size(count)
+
+        keys = SharedKeys(count)
+        # (start, stop, future) of submitted row ranges
+        in_flight: t.Deque[t.Tuple[int, int, concurrent.futures.Future]] = deque()
+
+        def submit(start, stop):
+            self.progress.submitted()
+            future = self._submit(
+                _validate_shared_rows, keys.path, count, start, stop, self.batch_size
+            )
+            in_flight.append((start, stop, future))
+
+        def done():
+            start, stop, future = in_flight.popleft()
+            future.result()
+            self.progress.completed(stop - start)
+            return (keys.match(row) for row in range(start, stop))
+
+        try:
+            start = row = 0
+            for row, item in enumerate(items, 1):
+                keys.set_item(row - 1, item)
+                if row - start < chunk_size:
+                    continue
+                if len(in_flight) >= self.max_in_flight:
+                    yield from done()
+                submit(start, row)
+                start = row
+            if row > start:
+                submit(start, row)
+
+            while in_flight:
+                yield from done()
+        finally:
+            keys.close()
+
+
+def _key_items(keys: t.Union[t.Iterable[t.Dict], KeyTable]) -> t.Iterator[t.Optional[Item]]:
+    """(pubkey, signature, used) of keys, None for already validated ones"""
+    if isinstance(keys, KeyTable):
+        for row in range(len(keys)):
+            if keys.valid[row] != UNKNOWN:
+                yield None
+            else:
+                yield keys.pubkey(row), keys.signature(row), from_flag(keys.used[row])
+        return
+
+    for key in keys:
+        if "valid_signature" in key.keys():
+            yield None
+        else:
+            yield (*get_key_bytes(key), key.get("used"))
+
+
+def _set_results(
+    keys: t.Union[t.List[t.Dict], KeyTable], results: t.List[t.Optional[bool]]
+) -> None:
+    for i, result in enumerate(results):
+        # Is this key already validated?
+        if result is None:
+            continue
+        if isinstance(keys, KeyTable):
+            keys.valid[i] = int(result)
+        else:
+            keys[i]["valid_signature"] = result
+
+
+def _validate_keys(
+    map_keys: t.Callable[[t.Iterable[Item]], t.Iterable[int]],
+    keys: t.Union[t.Iterable[t.Dict], KeyTable],
+    context: ValidationContext,
+    validation_cache: t.Optional[ValidationCache] = None,
+    progress: t.Optional[StageProgress] = None,
+) -> t.List[t.Optional[bool]]:
+    """
+    Validation results of keys of an iterable or a table, None for already validated ones.
+    map_keys gives withdrawal credentials matches of (pubkey, signature, used) keys,
+    it's fed lazily, so only keys in progress are kept aside.
+    Verifications found in the cache are skipped, new ones are stored to it.
+    Skipped keys are reported to progress as done, map_keys reports the others.
     """
 
+    progress = progress or StageProgress(VALIDATE_KEYS)
+    results: t.List[t.Optional[bool]] = []
+
+    # (key index, digests of its candidates) of keys given to map_keys
+    pending: t.Deque[t.Tuple[int, t.Optional[t.List[bytes]]]] = deque()
+
+    def items() -> t.Iterator[Item]:
+        for i, item in enumerate(_key_items(keys)):
+            results.append(None)
+            # Is this key already validated?
+            if item is None:
+                progress.add(1)
+                continue
+
+            if validation_cache is None:
+                pending.append((i, None))
+                yield item
+                continue
+
+            digests = [
+                validation_cache.digest(item[0], item[1], wc, context.fork_version, context.amount)
+                for wc in context.candidates(item[2])
+            ]
+            known = validation_cache.get_many(digests)
+            if any(known.values()):
+                results[i] = True
+                progress.add(1)
+            elif len(known) == len(digests):
+                results[i] = False
+                progress.add(1)
+            else:
+                pending.append((i, digests))
+                yield item
+
+    verified = {}
+    for match in map_keys(items()):
+        i, digests = pending.popleft()
+        results[i] = match != -1
+        if digests is None:
+            continue
+        # Candidates after the matching one haven't been checked
+        for digest in digests if match == -1 else digests[: match + 1]:
+            verified[digest] = False
+        if match != -1:
+            verified[digests[match]] = True
+
+    if validation_cache is not None and verified:
+        validation_cache.put_many(verified)
+
+    return results
+
+
+def get_validation_context(
+    w3,
+    lido_address: str,
+    lido_abi_path: str,
+    strict: bool,
+    block_identifier=None,
+    bls_backend: t.Optional[str] = None,
+) -> ValidationContext:
+    """Validation context with the live withdrawal credentials of a Lido deployment"""
+
     # Prepare network vars
     lido = get_contract(w3, address=lido_address, path=lido_abi_path)
     chain_id = w3.eth.chainId
-    live_withdrawal_credentials = lido.functions.getWithdrawalCredentials().call()
+    live_withdrawal_credentials = lido.functions.getWithdrawalCredentials().call(
+        block_identifier=block_identifier or "latest"
+    )
 
     possible_withdrawal_credentials = gen_possible_withdrawal_credentials(
         live_withdrawal_credentials, chain_id
     )
 
-    for op_i, op in enumerate(operators):
-        for key_i, key in enumerate(op["keys"]):
-            # Is this key already validated?
-            if "valid_signature" not in key.keys():
-                operators[op_i]["keys"][key_i]["valid_signature"] = validate_key(
-                    {
-                        "chain_id": chain_id,
-                        "key": key,
-                        "live_withdrawal_credentials": live_withdrawal_credentials,
-                        "possible_withdrawal_credentials": possible_withdrawal_credentials,
-                        "strict": strict,
-                    }
-                )
+    return ValidationContext(
+        chain_id,
+        live_withdrawal_credentials,
+        possible_withdrawal_credentials,
+        strict,
+        bls_backend=bls_backend,
+    )
+
+
+def validate_keys_mono(
+    w3,
+    operators: t.Union[t.List[t.Dict], KeyTable],
+    lido_address: str,
+    lido_abi_path: str,
+    strict: bool,
+    block_identifier=None,
+    validation_cache: t.Optional[ValidationCache] = None,
+    batch_size: t.Optional[int] = None,
+    bls_backend: t.Optional[str] = None,
+    progress: t.Optional[StageProgress] = None,
+) -> t.List[t.Dict]:
+    """
+    This is an additional, single-process key validation function.
+    Modifies the input! Adds "valid_signature" field to every key item,
+    or sets valid flags of a KeyTable.
+    With a validation cache, only keys verified on no previous run are verified.
+    With a batch_size, chunks of keys are verified together by batch verification.
+    Signatures are verified with bls_backend, the fastest installed one by default.
+    Validated keys are reported to progress, which can also stop validation.
+    """
+
+    keys = (
+        operators
+        if isinstance(operators, KeyTable)
+        else [key for op in operators for key in op["keys"]]
+    )
+    progress = progress or StageProgress(VALIDATE_KEYS)
+    progress.start(len(keys))
+    context = get_validation_context(
+        w3, lido_address, lido_abi_path, strict, block_identifier, bls_backend
+    )
+
+    def map_keys(items: t.Iterable[Item]) -> t.Iterator[int]:
+        for chunk in _chunks(items, batch_size or 1):
+            with progress.batch(len(chunk)):
+                matches = _match_keys(context, chunk, batch_size)
+            yield from matches
+
+    results = _validate_keys(map_keys, keys, context, validation_cache, progress)
+
+    _set_results(keys, results)
+    progress.finish()
 
     return operators
 
 
 def validate_keys_multi(
-    w3, operators: t.List[t.Dict], lido_address: str, lido_abi_path: str, strict: bool
+    w3,
+    operators: t.Union[t.List[t.Dict], KeyTable],
+    lido_address: str,
+    lido_abi_path: str,
+    strict: bool,
+    block_identifier=None,
+    validation_cache: t.Optional[ValidationCache] = None,
+    batch_size: t.Optional[int] = None,
+    chunk_size: t.Optional[int] = None,
+    max_in_flight: t.Optional[int] = None,
+    shared_memory: bool = True,
+    bls_backend: t.Optional[str] = None,
+    progress: t.Optional[StageProgress] = None,
 ) -> t.List[t.Dict]:
     """
     Main multi-process validation function.
-    Modifies the input! Adds "valid_signature" field to every key item.
+    Modifies the input! Adds "valid_signature" field to every key item,
+    or sets valid flags of a KeyTable.
     It will spawn an appropriate process pool for the amount of threads on processor.
+    Keys of all operators are sent to it in chunks of chunk_size, sized to the amount
+    of keys when not set, with at most max_in_flight chunks at once.
+    With shared_memory, workers read keys from and write results to a shared memory file.
+    With a validation cache, only keys verified on no previous run are verified.
+    With a batch_size, chunks of keys are verified together by batch verification.
+    Signatures are verified with bls_backend, the fastest installed one by default.
+    Validated keys are reported to progress, which can also stop validation.
     """
 
-    # Prepare network vars
-    lido = get_contract(w3, address=lido_address, path=lido_abi_path)
-    chain_id = w3.eth.chainId
-    live_withdrawal_credentials = lido.functions.getWithdrawalCredentials().call()
-
-    possible_withdrawal_credentials = gen_possible_withdrawal_credentials(
-        live_withdrawal_credentials, chain_id
+    keys = (
+        operators
+        if isinstance(operators, KeyTable)
+        else [key for op in operators for key in op["keys"]]
     )
+    progress = progress or StageProgress(VALIDATE_KEYS)
+    progress.start(len(keys))
+    context = get_validation_context(
+        w3, lido_address, lido_abi_path, strict, block_identifier, bls_backend
+    )
+    scheduler = ValidationScheduler(
+        context,
+        chunk_size,
+        max_in_flight,
+        batch_size=batch_size,
+        shared_memory=shared_memory,
+        progress=progress,
+    )
+    with scheduler:
+        results = _validate_keys(
+            partial(scheduler.map, count=len(keys)),
+            keys,
+            context,
+            validation_cache,
+            progress,
+        )
 
-    with concurrent.futures.ProcessPoolExecutor() as executor:
-        for op_i, op in enumerate(operators):
-
-            # Pass {} to overcome 1-arg limit of concurrency.map()
-            arguments = [
-                {
-                    "chain_id": chain_id,
-                    "key": key,
-                    "live_withdrawal_credentials": live_withdrawal_credentials,
-                    "possible_withdrawal_credentials": possible_withdrawal_credentials,
-                    "strict": strict,
-                }
-                for key in op["keys"]
-            ]
-
-            validate_key_results = executor.map(validate_key, arguments)
-
-            for key_index, validate_key_result in enumerate(validate_key_results):
-                # Is this key already validated?
-                if validate_key_result is not None:
-                    operators[op_i]["keys"][key_index]["valid_signature"] = validate_key_result
+    _set_results(keys, results)
+    progress.finish()
 
     return operators
 
 
 def validate_key_list_multi(
-    w3, input: t.List[t.Dict], lido_address: str, lido_abi_path: str, strict: bool
+    w3,
+    input: t.Union[t.List[t.Dict], KeyTable],
+    lido_address: str,
+    lido_abi_path: str,
+    strict: bool,
+    block_identifier=None,
+    validation_cache: t.Optional[ValidationCache] = None,
+    batch_size: t.Optional[int] = None,
+    chunk_size: t.Optional[int] = None,
+    max_in_flight: t.Optional[int] = None,
+    shared_memory: bool = True,
+    bls_backend: t.Optional[str] = None,
+    progress: t.Optional[StageProgress] = None,
 ) -> t.List[t.Dict]:
     """
     Additional multi-process validation function.
     It returns invalid keys instead of the whole operator data like other functions.
+    The input is a list of keys or a KeyTable, invalid keys are returned as dicts either way.
+    Keys are scheduled in chunks the same way validate_keys_multi does.
+    With a validation cache, only keys verified on no previous run are verified.
+    With a batch_size, chunks of keys are verified together by batch verification.
+    Signatures are verified with bls_backend, the fastest installed one by default.
+    Validated keys are reported to progress, which can also stop validation.
     """
 
-    # Prepare network
-    lido = get_contract(w3, address=lido_address, path=lido_abi_path)
-    chain_id = w3.eth.chainId
-    live_withdrawal_credentials = lido.functions.getWithdrawalCredentials().call()
-    possible_withdrawal_credentials = gen_possible_withdrawal_credentials(
-        live_withdrawal_credentials, chain_id
+    progress = progress or StageProgress(VALIDATE_KEYS)
+    progress.start(len(input))
+    context = get_validation_context(
+        w3, lido_address, lido_abi_path, strict, block_identifier, bls_backend
+    )
+    scheduler = ValidationScheduler(
+        context,
+        chunk_size,
+        max_in_flight,
+        batch_size=batch_size,
+        shared_memory=shared_memory,
+        progress=progress,
     )
+    with scheduler:
+        results = _validate_keys(
+            partial(scheduler.map, count=len(input)),
+            input,
+            context,
+            validation_cache,
+            progress,
+        )
+    progress.finish()
+
+    if isinstance(input, KeyTable):
+        return [input.key(row) for row, result in enumerate(results) if result is False]
+    return [key for key, result in zip(input, results) if result is False]
+
+
+def validate_key_stream(
+    w3,
+    keys: t.Iterable[t.Dict],
+    count: int,
+    lido_address: str,
+    lido_abi_path: str,
+    strict: bool,
+    block_identifier=None,
+    validation_cache: t.Optional[ValidationCache] = None,
+    batch_size: t.Optional[int] = None,
+    chunk_size: t.Optional[int] = None,
+    max_in_flight: t.Optional[int] = None,
+    shared_memory: bool = True,
+    bls_backend: t.Optional[str] = None,
+    progress: t.Optional[StageProgress] = None,
+) -> t.List[t.Dict]:
+    """
+    Multi-process validation of keys coming from an iterable, e.g. while they are fetched.
+    Keys are validated as they come, count is the number of keys or more.
+    Modifies the input! Adds "valid_signature" field to every key item.
+    Returns keys in the order they came.
+    Validated keys are reported to progress, which can also stop validation.
+    """
 
-    invalid = []
+    progress = progress or StageProgress(VALIDATE_KEYS)
+    progress.start(count)
+    context = get_validation_context(
+        w3, lido_address, lido_abi_path, strict, block_identifier, bls_backend
+    )
 
-    with concurrent.futures.ProcessPoolExecutor() as executor:
+    received = []
 
-        # Pass {} to overcome 1-arg limit of concurrency.map()
-        arguments = [
-            {
-                "chain_id": chain_id,
-                "key": key,
-                "live_withdrawal_credentials": live_withdrawal_credentials,
-                "possible_withdrawal_credentials": possible_withdrawal_credentials,
-                "strict": strict,
-            }
-            for key in input
-        ]
+    def receive_keys() -> t.Iterator[t.Dict]:
+        for key in keys:
+            received.append(key)
+            yield key
 
-        validate_key_results = executor.map(validate_key, arguments)
+    scheduler = ValidationScheduler(
+        context,
+        chunk_size,
+        max_in_flight,
+        batch_size=batch_size,
+        shared_memory=shared_memory,
+        progress=progress,
+    )
+    with scheduler:
+        # Workers are forked before keys are read, which can start other threads
+        scheduler.start()
+        results = _validate_keys(
+            partial(scheduler.map, count=count),
+            receive_keys(),
+            context,
+            validation_cache,
+            progress,
+        )
 
-        for key_index, validate_key_result in enumerate(validate_key_results):
-            # Is this key already validated?
-            if validate_key_result is not None and validate_key_result is False:
-                invalid.append(input[key_index])
+    _set_results(received, results)
+    progress.finish()
 
-    return invalid
+    return received
@@ -0,0 +1,70 @@
+import typing as t
+import hashlib
+import sqlite3
+import threading
+
+
+class ValidationCache:
+    """
+    Local SQLite store of deposit signature verification results.
+    A result only depends on (pubkey, signature, withdrawal_credentials, fork_version, amount),
+    so it's keyed by a digest of those and never goes stale.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS verifications (
+                    digest BLOB PRIMARY KEY,
+                    valid INTEGER NOT NULL
+                )
+                """
+            )
+
+    @staticmethod
+    def digest(
+        pubkey: bytes,
+        signature: bytes,
+        withdrawal_credentials: bytes,
+        fork_version: bytes,
+        amount: int,
+    ) -> bytes:
+        # Every part but the last has a fixed length, so the concatenation is unambiguous
+        return hashlib.sha256(
+            b"".join([pubkey, signature, withdrawal_credentials, fork_version])
+            + amount.to_bytes(8, "little")
+        ).digest()
+
+    def get_many(self, digests: t.Sequence[bytes]) -> t.Dict[bytes, bool]:
+        """Stored results of digests, unknown ones are left out"""
+        found = {}
+        with self._lock:
+            # Stay under the SQLite limit of bound parameters
+            for start in range(0, len(digests), 500):
+                chunk = digests[start : start + 500]
+                rows = self._connection.execute(
+                    "SELECT digest, valid FROM verifications WHERE digest IN (%s)"
+                    % ",".join("?" * len(chunk)),
+                    chunk,
+                ).fetchall()
+                found.update((bytes(digest), valid == 1) for digest, valid in rows)
+            self.hits += len(found)
+            self.misses += len(digests) - len(found)
+        return found
+
+    def put_many(self, results: t.Dict[bytes, bool]) -> None:
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO verifications (digest, valid) VALUES (?, ?)",
+                [(digest, int(valid)) for digest, valid in results.items()],
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
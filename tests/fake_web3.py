@@ -1,6 +1,11 @@
+import asyncio
+import json
+import time
+
 from lido.multicall.signature import parse_signature
 from eth_abi import encode_single, decode_single
-from eth_utils import function_signature_to_4byte_selector
+from eth_utils import function_signature_to_4byte_selector, to_checksum_address
+from web3.middleware import geth_poa_middleware
 
 
 class FakeFunction():
@@ -8,7 +13,8 @@ class FakeFunction():
         self.handler = handler
         self.eth = eth
 
-    def call(self):
+    def call(self, block_identifier=None):
+        self.eth.block_identifiers.append(block_identifier)
         return self.handler(self.eth)
 
 
@@ -49,6 +55,8 @@ class FakeEth:
     contracts = {}
     handlers = {}
     signatures = {}
+    logs = []
+    block_identifiers = []
 
     def set_block_info(self, block):
         self.block = block
@@ -59,13 +67,161 @@ class FakeEth:
     def add_contract(self, contract):
         self.contracts[contract.address] = contract
 
-    def call(self, arg):
+    def call(self, arg, block_identifier=None):
+        self.block_identifiers.append(block_identifier)
         address = arg['to']
         contract = self.contracts[address]
         return contract.call(arg['data'])
 
     def getBlock(self, arg):
+        self.block_identifiers.append(arg)
         return self.block
 
+    def getLogs(self, arg):
+        return [
+            log for log in self.logs
+            if arg['fromBlock'] <= log['blockNumber'] <= arg['toBlock']
+        ]
+
+
 class FakeWeb3:
     eth = FakeEth()
+
+
+class FakeAsyncResponse:
+    def __init__(self, session, payload):
+        self.session = session
+        self.payload = payload
+
+    async def __aenter__(self):
+        self.session.in_flight += 1
+        self.session.max_in_flight = max(self.session.max_in_flight, self.session.in_flight)
+        # Let other requests start before this one is answered
+        await asyncio.sleep(0)
+        return self
+
+    async def __aexit__(self, *args):
+        self.session.in_flight -= 1
+
+    def raise_for_status(self):
+        pass
+
+    async def json(self):
+        if isinstance(self.payload, list):
+            return [self.session.respond(request) for request in self.payload]
+        return self.session.respond(self.payload)
+
+
+class FakeAsyncSession:
+    """aiohttp session answering JSON-RPC requests from FakeEth contracts"""
+
+    def __init__(self, eth):
+        self.eth = eth
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def post(self, url, json):
+        return FakeAsyncResponse(self, json)
+
+    def respond(self, request):
+        response = {'jsonrpc': '2.0', 'id': request['id']}
+        params = request['params']
+        if request['method'] == 'eth_chainId':
+            response['result'] = hex(self.eth.chainId)
+        elif request['method'] == 'eth_getBlockByNumber':
+            response['result'] = {
+                'number': hex(self.eth.block['number']),
+                'timestamp': hex(self.eth.block['timestamp']),
+            }
+        else:
+            try:
+                output = self.eth.call({
+                    'to': to_checksum_address(params[0]['to']),
+                    'data': bytes.fromhex(params[0]['data'][2:]),
+                }, params[1])
+                response['result'] = '0x' + output.hex()
+            except ValueError as error:
+                response['error'] = {'code': -32000, 'message': str(error)}
+        return response
+
+
+class FakeEndpoint:
+    """One of several web3 instances of FakeEth, slow or failing at will"""
+
+    def __init__(self, delay=0.0, error=None):
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+        self.middleware_onion = [geth_poa_middleware]
+        endpoint = self
+
+        class Eth:
+            def call(self, transaction, block_identifier=None):
+                endpoint.calls += 1
+                time.sleep(endpoint.delay)
+                if endpoint.error is not None:
+                    raise endpoint.error
+                return FakeWeb3.eth.call(transaction, block_identifier)
+
+            def __getattr__(self, name):
+                return getattr(FakeWeb3.eth, name)
+
+        self.eth = Eth()
+
+
+class FakeBeaconResponse:
+    """requests response of FakeBeacon"""
+
+    def __init__(self, payload):
+        self.payload = payload
+        self.text = json.dumps(payload)
+
+    def json(self):
+        return self.payload
+
+
+class FakeAsyncBeaconResponse:
+    """aiohttp response of FakeBeacon"""
+
+    def __init__(self, payload):
+        self.payload = payload
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+    async def json(self, content_type=None):
+        return self.payload
+
+    async def text(self):
+        return json.dumps(self.payload)
+
+
+class FakeBeacon:
+    """Beacon node answering GET requests from a {path: payload} dict, Prysm balances by key"""
+
+    def __init__(self, url, payloads, balances=None):
+        self.url = url
+        self.payloads = payloads
+        self.balances = balances or {}
+
+    def respond(self, url, params=None):
+        if params is not None:
+            return self.balances[params['publicKeys']]
+        return self.payloads.get(url[len(self.url):], {'code': 404})
+
+    def get(self, url, params=None):
+        """requests.get"""
+        return FakeBeaconResponse(self.respond(url, params))
+
+
+class FakeAsyncBeaconSession:
+    """aiohttp session of a FakeBeacon"""
+
+    def __init__(self, beacon):
+        self.beacon = beacon
+
+    def get(self, url, params=None):
+        return FakeAsyncBeaconResponse(self.beacon.respond(url, params))
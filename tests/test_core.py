@@ -1,60 +1,953 @@
 import pytest
 
 from lido.main import Lido
-from lido.contracts.abi_loader import load_contract_abi
-from lido.multicall.constants import MULTICALL_ADDRESSES
+from lido import validate_keys
+from lido.validate_keys import ValidationContext, ValidationScheduler, get_key_bytes
+from lido.async_lido import AsyncLido
+from lido.async_beacon import AsyncLighthouse, AsyncPrysm, get_async_beacon
+from lido.beacon import Lighthouse, Prysm, get_beacon
+from lido.key_store import KeyStore
+from lido.key_table import KeyTable
+from lido.pipeline import run_pipeline
+from lido.progress import Cancelled, DeadlineExceeded, StageProgress
+from lido.shared_keys import SharedKeys
+from lido.bls import BLSBackend, get_available_bls_backends, get_bls_backend
+from lido.eth2deposit.utils.ssz import (
+    DepositMessage,
+    compute_deposit_amount_root,
+    compute_deposit_domain,
+    compute_deposit_signing_root,
+    compute_signing_root,
+)
+from lido.registry_events import apply_registry_events, get_registry_event_abis
+from lido.contracts.abi_loader import get_default_operators_abi_path, load_contract_abi
+from lido.multicall import (
+    AdaptiveBatcher,
+    AggregateTemplate,
+    Call,
+    RPCCache,
+    RPCPool,
+    decode_aggregate,
+    decode_aggregate_calldata,
+    decode_signing_keys,
+    decode_try_aggregate,
+    dispatch,
+    encode_aggregate,
+    get_signature,
+    set_rpc_cache,
+)
+from lido.multicall.adaptive import is_batch_size_error
+from lido.multicall.constants import MULTICALL_ADDRESSES, MULTICALL2_ADDRESSES
+from lido.multicall.transport import BATCH_TRANSPORTS, BatchTransport
+from lido.multicall.async_transport import AsyncRPC
+
+from eth_abi import encode_single, decode_single
+from eth_utils import to_checksum_address
+from web3.middleware import geth_poa_middleware
+
+from tests.fake_web3 import FakeWeb3, FakeContract, FakeAsyncSession, FakeEndpoint
+from tests.fake_web3 import FakeBeacon, FakeAsyncBeaconSession
+from tests.utils import load_test_data_from_file
+
+import asyncio
+import base64
+import copy
+import json
+import os
+import pickle
+import threading
+import requests
+import subprocess
+import sys
+import types
+import time
+
+
+def test_get_operators():
+    operators = load_test_data_from_file("operators_data.txt")
+
+    def fake_getNodeOperatorsCount(eth, data):
+        return [len(operators)]
+
+    def fake_getNodeOperator(eth, data):
+        op_id = data[0]
+        op = list(filter(lambda x: x['id'] == op_id, operators))[0]
+        return [
+                op['active'], 
+                op['name'],
+                op['rewardAddress'],
+                op['stakingLimit'],
+                op['stoppedValidators'],
+                op['totalSigningKeys'],
+                op['usedSigningKeys']
+            ]
+
+    def fake_aggregate(eth, data):
+        return [0, [
+            eth.call({
+                'to': MULTICALL_ADDRESSES[web3.eth.chainId],
+                'data': x[1]
+            }) for x in data[0]
+        ]]
+
+    web3 = FakeWeb3()
+    web3.eth.chainId = 5
+    web3.middleware_onion = [geth_poa_middleware]
+
+    lido = Lido(web3)
+
+    lido_contract = FakeContract(
+        lido.registry_address,
+        load_contract_abi(lido.registry_abi_path),
+        web3.eth)
+    lido_contract.add_contract_method(
+        "getNodeOperatorsCount()(uint256)",
+        fake_getNodeOperatorsCount)
+    lido_contract.add_contract_method(
+        "getNodeOperator(uint256,bool)(bool,string,address,uint64,uint64,uint64,uint64)",
+        fake_getNodeOperator)
+    web3.eth.add_contract(lido_contract)
+
+    mcall_contract = FakeContract(
+        MULTICALL_ADDRESSES[web3.eth.chainId],
+        None,
+        web3.eth)
+    mcall_contract.add_contract_method(
+        "aggregate((address,bytes)[])(uint256,bytes[])",
+        fake_aggregate)
+    web3.eth.add_contract(mcall_contract)
+
+    operators_data = lido.get_operators_data()
+
+    assert operators_data == operators
+
+
+def test_get_operators_keys():
+    operators = load_test_data_from_file("operators_with_valid_keys_goerli.txt")
+
+    def fake_getSigningKey(eth, data):
+        op_id = data[0]
+        key_index = data[1]
+        op = list(filter(lambda x: x['id'] == op_id, operators))[0]
+        key = list(filter(lambda x: x['index'] == key_index, op['keys']))[0]
+        return [
+                key['key'],
+                key['depositSignature'],
+                key['used']
+            ]
+
+    web3 = FakeWeb3()
+    web3.eth.chainId = 5
+    web3.middleware_onion = [geth_poa_middleware]
+
+    def fake_aggregate(eth, data):
+        return [0, [
+            eth.call({
+                'to': MULTICALL_ADDRESSES[web3.eth.chainId],
+                'data': x[1]
+            }) for x in data[0]
+        ]]
+
+    lido = Lido(web3)
+    lido_contract = FakeContract(
+        lido.registry_address,
+        load_contract_abi(lido.registry_abi_path),
+        web3.eth)
+    lido_contract.add_contract_method(
+        "getSigningKey(uint256,uint256)(bytes,bytes,bool)",
+        fake_getSigningKey)
+    web3.eth.add_contract(lido_contract)
+
+    mcall_contract = FakeContract(
+        MULTICALL_ADDRESSES[web3.eth.chainId],
+        None,
+        web3.eth)
+    mcall_contract.add_contract_method(
+        "aggregate((address,bytes)[])(uint256,bytes[])",
+        fake_aggregate)
+    web3.eth.add_contract(mcall_contract)
+
+    operators_with_keys = lido.get_operators_keys(
+        [{
+            'id': op['id'],
+            'totalSigningKeys': op['totalSigningKeys'],
+        } for op in operators])
+
+    assert operators == operators_with_keys
+
+    table = lido.get_operators_keys(
+        [{
+            'id': op['id'],
+            'totalSigningKeys': op['totalSigningKeys'],
+        } for op in operators], key_table=True)
+
+    assert len(table) == sum(op['totalSigningKeys'] for op in operators)
+    assert [list(table.operator_keys(op['id'])) for op in operators] == \
+        [op['keys'] for op in operators]
+
+
+def test_get_operators_keys_full_batches():
+    operators = load_test_data_from_file("operators_with_valid_keys_goerli.txt")
+
+    def fake_getSigningKey(eth, data):
+        op = operators[data[0]]
+        key = op['keys'][data[1]]
+        return [key['key'], key['depositSignature'], key['used']]
+
+    batch_sizes = []
+
+    def fake_aggregate(eth, data):
+        batch_sizes.append(len(data[0]))
+        return [0, [
+            eth.call({
+                'to': MULTICALL_ADDRESSES[web3.eth.chainId],
+                'data': x[1]
+            }) for x in data[0]
+        ]]
+
+    web3 = FakeWeb3()
+    web3.eth.chainId = 5
+    web3.middleware_onion = [geth_poa_middleware]
+
+    lido = Lido(web3, max_multicall=4)
+    lido_contract = FakeContract(
+        lido.registry_address,
+        load_contract_abi(lido.registry_abi_path),
+        web3.eth)
+    lido_contract.add_contract_method(
+        "getSigningKey(uint256,uint256)(bytes,bytes,bool)",
+        fake_getSigningKey)
+    web3.eth.add_contract(lido_contract)
+
+    mcall_contract = FakeContract(
+        MULTICALL_ADDRESSES[web3.eth.chainId],
+        None,
+        web3.eth)
+    mcall_contract.add_contract_method(
+        "aggregate((address,bytes)[])(uint256,bytes[])",
+        fake_aggregate)
+    web3.eth.add_contract(mcall_contract)
+
+    operators_with_keys = lido.get_operators_keys(
+        [{
+            'id': op['id'],
+            'totalSigningKeys': op['totalSigningKeys'],
+        } for op in operators])
+
+    # 9 keys of 3 operators are packed into 4 + 4 + 1 instead of 3 batches of 3
+    assert batch_sizes == [4, 4, 1]
+    assert operators == operators_with_keys
+
+
+def test_get_operators_keys_concurrent_batches():
+    operators = load_test_data_from_file("operators_with_valid_keys_goerli.txt")
+
+    def fake_getSigningKey(eth, data):
+        op = operators[data[0]]
+        key = op['keys'][data[1]]
+        return [key['key'], key['depositSignature'], key['used']]
+
+    in_flight = []
+    max_in_flight = []
+
+    def fake_aggregate(eth, data):
+        in_flight.append(1)
+        max_in_flight.append(len(in_flight))
+        # Earlier batches finish later to check that results keep the batch order
+        time.sleep(0.05 * (3 - len(max_in_flight) % 3))
+        outputs = [
+            eth.call({
+                'to': MULTICALL_ADDRESSES[web3.eth.chainId],
+                'data': x[1]
+            }) for x in data[0]
+        ]
+        in_flight.pop()
+        return [0, outputs]
+
+    web3 = FakeWeb3()
+    web3.eth.chainId = 5
+    web3.middleware_onion = [geth_poa_middleware]
+
+    lido = Lido(web3, max_multicall=2, max_concurrent_multicalls=3)
+    lido_contract = FakeContract(
+        lido.registry_address,
+        load_contract_abi(lido.registry_abi_path),
+        web3.eth)
+    lido_contract.add_contract_method(
+        "getSigningKey(uint256,uint256)(bytes,bytes,bool)",
+        fake_getSigningKey)
+    web3.eth.add_contract(lido_contract)
+
+    mcall_contract = FakeContract(
+        MULTICALL_ADDRESSES[web3.eth.chainId],
+        None,
+        web3.eth)
+    mcall_contract.add_contract_method(
+        "aggregate((address,bytes)[])(uint256,bytes[])",
+        fake_aggregate)
+    web3.eth.add_contract(mcall_contract)
+
+    operators_with_keys = lido.get_operators_keys(
+        [{
+            'id': op['id'],
+            'totalSigningKeys': op['totalSigningKeys'],
+        } for op in operators])
+
+    assert len(max_in_flight) == 5
+    assert 1 < max(max_in_flight) <= 3
+    assert operators == operators_with_keys
+
+
+def test_get_operators_keys_adaptive_batches():
+    operators = load_test_data_from_file("operators_with_valid_keys_goerli.txt")
+
+    def fake_getSigningKey(eth, data):
+        op = operators[data[0]]
+        key = op['keys'][data[1]]
+        return [key['key'], key['depositSignature'], key['used']]
+
+    batch_sizes = []
+
+    def fake_aggregate(eth, data):
+        batch_sizes.append(len(data[0]))
+        if len(data[0]) > 3:
+            raise ValueError({'code': -32000, 'message': 'out of gas'})
+        return [0, [
+            eth.call({
+                'to': MULTICALL_ADDRESSES[web3.eth.chainId],
+                'data': x[1]
+            }) for x in data[0]
+        ]]
+
+    web3 = FakeWeb3()
+    web3.eth.chainId = 5
+    web3.middleware_onion = [geth_poa_middleware]
+
+    AdaptiveBatcher.best_sizes.clear()
+    lido = Lido(web3, max_multicall=8, adaptive_multicall=True)
+    lido_contract = FakeContract(
+        lido.registry_address,
+        load_contract_abi(lido.registry_abi_path),
+        web3.eth)
+    lido_contract.add_contract_method(
+        "getSigningKey(uint256,uint256)(bytes,bytes,bool)",
+        fake_getSigningKey)
+    web3.eth.add_contract(lido_contract)
+
+    mcall_contract = FakeContract(
+        MULTICALL_ADDRESSES[web3.eth.chainId],
+        None,
+        web3.eth)
+    mcall_contract.add_contract_method(
+        "aggregate((address,bytes)[])(uint256,bytes[])",
+        fake_aggregate)
+    web3.eth.add_contract(mcall_contract)
+
+    operators_with_keys = lido.get_operators_keys(
+        [{
+            'id': op['id'],
+            'totalSigningKeys': op['totalSigningKeys'],
+        } for op in operators])
+
+    # 8 is bisected down to 2, then the size grows back up below the failing 4
+    assert batch_sizes == [8, 4, 2, 2, 4, 2, 2, 1]
+    assert AdaptiveBatcher.best_sizes[lido.multicall_batcher.endpoint] == 3
+    assert operators == operators_with_keys
+
+    # Size errors are only retried while there is something to split
+    batch_sizes.clear()
+    lido.multicall_batcher.min_size = 4
+    lido.multicall_batcher.size = 4
+    with pytest.raises(ValueError):
+        lido.get_operators_keys([{'id': 0, 'totalSigningKeys': 3}, {'id': 1, 'totalSigningKeys': 3}])
+
+
+def test_is_batch_size_error():
+    assert is_batch_size_error(ValueError({'code': -32000, 'message': 'out of gas'}))
+    assert is_batch_size_error(requests.exceptions.ReadTimeout())
+
+    too_large = requests.Response()
+    too_large.status_code = 413
+    assert is_batch_size_error(requests.exceptions.HTTPError(response=too_large))
+
+    # Deterministic failures are raised right away instead of being split down to single calls
+    assert not is_batch_size_error(ValueError("execution reverted: stale block 14130000"))
+    assert not is_batch_size_error(ValueError("invalid payload signature"))
+    server_error = requests.Response()
+    server_error.status_code = 500
+    assert not is_batch_size_error(
+        requests.exceptions.HTTPError("413 keys", response=server_error))
+
+
+def test_fetch_and_validate_pipelined():
+    operators = load_test_data_from_file("operators_with_mixed_keys_goerli.txt")
+
+    def fake_getSigningKey(eth, data):
+        op_id = data[0]
+        key_index = data[1]
+        op = list(filter(lambda x: x['id'] == op_id, operators))[0]
+        key = list(filter(lambda x: x['index'] == key_index, op['keys']))[0]
+        return [
+                key['key'],
+                key['depositSignature'],
+                key['used']
+            ]
+
+    def fake_aggregate(eth, data):
+        return [0, [
+            eth.call({
+                'to': MULTICALL_ADDRESSES[web3.eth.chainId],
+                'data': x[1]
+            }) for x in data[0]
+        ]]
+
+    web3 = FakeWeb3()
+    web3.eth.chainId = 5
+    web3.middleware_onion = [geth_poa_middleware]
+
+    # Small multicalls, so keys come to validation in several batches
+    lido = Lido(web3, max_multicall=2)
+    registry_contract = FakeContract(
+        lido.registry_address,
+        load_contract_abi(lido.registry_abi_path),
+        web3.eth)
+    registry_contract.add_contract_method(
+        "getSigningKey(uint256,uint256)(bytes,bytes,bool)",
+        fake_getSigningKey)
+    web3.eth.add_contract(registry_contract)
+
+    lido_contract = FakeContract(
+        lido.lido_address,
+        load_contract_abi(lido.lido_abi_path),
+        web3.eth)
+    lido_contract.add_contract_method(
+        "getWithdrawalCredentials()(bytes32)",
+        lambda eth: b'\x00\x04\x05\x17\xce\x98\xf8\x10p\xce\xa2\x0e5a\n:\xe2:E\xf0\x88;\x0b\x03Z\xfcW\x17\xcc.\x83>')
+    web3.eth.add_contract(lido_contract)
+
+    mcall_contract = FakeContract(
+        MULTICALL_ADDRESSES[web3.eth.chainId],
+        None,
+        web3.eth)
+    mcall_contract.add_contract_method(
+        "aggregate((address,bytes)[])(uint256,bytes[])",
+        fake_aggregate)
+    web3.eth.add_contract(mcall_contract)
+
+    lido.get_operators_data = lambda: [{
+        'id': op['id'],
+        'totalSigningKeys': len(op['keys']),
+    } for op in operators]
+
+    expected = lido.fetch_and_validate()
+    assert any(not key['valid_signature'] for op in expected for key in op['keys'])
+
+    assert lido.fetch_and_validate(pipelined=True) == expected
+
+
+def test_run_pipeline():
+    def produce(put):
+        for i in range(0, 100, 10):
+            put(list(range(i, i + 10)))
+        return "produced"
+
+    assert run_pipeline(produce, list, max_batches=2) == ("produced", list(range(100)))
+
+    # The consumer failing stops the producer, which is blocked on a full queue
+    def consume(items):
+        next(items)
+        raise ValueError("consumer")
+
+    with pytest.raises(ValueError, match="consumer"):
+        run_pipeline(produce, consume, max_batches=1)
+
+    def fail(put):
+        put([1])
+        raise ValueError("producer")
+
+    with pytest.raises(ValueError, match="producer"):
+        run_pipeline(fail, list)
+
+
+def test_call_signature_registry():
+    registry_address = "0x9d4af1ee19dad8857db3a45b0374c81c8a1c6320"
+    signature = "getSigningKey(uint256,uint256)(bytes,bytes,bool)"
+
+    first = Call(None, registry_address, [signature, 1, 2])
+    second = Call(None, registry_address, [signature, 3, 4])
+
+    assert first.signature is second.signature is get_signature(signature)
+    assert first.target == second.target == "0x9D4AF1Ee19Dad8857db3a45B0374c81c8A1C6320"
+
+    # Prepared coders give the same results as the generic eth_abi functions
+    assert first.data == first.signature.fourbyte + encode_single("(uint256,uint256)", [1, 2])
+    output = encode_single("(bytes,bytes,bool)", [b"\x01" * 48, b"\x02" * 96, True])
+    assert first.decode_output(output) == decode_single("(bytes,bytes,bool)", output)
+
+
+def test_aggregate_encoders():
+    registry_address = "0x9D4AF1Ee19Dad8857db3a45B0374c81c8A1C6320"
+    lido_address = "0x1643E812aE58766192Cf7D2Cf9567dF2C37e9B7F"
+    aggregate_signature = get_signature("aggregate((address,bytes)[])(uint256,bytes[])")
+
+    def generic(calls):
+        return aggregate_signature.fourbyte + encode_single(
+            "((address,bytes)[])", [[[call.target, call.data] for call in calls]])
+
+    calls = [
+        Call(None, registry_address, ["getSigningKey(uint256,uint256)(bytes,bytes,bool)", 0, 1]),
+        Call(None, lido_address, "getFee()(uint16)"),
+        Call(None, registry_address, ["getNodeOperator(uint256,bool)(bool,string,address,uint64,uint64,uint64,uint64)", 2 ** 200, True]),
+    ]
+    assert encode_aggregate([(call.target, call.data) for call in calls]) == generic(calls)
+    try_signature = get_signature(
+        "tryBlockAndAggregate(bool,(address,bytes)[])(uint256,bytes32,(bool,bytes)[])")
+    assert encode_aggregate(
+        [(call.target, call.data) for call in calls], require_success=False
+    ) == try_signature.fourbyte + encode_single(
+        "(bool,(address,bytes)[])", [False, [[call.target, call.data] for call in calls]])
+
+    pairs = [(op_i, i) for op_i in range(3) for i in range(100)] + [(2 ** 256 - 1, 0)]
+    template = AggregateTemplate(registry_address, "getSigningKey(uint256,uint256)(bytes,bytes,bool)")
+    assert template.encode(pairs) == generic([
+        Call(None, registry_address, ["getSigningKey(uint256,uint256)(bytes,bytes,bool)", op_i, i])
+        for op_i, i in pairs
+    ])
+
+    signed = AggregateTemplate(registry_address, "f(int8,bool,uint64)(bool)")
+    assert signed.encode([(-1, True, 5)]) == generic([Call(None, registry_address, ["f(int8,bool,uint64)(bool)", -1, True, 5])])
+    with pytest.raises(ValueError):
+        signed.encode([(128, True, 5)])
+    with pytest.raises(ValueError):
+        AggregateTemplate(registry_address, "f(bytes)(bool)")
+
+
+def test_aggregate_decoders():
+    operators = load_test_data_from_file("operators_with_valid_keys_goerli.txt")
+    keys = [key for op in operators for key in op['keys']]
+    keys.append({'key': b'', 'depositSignature': b'\x01' * 33, 'used': False})
+
+    outputs = [
+        encode_single("(bytes,bytes,bool)", [key['key'], key['depositSignature'], key['used']])
+        for key in keys
+    ]
+    output = encode_single("(uint256,bytes[])", [12588300, outputs])
+
+    # Fast decoders give the same results as the generic ones
+    block, fast_outputs = decode_aggregate(output)
+    assert (block, tuple(bytes(x) for x in fast_outputs)) == decode_single("(uint256,bytes[])", output)
+
+    pubkeys, signatures, used = decode_signing_keys(fast_outputs)
+    assert list(zip(pubkeys, signatures, used)) == [
+        decode_single("(bytes,bytes,bool)", x) for x in outputs
+    ]
+
+    with pytest.raises(ValueError):
+        decode_aggregate(output[:-64])
+
+    try_output = encode_single(
+        "(uint256,bytes32,(bool,bytes)[])",
+        [12588300, b'\x01' * 32, [[i % 2 == 0, x] for i, x in enumerate(outputs)]])
+    block, results = decode_try_aggregate(try_output)
+    assert (block, b'\x01' * 32, tuple((success, bytes(x)) for success, x in results)) == \
+        decode_single("(uint256,bytes32,(bool,bytes)[])", try_output)
+
+    # Prepared calldata gives back the calls it was encoded from
+    calls = [('0x' + '11' * 20, b'\x01\x02'), ('0x' + 'ab' * 20, b'\x03' * 70)]
+    for require_success in (True, False):
+        decoded = decode_aggregate_calldata(encode_aggregate(calls, require_success))
+        assert [(target, bytes(data)) for target, data in decoded] == calls
+
+
+def test_get_operators_keys_key_store(tmp_path):
+    operators = load_test_data_from_file("operators_with_valid_keys_goerli.txt")
+    # Last key of every operator is not used yet
+    for op in operators:
+        op['keys'][-1]['used'] = False
+        op['usedSigningKeys'] = len(op['keys']) - 1
+
+    fetched = []
+
+    def fake_getSigningKey(eth, data):
+        fetched.append(tuple(data))
+        key = operators[data[0]]['keys'][data[1]]
+        return [key['key'], key['depositSignature'], key['used']]
+
+    def fake_aggregate(eth, data):
+        return [12588300, [
+            eth.call({
+                'to': MULTICALL_ADDRESSES[web3.eth.chainId],
+                'data': x[1]
+            }) for x in data[0]
+        ]]
+
+    web3 = FakeWeb3()
+    web3.eth.chainId = 5
+    web3.middleware_onion = [geth_poa_middleware]
+
+    lido = Lido(web3, key_store_path=str(tmp_path / "keys.sqlite"))
+    lido_contract = FakeContract(
+        lido.registry_address,
+        load_contract_abi(lido.registry_abi_path),
+        web3.eth)
+    lido_contract.add_contract_method(
+        "getSigningKey(uint256,uint256)(bytes,bytes,bool)",
+        fake_getSigningKey)
+    web3.eth.add_contract(lido_contract)
+
+    mcall_contract = FakeContract(
+        MULTICALL_ADDRESSES[web3.eth.chainId],
+        None,
+        web3.eth)
+    mcall_contract.add_contract_method(
+        "aggregate((address,bytes)[])(uint256,bytes[])",
+        fake_aggregate)
+    web3.eth.add_contract(mcall_contract)
+
+    def sync():
+        fetched.clear()
+        return lido.get_operators_keys([{
+            'id': op['id'],
+            'totalSigningKeys': len(op['keys']),
+            'usedSigningKeys': op['usedSigningKeys'],
+        } for op in operators])
+
+    def expected():
+        return [{
+            'id': op['id'],
+            'totalSigningKeys': len(op['keys']),
+            'usedSigningKeys': op['usedSigningKeys'],
+            'keys': op['keys'],
+        } for op in operators]
+
+    assert sync() == expected()
+    assert len(fetched) == 9
+
+    # Used keys come from the store, unused ones can have changed
+    assert sync() == expected()
+    assert fetched == [(0, 2), (1, 2), (2, 2)]
+
+    # A key used since the checkpoint could have been replaced before, so it's fetched once more
+    operators[0]['keys'][2]['used'] = True
+    operators[0]['usedSigningKeys'] = 3
+    assert sync() == expected()
+    assert fetched == [(0, 2), (1, 2), (2, 2)]
+
+    # A new key makes us fetch it along with unused keys
+    operators[1]['keys'].append(dict(operators[2]['keys'][0], index=3, used=False))
+    assert sync() == expected()
+    assert fetched == [(1, 2), (1, 3), (2, 2)]
+
+    # An unused key removed and another one added keep the key count, the new key is found
+    operators[2]['keys'][2] = dict(operators[1]['keys'][0], index=2, used=False)
+    assert sync() == expected()
+    assert fetched == [(1, 2), (1, 3), (2, 2)]
+
+    assert KeyStore(lido.key_store.path).load(lido.registry_address)[1] == {
+        'totalSigningKeys': 4,
+        'usedSigningKeys': 2,
+        'block': 12588300,
+        'keys': [(key['key'], key['depositSignature'], key['used']) for key in operators[1]['keys']],
+    }
+
+
+def test_get_operators_keys_registry_events(tmp_path):
+    operators = load_test_data_from_file("operators_with_valid_keys_goerli.txt")
+    for op in operators:
+        op['keys'][-1]['used'] = False
+        op['usedSigningKeys'] = len(op['keys']) - 1
+
+    fetched = []
+
+    def fake_getSigningKey(eth, data):
+        fetched.append(tuple(data))
+        key = operators[data[0]]['keys'][data[1]]
+        return [key['key'], key['depositSignature'], key['used']]
+
+    def fake_aggregate(eth, data):
+        return [100, [
+            eth.call({
+                'to': MULTICALL_ADDRESSES[web3.eth.chainId],
+                'data': x[1]
+            }) for x in data[0]
+        ]]
+
+    web3 = FakeWeb3()
+    web3.eth.chainId = 5
+    web3.middleware_onion = [geth_poa_middleware]
+    web3.eth.set_block_info({'timestamp': 1623080999, 'number': 100})
+    web3.eth.logs = []
+
+    lido = Lido(web3, key_store_path=str(tmp_path / "keys.sqlite"), sync_events=True)
+    lido_contract = FakeContract(
+        lido.registry_address,
+        load_contract_abi(lido.registry_abi_path),
+        web3.eth)
+    lido_contract.add_contract_method(
+        "getSigningKey(uint256,uint256)(bytes,bytes,bool)",
+        fake_getSigningKey)
+    web3.eth.add_contract(lido_contract)
+
+    mcall_contract = FakeContract(
+        MULTICALL_ADDRESSES[web3.eth.chainId],
+        None,
+        web3.eth)
+    mcall_contract.add_contract_method(
+        "aggregate((address,bytes)[])(uint256,bytes[])",
+        fake_aggregate)
+    web3.eth.add_contract(mcall_contract)
+
+    topics = {
+        event['name']: topic
+        for topic, event in get_registry_event_abis(lido.registry_abi_path).items()
+    }
+
+    def add_log(event, block, operator_id, pubkey):
+        web3.eth.logs.append({
+            'topics': [topics[event], encode_single('uint256', operator_id)],
+            'data': '0x' + encode_single('(bytes)', [pubkey]).hex(),
+            'blockNumber': block,
+            'logIndex': 0,
+        })
+
+    def sync():
+        fetched.clear()
+        return lido.get_operators_keys([{
+            'id': op['id'],
+            'totalSigningKeys': len(op['keys']),
+            'usedSigningKeys': op['usedSigningKeys'],
+        } for op in operators])
+
+    sync()
+    assert len(fetched) == 9
+    web3.eth.set_block_info({'timestamp': 1623081099, 'number': 110})
+
+    # Events before the checkpoint are already synced
+    add_log('SigningKeyAdded', 90, 0, b'\x00' * 48)
+
+    # The first operator removes its unused key, the second one replaces it
+    removed = operators[1]['keys'][2]
+    operators[1]['keys'][2] = dict(operators[0]['keys'].pop(), index=2)
+    add_log('SigningKeyRemoved', 104, 0, operators[1]['keys'][2]['key'])
+    add_log('SigningKeyRemoved', 105, 1, removed['key'])
+    add_log('SigningKeyAdded', 106, 1, operators[1]['keys'][2]['key'])
+
+    web3.eth.block_identifiers.clear()
+    assert sync() == [{
+        'id': op['id'],
+        'totalSigningKeys': len(op['keys']),
+        'usedSigningKeys': op['usedSigningKeys'],
+        'keys': op['keys'],
+    } for op in operators]
+    # Same key count as before, still the changed key is found without refetching others
+    assert fetched == [(1, 2)]
+    # Keys are fetched at the block events are synced up to: getBlock, then the multicall
+    assert web3.eth.block_identifiers[:2] == ['latest', 110]
+    assert lido.key_store.load(lido.registry_address)[1]['block'] == 110
+
+
+def test_apply_registry_events():
+    abi_path = get_default_operators_abi_path("goerli")
+    # Only key events are synced, operators are read with getNodeOperator
+    assert sorted(x['name'] for x in get_registry_event_abis(abi_path).values()) == \
+        ['SigningKeyAdded', 'SigningKeyRemoved']
+
+    keys = [(bytes([i]) * 48, bytes([i]) * 96, i < 1) for i in range(3)]
+    model = {0: {'totalSigningKeys': 3, 'usedSigningKeys': 1, 'block': 100, 'keys': list(keys)}}
+
+    def event(name, block, operator_id, pubkey):
+        return {'event': name, 'blockNumber': block, 'logIndex': 0,
+                'args': {'operatorId': operator_id, 'pubkey': pubkey}}
+
+    apply_registry_events(model, [
+        # Already synced
+        event('SigningKeyAdded', 100, 0, b'\x09' * 48),
+        # The last key moves to the place of the removed one
+        event('SigningKeyRemoved', 101, 0, keys[1][0]),
+        event('SigningKeyAdded', 102, 0, b'\x07' * 48),
+        # Operator isn't in the model, its keys are fetched in full
+        event('SigningKeyAdded', 102, 1, b'\x08' * 48),
+    ])
+    assert model == {0: {'totalSigningKeys': 3, 'usedSigningKeys': 1, 'block': 100, 'keys': [
+        keys[0], (keys[2][0], None, False), (b'\x07' * 48, None, False),
+    ]}}
+
+
+def test_pinned_block():
+    operators = load_test_data_from_file("operators_data.txt")
+
+    def fake_getNodeOperatorsCount(eth, data):
+        return [len(operators)]
+
+    def fake_getNodeOperator(eth, data):
+        op = operators[data[0]]
+        return [
+            op['active'],
+            op['name'],
+            op['rewardAddress'],
+            op['stakingLimit'],
+            op['stoppedValidators'],
+            op['totalSigningKeys'],
+            op['usedSigningKeys'],
+        ]
+
+    def fake_aggregate(eth, data):
+        return [12588300, [eth.contracts[to_checksum_address(x[0])].call(x[1]) for x in data[0]]]
+
+    web3 = FakeWeb3()
+    web3.eth.chainId = 5
+    web3.middleware_onion = [geth_poa_middleware]
+    web3.eth.set_block_info({'timestamp': 1623080999, 'number': 12588300})
+
+    lido = Lido(web3)
+    registry_contract = FakeContract(
+        lido.registry_address,
+        load_contract_abi(lido.registry_abi_path),
+        web3.eth)
+    registry_contract.add_contract_method(
+        "getNodeOperatorsCount()(uint256)",
+        fake_getNodeOperatorsCount)
+    registry_contract.add_contract_method(
+        "getNodeOperator(uint256,bool)(bool,string,address,uint64,uint64,uint64,uint64)",
+        fake_getNodeOperator)
+    web3.eth.add_contract(registry_contract)
+
+    lido_contract = FakeContract(
+        lido.lido_address,
+        load_contract_abi(lido.lido_abi_path),
+        web3.eth)
+    lido_contract.add_contract_method("getFee()(uint16)", lambda eth, data: [1000])
+    web3.eth.add_contract(lido_contract)
+
+    mcall_contract = FakeContract(
+        MULTICALL_ADDRESSES[web3.eth.chainId],
+        None,
+        web3.eth)
+    mcall_contract.add_contract_method(
+        "aggregate((address,bytes)[])(uint256,bytes[])",
+        fake_aggregate)
+    web3.eth.add_contract(mcall_contract)
+
+    assert lido.pin_block() == 12588300
+
+    web3.eth.block_identifiers.clear()
+    assert lido.get_operators_data() == operators
+    assert lido.get_stats(["getFee"]) == {
+        'last_block': 12588300,
+        'last_blocktime': 1623080999,
+        'getFee': 1000,
+    }
+    # Every read went to the pinned block
+    assert set(web3.eth.block_identifiers) == {12588300}
 
-from web3.middleware import geth_poa_middleware
+    lido.unpin_block()
+    web3.eth.block_identifiers.clear()
+    lido.get_operators_data()
+    assert set(web3.eth.block_identifiers) == {None}
 
-from tests.fake_web3 import FakeWeb3, FakeContract
-from tests.utils import load_test_data_from_file
 
-import copy
+def test_rpc_cache(tmp_path):
+    aggregates = []
 
+    def fake_aggregate(eth, data):
+        aggregates.append(len(data[0]))
+        return [12588300, [eth.contracts[to_checksum_address(x[0])].call(x[1]) for x in data[0]]]
 
-def test_get_operators():
-    operators = load_test_data_from_file("operators_data.txt")
+    web3 = FakeWeb3()
+    web3.eth.chainId = 5
+    web3.middleware_onion = [geth_poa_middleware]
+    web3.eth.set_block_info({'timestamp': 1623080999, 'number': 12588300})
 
-    def fake_getNodeOperatorsCount(eth, data):
-        return [len(operators)]
+    now = [0.0]
+    cache = RPCCache(max_size=2, path=str(tmp_path / "rpc.sqlite"), latest_ttl=12,
+                     clock=lambda: now[0])
+    lido = Lido(web3, rpc_cache=cache)
+    lido_contract = FakeContract(
+        lido.lido_address,
+        load_contract_abi(lido.lido_abi_path),
+        web3.eth)
+    lido_contract.add_contract_method("getFee()(uint16)", lambda eth, data: [1000])
+    web3.eth.add_contract(lido_contract)
 
-    def fake_getNodeOperator(eth, data):
-        op_id = data[0]
-        op = list(filter(lambda x: x['id'] == op_id, operators))[0]
-        return [
-                op['active'], 
-                op['name'],
-                op['rewardAddress'],
-                op['stakingLimit'],
-                op['stoppedValidators'],
-                op['totalSigningKeys'],
-                op['usedSigningKeys']
-            ]
+    mcall_contract = FakeContract(
+        MULTICALL_ADDRESSES[web3.eth.chainId],
+        None,
+        web3.eth)
+    mcall_contract.add_contract_method(
+        "aggregate((address,bytes)[])(uint256,bytes[])",
+        fake_aggregate)
+    web3.eth.add_contract(mcall_contract)
 
+    try:
+        # Latest block reads are served from memory until they expire
+        stats = lido.get_stats(["getFee"])
+        assert lido.get_stats(["getFee"]) == stats
+        assert len(aggregates) == 1
+        now[0] = 13
+        assert lido.get_stats(["getFee"]) == stats
+        assert len(aggregates) == 2
+        assert (cache.hits, cache.misses) == (1, 2)
+
+        # Finalized block reads never expire and survive in the disk tier
+        lido.pin_block()
+        lido.get_stats(["getFee"])
+        now[0] = 10_000
+        lido.get_stats(["getFee"])
+        assert len(aggregates) == 3
+
+        disk_cache = RPCCache(path=str(tmp_path / "rpc.sqlite"))
+        lido = Lido(web3, block_identifier=12588300, rpc_cache=disk_cache)
+        assert lido.get_stats(["getFee"]) == stats
+        assert len(aggregates) == 3
+        assert disk_cache.stats == {'hits': 1, 'misses': 0, 'disk_hits': 1, 'size': 1}
+    finally:
+        set_rpc_cache(web3, None)
+
+
+def test_dispatch():
+    started = []
+
+    def func(batch):
+        started.append(batch)
+        time.sleep(0.01)
+        if batch == -1:
+            raise ValueError("batch -1")
+        return batch * 2
+
+    assert dispatch(func, list(range(10)), max_workers=3) == [x * 2 for x in range(10)]
+
+    # Batches not started when one fails are dropped instead of all being called
+    started.clear()
+    with pytest.raises(ValueError, match="batch -1"):
+        dispatch(func, [0, -1] + [2] * 100, max_workers=2)
+    assert len(started) < 10
+
+
+def test_rpc_pool():
     def fake_aggregate(eth, data):
-        return [0, [
-            eth.call({
-                'to': MULTICALL_ADDRESSES[web3.eth.chainId],
-                'data': x[1]
-            }) for x in data[0]
-        ]]
+        return [12588300, [eth.contracts[to_checksum_address(x[0])].call(x[1]) for x in data[0]]]
 
     web3 = FakeWeb3()
     web3.eth.chainId = 5
-    web3.middleware_onion = [geth_poa_middleware]
+    web3.eth.set_block_info({'timestamp': 1623080999, 'number': 12588300})
 
-    lido = Lido(web3)
+    now = [0.0]
+
+    def sleep(delay):
+        now[0] += delay
 
+    broken = FakeEndpoint(error=requests.exceptions.ConnectionError("connection refused"))
+    limited = FakeEndpoint()
+    spare = FakeEndpoint()
+    pool = RPCPool([broken, limited, spare], rate_limits=[None, 1, None], max_failures=2,
+                   eject_seconds=30, clock=lambda: now[0], sleep=sleep)
+
+    lido = Lido(pool)
     lido_contract = FakeContract(
-        lido.registry_address,
-        load_contract_abi(lido.registry_abi_path),
+        lido.lido_address,
+        load_contract_abi(lido.lido_abi_path),
         web3.eth)
-    lido_contract.add_contract_method(
-        "getNodeOperatorsCount()(uint256)",
-        fake_getNodeOperatorsCount)
-    lido_contract.add_contract_method(
-        "getNodeOperator(uint256,bool)(bool,string,address,uint64,uint64,uint64,uint64)",
-        fake_getNodeOperator)
+    lido_contract.add_contract_method("getFee()(uint16)", lambda eth, data: [1000])
     web3.eth.add_contract(lido_contract)
 
     mcall_contract = FakeContract(
@@ -66,46 +959,424 @@ def test_get_operators():
         fake_aggregate)
     web3.eth.add_contract(mcall_contract)
 
-    operators_data = lido.get_operators_data()
-
-    assert operators_data == operators
+    for _ in range(4):
+        assert lido.get_stats(["getFee"])['getFee'] == 1000
+
+    # The broken endpoint is ejected after two failures, calls fail over,
+    # the rate limited one takes one call a second and the rest goes to the spare one
+    assert (broken.calls, limited.calls, spare.calls) == (2, 1, 3)
+    now[0] += 1
+    lido.get_stats(["getFee"])
+    assert (broken.calls, limited.calls, spare.calls) == (2, 2, 3)
+
+    # Ejected endpoints come back after a while
+    now[0] += 30
+    broken.error = None
+    lido.get_stats(["getFee"])
+    assert broken.calls == 3
+
+    # A call slower than usual is raced on another endpoint
+    slow = FakeEndpoint(delay=1)
+    fast = FakeEndpoint()
+    pool = RPCPool([slow, fast], hedge_percentile=95, hedge_min_samples=10)
+    for endpoint in pool.endpoints:
+        endpoint.latencies.extend([0.01] * 10)
+    started = time.monotonic()
+    assert Lido(pool).get_stats(["getFee"])['getFee'] == 1000
+    assert time.monotonic() - started < 0.5
+    assert pool.hedged == 1 and (slow.calls, fast.calls) == (1, 1)
+
+    # Threads of the pool are stopped once it's closed
+    with pool:
+        pass
+    assert pool._executor._shutdown
 
 
-def test_get_operators_keys():
+def test_try_aggregate_retries_failed_calls():
     operators = load_test_data_from_file("operators_with_valid_keys_goerli.txt")
+    flaky = {(0, 1), (2, 2)}
 
     def fake_getSigningKey(eth, data):
-        op_id = data[0]
-        key_index = data[1]
-        op = list(filter(lambda x: x['id'] == op_id, operators))[0]
-        key = list(filter(lambda x: x['index'] == key_index, op['keys']))[0]
-        return [
-                key['key'],
-                key['depositSignature'],
-                key['used']
-            ]
+        if tuple(data) in flaky:
+            flaky.remove(tuple(data))
+            raise ValueError("execution reverted")
+        key = operators[data[0]]['keys'][data[1]]
+        return [key['key'], key['depositSignature'], key['used']]
+
+    def fake_getFee(eth, data):
+        raise ValueError("execution reverted")
+
+    def fake_tryBlockAndAggregate(eth, data):
+        assert data[0] is False
+        results = []
+        for target, calldata in data[1]:
+            try:
+                results.append([True, eth.contracts[to_checksum_address(target)].call(calldata)])
+            except ValueError:
+                results.append([False, b''])
+        return [12588300, b'\x00' * 32, results]
 
     web3 = FakeWeb3()
     web3.eth.chainId = 5
     web3.middleware_onion = [geth_poa_middleware]
+    web3.eth.set_block_info({'timestamp': 1623080999, 'number': 12588300})
 
-    lido = Lido(web3)
-    lido_contract = FakeContract(
+    lido = Lido(web3, require_success=False)
+    registry_contract = FakeContract(
         lido.registry_address,
         load_contract_abi(lido.registry_abi_path),
         web3.eth)
-    lido_contract.add_contract_method(
+    registry_contract.add_contract_method(
         "getSigningKey(uint256,uint256)(bytes,bytes,bool)",
         fake_getSigningKey)
+    web3.eth.add_contract(registry_contract)
+
+    lido_contract = FakeContract(
+        lido.lido_address,
+        load_contract_abi(lido.lido_abi_path),
+        web3.eth)
+    lido_contract.add_contract_method("getFee()(uint16)", fake_getFee)
+    lido_contract.add_contract_method("getBufferedEther()(uint256)", lambda eth, data: [7])
     web3.eth.add_contract(lido_contract)
 
+    mcall_contract = FakeContract(
+        MULTICALL2_ADDRESSES[web3.eth.chainId],
+        None,
+        web3.eth)
+    mcall_contract.add_contract_method(
+        "tryBlockAndAggregate(bool,(address,bytes)[])(uint256,bytes32,(bool,bytes)[])",
+        fake_tryBlockAndAggregate)
+    web3.eth.add_contract(mcall_contract)
+
+    web3.eth.block_identifiers.clear()
     operators_with_keys = lido.get_operators_keys(
         [{
             'id': op['id'],
             'totalSigningKeys': op['totalSigningKeys'],
         } for op in operators])
 
+    # Both failed keys were retried on their own at the block of their batch
     assert operators == operators_with_keys
+    assert flaky == set()
+    assert web3.eth.block_identifiers.count(12588300) == 2
+
+    # Calls failing on their own too get None values
+    assert lido.get_stats(["getFee", "getBufferedEther"]) == {
+        'last_block': 12588300,
+        'last_blocktime': 1623080999,
+        'getFee': None,
+        'getBufferedEther': 7,
+    }
+
+
+def test_get_operators_failing_operator():
+    operators = load_test_data_from_file("operators_data.txt")
+
+    def fake_getNodeOperator(eth, data):
+        if data[0] == 1:
+            raise ValueError("execution reverted")
+        op = operators[data[0]]
+        return [
+            op['active'],
+            op['name'],
+            op['rewardAddress'],
+            op['stakingLimit'],
+            op['stoppedValidators'],
+            op['totalSigningKeys'],
+            op['usedSigningKeys'],
+        ]
+
+    def fake_tryBlockAndAggregate(eth, data):
+        results = []
+        for target, calldata in data[1]:
+            try:
+                results.append([True, eth.contracts[to_checksum_address(target)].call(calldata)])
+            except ValueError:
+                results.append([False, b''])
+        return [12588300, b'\x00' * 32, results]
+
+    web3 = FakeWeb3()
+    web3.eth.chainId = 5
+    web3.middleware_onion = [geth_poa_middleware]
+
+    lido = Lido(web3, require_success=False)
+    registry_contract = FakeContract(
+        lido.registry_address,
+        load_contract_abi(lido.registry_abi_path),
+        web3.eth)
+    registry_contract.add_contract_method(
+        "getNodeOperatorsCount()(uint256)",
+        lambda eth, data: [len(operators)])
+    registry_contract.add_contract_method(
+        "getNodeOperator(uint256,bool)(bool,string,address,uint64,uint64,uint64,uint64)",
+        fake_getNodeOperator)
+    web3.eth.add_contract(registry_contract)
+
+    mcall_contract = FakeContract(
+        MULTICALL2_ADDRESSES[web3.eth.chainId],
+        None,
+        web3.eth)
+    mcall_contract.add_contract_method(
+        "tryBlockAndAggregate(bool,(address,bytes)[])(uint256,bytes32,(bool,bytes)[])",
+        fake_tryBlockAndAggregate)
+    web3.eth.add_contract(mcall_contract)
+
+    # An operator failing on its own too can't be left out of operators
+    with pytest.raises(ValueError, match=r"node operators \[1\]"):
+        lido.get_operators_data()
+
+
+class FakeBatchSession:
+    def __init__(self, eth):
+        self.eth = eth
+        self.batches = []
+
+    def post(self, url, json):
+        self.batches.append(json)
+        responses = []
+        for request in json:
+            if request['method'] == 'eth_getBlockByNumber':
+                result = {'number': hex(self.eth.block['number'])}
+            else:
+                call, block = request['params']
+                assert block == hex(self.eth.block['number'])
+                contract = self.eth.contracts[to_checksum_address(call['to'])]
+                result = '0x' + contract.call(bytes.fromhex(call['data'][2:])).hex()
+            responses.append({'jsonrpc': '2.0', 'id': request['id'], 'result': result})
+        # Nodes don't have to answer a batch in order
+        return types.SimpleNamespace(
+            raise_for_status=lambda: None, json=lambda: responses[::-1])
+
+
+def test_batch_transport():
+    operators = load_test_data_from_file("operators_with_valid_keys_goerli.txt")
+
+    def fake_getSigningKey(eth, data):
+        key = operators[data[0]]['keys'][data[1]]
+        return [key['key'], key['depositSignature'], key['used']]
+
+    def fake_aggregate(eth, data):
+        raise ValueError("gas required exceeds allowance (50000000)")
+
+    web3 = FakeWeb3()
+    web3.eth.chainId = 5
+    web3.middleware_onion = [geth_poa_middleware]
+    web3.eth.set_block_info({'timestamp': 1623080999, 'number': 12588300})
+    web3.provider = types.SimpleNamespace(endpoint_uri='http://devnet:8545')
+    session = FakeBatchSession(web3.eth)
+    BATCH_TRANSPORTS['http://devnet:8545'] = BatchTransport('http://devnet:8545', session=session)
+
+    lido = Lido(web3, max_multicall=4)
+    registry_contract = FakeContract(
+        lido.registry_address,
+        load_contract_abi(lido.registry_abi_path),
+        web3.eth)
+    registry_contract.add_contract_method(
+        "getSigningKey(uint256,uint256)(bytes,bytes,bool)",
+        fake_getSigningKey)
+    web3.eth.add_contract(registry_contract)
+
+    mcall_contract = FakeContract(
+        MULTICALL_ADDRESSES[web3.eth.chainId],
+        None,
+        web3.eth)
+    mcall_contract.add_contract_method(
+        "aggregate((address,bytes)[])(uint256,bytes[])",
+        fake_aggregate)
+    web3.eth.add_contract(mcall_contract)
+
+    request = [{
+        'id': op['id'],
+        'totalSigningKeys': op['totalSigningKeys'],
+    } for op in operators]
+
+    # Multicall hits the gas cap, every batch goes as plain calls instead
+    assert lido.get_operators_keys(copy.deepcopy(request)) == operators
+    assert [len(batch) for batch in session.batches] == [1, 4, 1, 4, 1, 1]
+
+    # A chain without a multicall contract doesn't try it at all
+    session.batches.clear()
+    web3.eth.chainId = 1337
+    try:
+        assert lido.get_operators_keys(copy.deepcopy(request)) == operators
+    finally:
+        web3.eth.chainId = 5
+    assert [len(batch) for batch in session.batches] == [1, 4, 1, 4, 1, 1]
+
+    # Dropped or unmatched responses fail the batch instead of shifting results
+    def answer(responses):
+        return types.SimpleNamespace(post=lambda url, json: types.SimpleNamespace(
+            raise_for_status=lambda: None, json=lambda: responses))
+
+    batch = [('eth_chainId', []), ('eth_chainId', [])]
+    ok = {'jsonrpc': '2.0', 'id': 0, 'result': '0x5'}
+    error = {'jsonrpc': '2.0', 'id': None, 'error': {'code': -32600, 'message': 'invalid request'}}
+    with pytest.raises(ValueError, match=r"missing ids \[1\]"):
+        BatchTransport('http://devnet:8545', session=answer([ok])).request(batch)
+    with pytest.raises(ValueError, match=r"missing ids \[1\]"):
+        BatchTransport('http://devnet:8545', session=answer([ok, error])).request(batch)
+    assert BatchTransport('http://devnet:8545', session=answer([dict(ok, id=1), ok])).request(
+        batch) == [ok, dict(ok, id=1)]
+
+
+def test_import_without_aiohttp():
+    # aiohttp is optional, sync users import lido without it
+    code = "import sys; sys.modules['aiohttp'] = None; import lido, lido.multicall"
+    subprocess.run([sys.executable, "-c", code], check=True)
+
+
+def test_async_beacon(monkeypatch):
+    keys = [bytes([i]) * 48 for i in range(3)]
+    hex_keys = ['0x' + key.hex() for key in keys]
+    b64_keys = [base64.b64encode(key).decode() for key in keys]
+
+    def header(slot):
+        return {'data': {'header': {'message': {'slot': str(slot)}}}}
+
+    lighthouse = FakeBeacon('http://lighthouse/', {
+        'eth/v1/node/version': {'data': {'version': 'Lighthouse/v1.0.3'}},
+        'eth/v1/beacon/genesis': {'data': {'genesis_time': '1606824023'}},
+        'eth/v1/beacon/states/head/finality_checkpoints': {'data': {'finalized': {'epoch': '100'}}},
+        'eth/v1/beacon/headers/head': header(3250),
+        'eth/v1/beacon/headers/finalized': header(3200),
+        'eth/v1/beacon/states/3200/validators': {'data': [
+            {'validator': {'pubkey': hex_keys[0]}, 'balance': '32000000000', 'status': 'active'},
+            {'validator': {'pubkey': hex_keys[1]}, 'balance': '31000000000', 'status': 'exited'},
+            {'validator': {'pubkey': '0x' + 'ff' * 48}, 'balance': '1', 'status': 'active'},
+        ]},
+    })
+    prysm = FakeBeacon('http://prysm/', {
+        'eth/v1alpha1/node/version': {'version': 'Prysm/v1.0.4'},
+        'eth/v1alpha1/node/genesis': {'genesisTime': '2020-12-01T12:00:23Z'},
+        'eth/v1alpha1/beacon/chainhead': {
+            'headSlot': '3250', 'finalizedSlot': '3200', 'finalizedEpoch': '100'},
+    }, {
+        b64_keys[0]: {'balances': [
+            {'publicKey': b64_keys[0], 'balance': '32000000000', 'status': 'ACTIVE'}]},
+        b64_keys[1]: {'balances': [
+            {'publicKey': b64_keys[1], 'balance': '31000000000', 'status': 'EXITED'}]},
+        b64_keys[2]: {'error': 'not found'},
+    })
+
+    async def fetch(beacon):
+        return [
+            await beacon.get_balances(3200, keys),
+            await beacon.get_actual_slot(),
+            await beacon.get_genesis(),
+            await beacon.get_finalized_epoch(),
+        ]
+
+    for node, sync_type, async_type in [
+        (lighthouse, Lighthouse, AsyncLighthouse),
+        (prysm, Prysm, AsyncPrysm),
+    ]:
+        monkeypatch.setattr(requests, 'get', node.get)
+        sync_beacon = get_beacon(node.url, 32)
+        async_beacon = asyncio.run(get_async_beacon(FakeAsyncBeaconSession(node), node.url, 32))
+        assert type(sync_beacon) is sync_type
+        assert type(async_beacon) is async_type
+        assert async_beacon.version == sync_beacon.version
+
+        expected = [
+            sync_beacon.get_balances(3200, keys),
+            sync_beacon.get_actual_slot(),
+            sync_beacon.get_genesis(),
+            sync_beacon.get_finalized_epoch(),
+        ]
+        assert expected == [
+            (63 * 10 ** 18, 2, 32 * 10 ** 18),
+            {'actual_slot': 3250, 'finalized_slot': 3200},
+            1606824023,
+            100,
+        ]
+        assert asyncio.run(fetch(async_beacon)) == expected
+
+
+def test_async_lido():
+    operators = load_test_data_from_file("operators_data.txt")
+    operators_with_keys = load_test_data_from_file("operators_with_valid_keys_goerli.txt")
+
+    def fake_getNodeOperator(eth, data):
+        op = operators[data[0]]
+        return [
+            op['active'],
+            op['name'],
+            op['rewardAddress'],
+            op['stakingLimit'],
+            op['stoppedValidators'],
+            op['totalSigningKeys'],
+            op['usedSigningKeys'],
+        ]
+
+    def fake_getSigningKey(eth, data):
+        key = operators_with_keys[data[0]]['keys'][data[1]]
+        return [key['key'], key['depositSignature'], key['used']]
+
+    def fake_aggregate(eth, data):
+        return [12588300, [
+            eth.contracts[to_checksum_address(target)].call(calldata) for target, calldata in data[0]
+        ]]
+
+    web3 = FakeWeb3()
+    web3.eth.chainId = 5
+    web3.eth.set_block_info({'timestamp': 1623080999, 'number': 12588300})
+
+    session = FakeAsyncSession(web3.eth)
+    lido = AsyncLido(AsyncRPC('http://node:8545', max_concurrency=2, session=session), 5,
+                     max_multicall=2)
+
+    registry_contract = FakeContract(
+        lido.registry_address,
+        load_contract_abi(lido.registry_abi_path),
+        web3.eth)
+    registry_contract.add_contract_method(
+        "getNodeOperatorsCount()(uint256)", lambda eth, data: [len(operators)])
+    registry_contract.add_contract_method(
+        "getNodeOperator(uint256,bool)(bool,string,address,uint64,uint64,uint64,uint64)",
+        fake_getNodeOperator)
+    registry_contract.add_contract_method(
+        "getSigningKey(uint256,uint256)(bytes,bytes,bool)", fake_getSigningKey)
+    web3.eth.add_contract(registry_contract)
+
+    lido_contract = FakeContract(
+        lido.lido_address,
+        load_contract_abi(lido.lido_abi_path),
+        web3.eth)
+    lido_contract.add_contract_method("getFee()(uint16)", lambda eth, data: [1000])
+    lido_contract.add_contract_method("getBufferedEther()(uint256)", lambda eth, data: [7])
+    web3.eth.add_contract(lido_contract)
+
+    mcall_contract = FakeContract(
+        MULTICALL_ADDRESSES[web3.eth.chainId],
+        None,
+        web3.eth)
+    mcall_contract.add_contract_method(
+        "aggregate((address,bytes)[])(uint256,bytes[])",
+        fake_aggregate)
+    web3.eth.add_contract(mcall_contract)
+
+    async def fetch():
+        return await asyncio.gather(
+            lido.get_operators_data(),
+            lido.get_operators_keys([{
+                'id': op['id'],
+                'totalSigningKeys': op['totalSigningKeys'],
+            } for op in operators_with_keys]),
+            lido.get_stats(["getFee", "getBufferedEther"]),
+        )
+
+    operators_data, keys, stats = asyncio.run(fetch())
+
+    # Same results as the sync client, with requests bounded by max_concurrency
+    assert operators_data == operators
+    assert keys == operators_with_keys
+    assert stats == {
+        'last_block': 12588300,
+        'last_blocktime': 1623080999,
+        'getFee': 1000,
+        'getBufferedEther': 7,
+    }
+    assert session.max_in_flight == 2
 
 
 def test_validate_valid_keys_goerli():
@@ -201,6 +1472,9 @@ def test_validate_keys_list():
 
     assert invalid_keys == [keys[2]]
 
+    table = KeyTable.from_operators([operators[0]])
+    assert lido.validate_key_list_multi(table) == [keys[2]]
+
 def test_different_validate_keys_methods():
     operators = load_test_data_from_file("operators_with_mixed_keys_goerli.txt")
 
@@ -227,6 +1501,279 @@ def test_different_validate_keys_methods():
         operators_with_validated_keys_multi
 
 
+def test_validation_cache(tmp_path, monkeypatch):
+    operators = load_test_data_from_file("operators_with_mixed_keys_goerli.txt")
+
+    web3 = FakeWeb3()
+    web3.eth.chainId = 5
+    web3.middleware_onion = [geth_poa_middleware]
+
+    path = str(tmp_path / "validation.sqlite")
+    lido = Lido(web3, validation_cache_path=path)
+    lido_contract = FakeContract(
+        lido.lido_address,
+        load_contract_abi(lido.lido_abi_path),
+        web3.eth)
+    lido_contract.add_contract_method(
+        "getWithdrawalCredentials()(bytes32)",
+        lambda eth: b'\x00\x04\x05\x17\xce\x98\xf8\x10p\xce\xa2\x0e5a\n:\xe2:E\xf0\x88;\x0b\x03Z\xfcW\x17\xcc.\x83>')
+    web3.eth.add_contract(lido_contract)
+
+    validated = lido.validate_keys_mono(copy.deepcopy(operators))
+    assert validated == Lido(web3).validate_keys_mono(copy.deepcopy(operators))
+
+    # A restart verifies nothing again
+    def verify(*args):
+        raise AssertionError("verified again")
+
+    monkeypatch.setattr(validate_keys.ValidationContext, "find_withdrawal_credentials", verify)
+    lido = Lido(web3, validation_cache_path=path)
+    assert lido.validate_keys_mono(copy.deepcopy(operators)) == validated
+    invalid = lido.validate_key_list_multi(
+        [key for op in copy.deepcopy(operators) for key in op['keys']])
+    assert [key['key'] for key in invalid] == [
+        key['key'] for op in validated for key in op['keys'] if key['valid_signature'] is False
+    ]
+    assert invalid
+    assert lido.validation_cache.misses == 0
+
+
+def test_validation_context():
+    operators = load_test_data_from_file("operators_with_valid_keys_goerli.txt")
+    key = operators[0]['keys'][0]
+    live = b'\x00\x04\x05\x17\xce\x98\xf8\x10p\xce\xa2\x0e5a\n:\xe2:E\xf0\x88;\x0b\x03Z\xfcW\x17\xcc.\x83>'
+
+    context = ValidationContext(5, b'\x01' * 32, [b'\x01' * 32, live], strict=False)
+    # Workers get the context once, keys only carry (pubkey, signature, used)
+    context = pickle.loads(pickle.dumps(context))
+    assert context.find_withdrawal_credentials((key['key'], key['depositSignature'], True)) == 1
+    assert context.find_withdrawal_credentials((key['key'], key['depositSignature'], False)) == -1
+
+
+def test_batch_verify():
+    operators = load_test_data_from_file("operators_with_mixed_keys_goerli.txt")
+    live = b'\x00\x04\x05\x17\xce\x98\xf8\x10p\xce\xa2\x0e5a\n:\xe2:E\xf0\x88;\x0b\x03Z\xfcW\x17\xcc.\x83>'
+    items = [(*get_key_bytes(key), key['used']) for op in operators for key in op['keys']]
+    # A malformed signature fails before any pairing
+    items.append((items[0][0], items[0][1][:-1], True))
+
+    context = ValidationContext(5, b'\x01' * 32, [b'\x01' * 32, live], strict=False)
+    matches = [context.find_withdrawal_credentials(item) for item in items]
+    assert -1 in matches and 1 in matches
+    # Invalid keys are found by bisection, valid ones match the same candidate
+    assert context.find_withdrawal_credentials_batch(items) == matches
+
+    web3 = FakeWeb3()
+    web3.eth.chainId = 5
+    web3.middleware_onion = [geth_poa_middleware]
+
+    lido = Lido(web3, validation_batch_size=4)
+    lido_contract = FakeContract(
+        lido.lido_address,
+        load_contract_abi(lido.lido_abi_path),
+        web3.eth)
+    lido_contract.add_contract_method(
+        "getWithdrawalCredentials()(bytes32)",
+        lambda eth: live)
+    web3.eth.add_contract(lido_contract)
+
+    batched = lido.validate_keys_multi(copy.deepcopy(operators))
+    lido.validation_batch_size = None
+    assert batched == lido.validate_keys_mono(copy.deepcopy(operators))
+
+
+def test_validation_scheduler():
+    operators = load_test_data_from_file("operators_with_mixed_keys_goerli.txt")
+    live = b'\x00\x04\x05\x17\xce\x98\xf8\x10p\xce\xa2\x0e5a\n:\xe2:E\xf0\x88;\x0b\x03Z\xfcW\x17\xcc.\x83>'
+    context = ValidationContext(5, live, [live], strict=True)
+
+    for shared_memory in [True, False]:
+        pulled = []
+
+        def items():
+            for key in operators[0]['keys']:
+                pulled.append(key)
+                yield (*get_key_bytes(key), key['used'])
+            # Malformed keys are invalid without going to workers
+            yield (b'\x01' * 47, b'\x02' * 96, True)
+
+        with ValidationScheduler(
+            context, chunk_size=1, max_in_flight=1, max_workers=2, shared_memory=shared_memory
+        ) as scheduler:
+            # Every worker is started up front
+            scheduler.start()
+            assert len(scheduler.executor._processes) == 2
+            assert scheduler.get_chunk_size(10_000) == 1
+            matches = scheduler.map(items(), count=4)
+            assert next(matches) == 0
+            # Keys are read only as fast as chunks are done
+            assert len(pulled) == 2
+            assert list(matches) == [0, -1, -1]
+
+    # Chunks still queued when a map is given up are cancelled on close
+    keys = [key for op in operators for key in op['keys']] * 4
+    with ValidationScheduler(
+        context, chunk_size=1, max_in_flight=len(keys), max_workers=1, shared_memory=False
+    ) as scheduler:
+        matches = scheduler.map((*get_key_bytes(key), key['used']) for key in keys)
+        next(matches)
+        queued = list(scheduler.pending)
+    assert any(future.cancelled() for future in queued)
+    assert not scheduler.pending
+
+    scheduler = ValidationScheduler(context, max_workers=8)
+    assert scheduler.get_chunk_size(10) == 1
+    assert scheduler.get_chunk_size(10_000) == 64
+    scheduler.close()
+
+
+def test_shared_keys():
+    keys = SharedKeys(3)
+    keys.set_item(0, (b'\x01' * 48, b'\x02' * 96, None))
+    keys.set_item(1, (b'\x03' * 48, b'\x04' * 95, True))
+    keys.set_item(2, (b'\x05' * 48, b'\x06' * 96, False))
+
+    # A worker opens the same file by path and writes matches in place
+    worker = SharedKeys(3, keys.path)
+    assert worker.item(0) == (b'\x01' * 48, b'\x02' * 96, None)
+    assert worker.item(1) is None
+    assert worker.item(2) == (b'\x05' * 48, b'\x06' * 96, False)
+    worker.set_match(0, 1)
+    worker.close()
+
+    assert [keys.match(row) for row in range(3)] == [1, -1, -1]
+    keys.close()
+    assert not os.path.exists(keys.path)
+
+
+def test_bls_backends():
+    operators = load_test_data_from_file("operators_with_mixed_keys_goerli.txt")
+    live = b'\x00\x04\x05\x17\xce\x98\xf8\x10p\xce\xa2\x0e5a\n:\xe2:E\xf0\x88;\x0b\x03Z\xfcW\x17\xcc.\x83>'
+    context = ValidationContext(5, live, [live], strict=True, bls_backend="py_ecc")
+
+    # Valid, invalid and malformed deposit signatures of the same messages
+    corpus = []
+    for key in operators[0]['keys']:
+        pubkey, signature = get_key_bytes(key)
+        corpus.append((pubkey, context.signing_root(pubkey, live), signature))
+    pubkey, message, signature = corpus[0]
+    other_signature = corpus[1][2]
+    corpus += [
+        (pubkey, message, other_signature),
+        (pubkey, corpus[1][1], signature),
+        (pubkey, message, signature[:-1]),
+        (pubkey, message, b'\xc0' + b'\x00' * 95),
+        (b'\xc0' + b'\x00' * 47, message, signature),
+        (b'\xff' * 48, message, signature),
+    ]
+    expected = [True, True, False, False, False, False, False, False, False]
+
+    assert "py_ecc" in get_available_bls_backends()
+    for name in get_available_bls_backends():
+        backend = get_bls_backend(name)
+        assert [backend.verify(*item) for item in corpus] == expected, name
+        assert backend.batch_verify(corpus) == expected, name
+        # Candidates of a key share decoding and the signature side of the pairing
+        assert backend.find_valid_message(pubkey, [corpus[1][1], message], signature) == 1
+        assert backend.find_valid_message(pubkey, [corpus[1][1]], signature) == -1
+        assert backend.find_valid_message(pubkey, [message], signature[:-1]) == -1
+        assert backend.find_valid_message(pubkey, [], signature) == -1
+
+    with pytest.raises(ValueError):
+        get_bls_backend("openssl")
+
+    # A backend without verify can't be created
+    class Incomplete(BLSBackend):
+        name = "incomplete"
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_deposit_signing_root():
+    domain = compute_deposit_domain(bytes.fromhex("00001020"))
+    for amount in [1, 32 * 10 ** 9, 2 ** 64 - 1]:
+        amount_root = compute_deposit_amount_root(amount)
+        for _ in range(10):
+            pubkey, wc = os.urandom(48), os.urandom(32)
+            expected = compute_signing_root(
+                DepositMessage(pubkey=pubkey, withdrawal_credentials=wc, amount=amount), domain)
+            assert compute_deposit_signing_root(pubkey, wc, amount, domain) == expected
+            assert compute_deposit_signing_root(pubkey, wc, amount, domain, amount_root) == expected
+
+    with pytest.raises(ValueError):
+        compute_deposit_signing_root(os.urandom(47), os.urandom(32), 1, domain)
+
+
+def test_stage_progress(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+
+    reports = []
+    progress = StageProgress("fetch_keys", reports.append, deadline=60, interval=0)
+    progress.start(100)
+    progress.add(10)
+
+    with progress.batch(20):
+        now[0] += 10
+        assert reports[-1].in_flight == 1
+    assert reports[-1].done == 30
+    assert reports[-1].in_flight == 0
+    assert reports[-1].rate == 3
+    assert reports[-1].eta == 70 / 3
+
+    # A failing batch isn't done
+    with pytest.raises(ValueError):
+        with progress.batch(20):
+            raise ValueError()
+    assert reports[-1].done == 30
+    assert reports[-1].in_flight == 0
+
+    now[0] += 60
+    with pytest.raises(DeadlineExceeded):
+        progress.submitted()
+
+    cancel = threading.Event()
+    progress = StageProgress("validate_keys", cancel=cancel)
+    progress.submitted()
+    cancel.set()
+    with pytest.raises(Cancelled):
+        progress.submitted()
+
+
+def test_validation_progress():
+    operators = load_test_data_from_file("operators_with_mixed_keys_goerli.txt")
+    count = sum(len(op['keys']) for op in operators)
+
+    web3 = FakeWeb3()
+    web3.eth.chainId = 5
+    web3.middleware_onion = [geth_poa_middleware]
+
+    reports = []
+    lido = Lido(web3, on_progress=reports.append)
+    lido_contract = FakeContract(
+        lido.lido_address,
+        load_contract_abi(lido.lido_abi_path),
+        web3.eth)
+    lido_contract.add_contract_method(
+        "getWithdrawalCredentials()(bytes32)",
+        lambda eth: b'\x00\x04\x05\x17\xce\x98\xf8\x10p\xce\xa2\x0e5a\n:\xe2:E\xf0\x88;\x0b\x03Z\xfcW\x17\xcc.\x83>')
+    web3.eth.add_contract(lido_contract)
+
+    lido.validate_keys_multi(copy.deepcopy(operators))
+    assert reports[-1].stage == "validate_keys"
+    assert (reports[-1].done, reports[-1].total, reports[-1].in_flight) == (count, count, 0)
+
+    lido.cancel()
+    with pytest.raises(Cancelled):
+        lido.validate_keys_multi(copy.deepcopy(operators))
+    lido.cancelled.clear()
+
+    lido.stage_deadlines = {"validate_keys": 0}
+    with pytest.raises(DeadlineExceeded):
+        lido.validate_keys_mono(copy.deepcopy(operators))
+
+
 def test_validate_key():
     operators = load_test_data_from_file("operators_with_valid_keys_goerli.txt")
 
@@ -262,6 +1809,43 @@ def test_find_duplicates():
     assert operators_with_checked_duplicates[2]['keys'][2]['duplicate'] == True
 
 
+def test_key_table():
+    operators = load_test_data_from_file("operators_with_duplicated_keys_goerli.txt")
+
+    table = Lido.find_duplicates(KeyTable.from_operators(operators))
+    assert table.nbytes == len(table) * (48 + 96 + 4 + 4 + 1 + 1 + 1)
+
+    # Keys and duplicates read back are the same as ones found on dicts
+    operators_without_keys = [{k: v for k, v in op.items() if k != 'keys'} for op in operators]
+    assert table.to_operators(operators_without_keys) == \
+        Lido.find_duplicates(copy.deepcopy(operators))
+
+    with pytest.raises(ValueError):
+        KeyTable([1]).set_key(0, 0, b'\x01' * 47, b'\x02' * 96, True)
+
+
+def test_key_table_numpy():
+    np = pytest.importorskip("numpy")
+    operators = load_test_data_from_file("operators_with_mixed_keys_goerli.txt")
+    live = b'\x00\x04\x05\x17\xce\x98\xf8\x10p\xce\xa2\x0e5a\n:\xe2:E\xf0\x88;\x0b\x03Z\xfcW\x17\xcc.\x83>'
+
+    table = Lido.find_duplicates(KeyTable.from_operators(operators))
+    assert isinstance(table.used, np.ndarray)
+
+    # Keys read back have plain bools, the same as dict keys
+    keys = [table.key(row) for row in range(len(table))]
+    for key in keys:
+        assert all(type(key[flag]) is bool for flag in ('used', 'duplicate'))
+    json.dumps([{k: v for k, v in key.items() if type(v) is not bytes} for key in keys])
+
+    # Unused keys of a table are only checked against live withdrawal credentials, as dicts are
+    context = ValidationContext(5, live, [b'\x01' * 32, live], strict=False)
+    items = list(validate_keys._key_items(table))
+    assert [context.candidates(item[2]) for item in items] == [
+        context.candidates(key['used']) for op in operators for key in op['keys']
+    ]
+
+
 def test_spot_duplicates():
     operators = load_test_data_from_file("operators_with_duplicated_keys_goerli.txt")
 